@@ -1,11 +1,60 @@
-from django.contrib import admin
-from .models import Consignment, Location, Category, Receiving, Asset, Dispatch
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from . import search
+from .models import Consignment, Location, Category, Receiving, Asset, Dispatch, Job
 from .forms import *
+from .pagination import EstimatedCountPaginator
+from .services import bulk_tag_assets, bulk_transition, tag_number_range
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for the tables that grow past 100k rows: no full
+    ``COUNT(*)`` (see EstimatedCountPaginator), and with ``search_kind`` set
+    the search box goes through the full-text index instead of ``icontains``
+    scans. ``search_fields`` the index does not cover are still matched, as
+    ``icontains`` on the related table through an id subquery
+    ('<foreign key>__<field>') so the foreign key's index is used. Subclasses
+    set ``list_select_related`` for everything ``list_display`` reads and
+    ``autocomplete_fields`` for their foreign keys.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)  # Newest first off the primary key, also for the autocomplete views
+    search_kind = None  # search.KIND_CODES key
+
+    def _unindexed_condition(self, field, term):
+        if '__' not in field:
+            return Q(**{f'{field}__icontains': term})
+        relation, rest = field.split('__', 1)
+        related = self.model._meta.get_field(relation).related_model
+        return Q(**{f'{relation}__in': related.objects.filter(**{f'{rest}__icontains': term}).values('pk')})
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = search_term.split()
+        if (self.search_kind and terms and all(len(term) >= search.MIN_QUERY_LENGTH for term in terms)
+                and search.is_installed(queryset.db)):
+            unindexed = [field for field in self.search_fields if field not in search.INDEXED_FIELDS[self.search_kind]]
+            # Like the plain search: every term must match, in any of the fields
+            for term in terms:
+                condition = Q(pk__in=search.matching(self.search_kind, term))
+                for field in unindexed:
+                    condition |= self._unindexed_condition(field, term)
+                queryset = queryset.filter(condition)
+            return queryset, False
+        # Short terms, or no index: the plain search_fields lookups
+        return super().get_search_results(request, queryset, search_term)
+
 
 @admin.register(Consignment)
 class ConsignmentAdmin(admin.ModelAdmin):
     list_display = ('slk_id', 'supplier', 'quantity', 'location', 'datetime', 'invoice_number', 'get_received_by_full_name', 'project')
+    list_select_related = ('location', 'received_by')
     search_fields = ('slk_id', 'supplier', 'invoice_number', 'project')
+    autocomplete_fields = ('location', 'received_by')
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
@@ -17,37 +66,112 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
     search_fields = ('name', 'slug')
 
+@admin.action(description="Tag selected receivings as assets")
+def tag_receivings(modeladmin, request, queryset):
+    """Ask for a tag range, then create an asset for every selected approved receiving in one batch."""
+    receiving_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    form = BulkTagForm(request.POST if 'apply' in request.POST else None)
+    if form.is_valid():
+        tag_numbers = tag_number_range(
+            form.cleaned_data['tag_prefix'], form.cleaned_data['tag_start'],
+            len(receiving_ids), form.cleaned_data['tag_width'],
+        )
+        try:
+            assets = bulk_tag_assets(receiving_ids, tag_numbers, form.cleaned_data['status'])
+        except ValidationError as exc:
+            for message in exc.messages:
+                modeladmin.message_user(request, message, messages.ERROR)
+        else:
+            modeladmin.message_user(
+                request, f"Created {len(assets)} assets ({tag_numbers[0]} to {tag_numbers[-1]}).", messages.SUCCESS
+            )
+        return None
+
+    return TemplateResponse(request, 'admin/KenetAssets/receiving/bulk_tag.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': "Tag receivings as assets",
+        'opts': modeladmin.model._meta,
+        'form': form,
+        'receiving_ids': receiving_ids,
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    })
+
+
+def transition_action(status, label):
+    """Admin action moving the selected rows to ``status`` with one validated bulk transition."""
+
+    def action(modeladmin, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        try:
+            changed, unchanged = bulk_transition(modeladmin.model, ids, status, user=request.user)
+        except ValidationError as exc:
+            for message in exc.messages:
+                modeladmin.message_user(request, message, messages.ERROR)
+        else:
+            modeladmin.message_user(
+                request, f"Marked {changed} as {label.lower()} ({unchanged} already were).", messages.SUCCESS
+            )
+
+    action.__name__ = f'mark_{status}'
+    return admin.action(description=f"Mark selected as {label.lower()}")(action)
+
+
 @admin.register(Receiving)
-class ReceivingAdmin(admin.ModelAdmin):
+class ReceivingAdmin(LargeTableAdmin):
     list_display = (
         'consignment', 'status', 'serial_number', 'description', 'name', 
         'model', 'category', 'supplier', 'get_received_by_full_name', 'invoice_number', 'location'
     )
+    list_select_related = ('consignment', 'category', 'received_by', 'location')
     search_fields = ('serial_number', 'name', 'description', 'supplier', 'invoice_number')
+    search_kind = 'receiving'
+    autocomplete_fields = ('consignment', 'category', 'received_by')
     list_filter = ('status', 'category')
     # Removed 'status' from readonly_fields
     list_editable= ('status',)
     readonly_fields = ('supplier', 'get_received_by_full_name', 'invoice_number', 'location')
+    actions = [tag_receivings] + [transition_action(status, label) for status, label in Receiving.STATUS_CHOICES]
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if request.GET.get('model_name') == 'asset' and request.GET.get('field_name') == 'receiving':
+            # The asset form's receiving autocomplete offers what AssetForm accepts
+            queryset = queryset.filter(status='approved')
+        return queryset, may_have_duplicates
 
 
 @admin.register(Asset)
-class AssetAdmin(admin.ModelAdmin):
+class AssetAdmin(LargeTableAdmin):
     form = AssetForm  # Use the custom form
     list_display = (
         'receiving', 'tag_number', 'description', 'serial_number',
         'name','status', 'model', 'get_received_by_full_name', 'location', 'invoice_number', 'supplier'
     )
+    list_select_related = ('receiving', 'received_by', 'location')
     search_fields = ('tag_number', 'description', 'serial_number', 'name', 'model')
+    search_kind = 'asset'
+    autocomplete_fields = ('receiving', 'received_by')
     readonly_fields = ('description', 'serial_number', 'name', 'model', 'get_received_by_full_name', 'location', 'invoice_number', 'supplier')
     list_editable= ('status',)
+    actions = [transition_action(status, label) for status, label in Asset.STATUS_CHOICES]
 
 @admin.register(Dispatch)
-class DispatchAdmin(admin.ModelAdmin):
+class DispatchAdmin(LargeTableAdmin):
     list_display = ('asset', 'get_user_full_name', 'get_approver_full_name', 'status','location', 'datetime', 'destination')
+    list_select_related = ('asset', 'user', 'approver', 'location')
     search_fields = ('asset__tag_number', 'user__username', 'approver__username')
+    search_kind = 'dispatch'
+    autocomplete_fields = ('asset', 'user', 'approver', 'location')
     readonly_fields = ('get_user_full_name', 'get_approver_full_name')
     list_editable= ('status',)
     # Ensure 'status' is editable by not including it in readonly_fields
 
 
 
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_after', 'locked_by', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('locked_by', 'locked_at', 'error', 'created_at', 'finished_at')
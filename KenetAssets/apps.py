@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class KenetassetsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'KenetAssets'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals
+
+        post_migrate.connect(signals.install_search_triggers, sender=self)
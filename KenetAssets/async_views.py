@@ -0,0 +1,100 @@
+"""
+Async versions of the read-only list and detail endpoints, served under
+``async/`` (see ``urls.py``) and meant to run under an ASGI server::
+
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
+
+DRF views are synchronous, so these are plain Django async views that take
+their queryset, filters, fieldsets, serializer and permissions from the DRF
+view they mirror.
+Rows are read with the async ORM (``aiterator``/``aget``), so a worker is
+not blocked while the database or a slow client is.
+"""
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from . import versioning
+from .authentication import CachedTokenAuthentication
+from .pagination import KeysetPagination
+from .views import ListConsignments, ListReceivings, ListAssets, ListDispatches
+
+
+async def _authenticate(request, view_class):
+    """None when the request may proceed, otherwise the 401 response."""
+    if IsAuthenticated not in view_class.permission_classes:
+        return None
+    authenticator = CachedTokenAuthentication()
+    try:
+        user_auth = await authenticator.aauthenticate(request)
+    except AuthenticationFailed as exc:
+        user_auth, detail = None, str(exc.detail)
+    else:
+        detail = 'Authentication credentials were not provided.'
+    if user_auth is None:
+        return JsonResponse({'detail': detail}, status=401,
+                            headers={'WWW-Authenticate': authenticator.authenticate_header(request)})
+    request.user, request.auth = user_auth
+    return None
+
+
+def async_list(view_class):
+    """An async keyset-paginated list endpoint equivalent to ``view_class``."""
+    name = f'async:{view_class.__name__}'
+
+    @require_GET
+    async def view(request):
+        denied = await _authenticate(request, view_class)
+        if denied:
+            return denied
+        etag = versioning.list_etag(name, view_class.version_models, request) if versioning.is_shared() else None
+        if etag and versioning.not_modified(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        drf_request = Request(request)  # query_params for the filters, ?fields= and the paginator
+        drf_view = view_class(request=drf_request, format_kwarg=None, args=(), kwargs={})
+        try:
+            queryset = drf_view.filter_queryset(drf_view.get_queryset())
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400)
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, drf_request, drf_view)
+        data = drf_view.get_serializer(page, many=True).data
+        return JsonResponse(paginator.get_paginated_data(data), headers={'ETag': etag} if etag else None)
+
+    view.__name__ = view.__qualname__ = f'async_{view_class.__name__}'
+    return view
+
+
+def async_detail(view_class):
+    """An async endpoint returning one row of ``view_class``'s queryset by id."""
+
+    @require_GET
+    async def view(request, pk):
+        denied = await _authenticate(request, view_class)
+        if denied:
+            return denied
+        try:
+            instance = await view_class.queryset.aget(pk=pk)
+        except view_class.queryset.model.DoesNotExist:
+            return JsonResponse({'detail': 'No such record.'}, status=404)
+        try:
+            serializer = view_class.serializer_class(instance, context={'request': Request(request)})
+        except ValidationError as exc:  # An unknown ?fields= name
+            return JsonResponse(exc.detail, status=400)
+        return JsonResponse(serializer.data)
+
+    view.__name__ = view.__qualname__ = f'async_{view_class.__name__}_detail'
+    return view
+
+
+list_consignments = async_list(ListConsignments)
+consignment_detail = async_detail(ListConsignments)
+list_receivings = async_list(ListReceivings)
+receiving_detail = async_detail(ListReceivings)
+list_assets = async_list(ListAssets)
+asset_detail = async_detail(ListAssets)
+list_dispatches = async_list(ListDispatches)
+dispatch_detail = async_detail(ListDispatches)
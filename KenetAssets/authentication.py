@@ -0,0 +1,119 @@
+"""
+Token authentication with the token -> user lookup cached.
+
+``TokenAuthentication`` runs a Token + User join on every request. This
+drop-in replacement keeps the authenticated token (with its user attached)
+in Django's cache for ``KENET_TOKEN_CACHE_TTL`` seconds. Entries are
+dropped when a token is deleted or its user is saved (deactivation,
+password or username changes), see ``KenetAssets.signals``. That only
+reaches other workers through a shared cache, so with a per-process one
+(``caching.is_shared``, overridden by ``KENET_TOKEN_CACHE_SHARED``) every
+request looks the token up as ``TokenAuthentication`` does. Hits and misses
+are counted in ``kenet_token_cache_lookups_total`` on ``/metrics``.
+
+``aauthenticate`` does the same for the async views, using the async cache
+and ORM APIs.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import caching, metrics
+
+KEY_PREFIX = 'kenet:token:'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[getattr(settings, 'KENET_TOKEN_CACHE', 'default')]
+
+
+def _key(token_key):
+    # Keep raw credentials out of cache keys (and file names with the file-based backend)
+    return KEY_PREFIX + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def is_shared():
+    return caching.is_shared(_cache(), 'KENET_TOKEN_CACHE_SHARED')
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+    metrics.registry.inc('kenet_token_cache_lookups_total', (('outcome', {'hits': 'hit', 'misses': 'miss'}[outcome]),))
+
+
+def stats():
+    """Hit/miss counters of this process since start-up (or the last ``reset_stats``)."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def invalidate(token_keys):
+    keys = [_key(token_key) for token_key in token_keys]
+    if keys:
+        _cache().delete_many(keys)
+        transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        if not is_shared():
+            return super().authenticate_credentials(key)
+        cache_key = _key(key)
+        token = _cache().get(cache_key)
+        if token is not None:
+            _count('hits')
+            if not token.user.is_active:
+                raise AuthenticationFailed('User inactive or deleted.')
+            return (token.user, token)
+
+        _count('misses')
+        user, token = super().authenticate_credentials(key)
+        _cache().set(cache_key, token, getattr(settings, 'KENET_TOKEN_CACHE_TTL', 300))
+        return (user, token)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for a plain Django request inside an async view."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header. Credentials string should not contain spaces.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header. Token string should not contain invalid characters.')
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        cache_key = _key(key)
+        shared = is_shared()
+        token = await _cache().aget(cache_key) if shared else None
+        if token is not None:
+            _count('hits')
+        else:
+            if shared:
+                _count('misses')
+            try:
+                token = await self.get_model().objects.select_related('user').aget(key=key)
+            except self.get_model().DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            if shared and token.user.is_active:
+                await _cache().aset(cache_key, token, getattr(settings, 'KENET_TOKEN_CACHE_TTL', 300))
+        if not token.user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return (token.user, token)
@@ -0,0 +1,23 @@
+"""
+Whether a cache is shared between worker processes.
+
+Some cached state is only correct if every worker sees the same entries:
+list versions (a bump another worker misses means stale 304s) and
+authenticated tokens (a revocation another worker misses means a deleted
+token keeps working). Those features are only enabled on a shared backend.
+"""
+from django.conf import settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(cache, setting):
+    """
+    True unless ``cache`` keeps its entries in the process (local memory) or
+    keeps none. The ``setting`` (e.g. ``KENET_VERSION_CACHE_SHARED``), when
+    not None, overrides the guess, e.g. for a single-process server.
+    """
+    shared = getattr(settings, setting, None)
+    if shared is None:
+        return not isinstance(cache, (LocMemCache, DummyCache))
+    return shared
@@ -0,0 +1,151 @@
+"""
+Streaming CSV / NDJSON exports of the inventory tables.
+
+Rows are read with ``values_list().iterator()`` so only one chunk of tuples
+is held in memory at a time, and written out in small batches so the first
+bytes reach the client before the query has finished.
+"""
+import csv
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+
+from .models import Asset, Receiving, Dispatch
+
+CHUNK_SIZE = 2000  # Rows fetched from the database per round trip
+ROWS_PER_WRITE = 200  # Rows joined into one chunk of the response body
+
+# resource -> (model, date field used by since/until, [(column, ORM path), ...])
+EXPORTS = {
+    'assets': (Asset, 'receiving__consignment__datetime', [
+        ('id', 'id'),
+        ('tag_number', 'tag_number'),
+        ('serial_number', 'serial_number'),
+        ('name', 'name'),
+        ('model', 'model'),
+        ('description', 'description'),
+        ('status', 'status'),
+        ('location', 'location__name'),
+        ('supplier', 'supplier'),
+        ('invoice_number', 'invoice_number'),
+        ('received_by', 'received_by__username'),
+        ('receiving', 'receiving_id'),
+    ]),
+    'receivings': (Receiving, 'consignment__datetime', [
+        ('id', 'id'),
+        ('consignment', 'consignment__slk_id'),
+        ('status', 'status'),
+        ('serial_number', 'serial_number'),
+        ('name', 'name'),
+        ('model', 'model'),
+        ('description', 'description'),
+        ('category', 'category__name'),
+        ('location', 'location__name'),
+        ('supplier', 'supplier'),
+        ('invoice_number', 'invoice_number'),
+        ('received_by', 'received_by__username'),
+    ]),
+    'dispatches': (Dispatch, 'datetime', [
+        ('id', 'id'),
+        ('asset', 'asset__tag_number'),
+        ('status', 'status'),
+        ('datetime', 'datetime'),
+        ('user', 'user__username'),
+        ('approver', 'approver__username'),
+        ('location', 'location__name'),
+        ('destination', 'destination'),
+        ('comments', 'comments'),
+    ]),
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_bound(value, end_of_day=False):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportError(f"'{value}' is not a valid date or datetime.")
+        parsed = datetime.datetime.combine(day, datetime.time.max if end_of_day else datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(resource, params):
+    """
+    Build the ``values_list`` queryset for ``resource`` filtered by the
+    ``location`` (id or slug), ``status``, ``since`` and ``until`` query params.
+    Returns ``(columns, queryset)``.
+    """
+    model, date_field, columns = EXPORTS[resource]
+    queryset = model.objects.all()
+
+    location = params.get('location')
+    if location:
+        queryset = queryset.filter(location_id=location) if location.isdigit() else queryset.filter(location__slug=location)
+    status = params.get('status')
+    if status:
+        valid = {choice for choice, _ in model.STATUS_CHOICES}
+        if status not in valid:
+            raise ExportError(f"'{status}' is not a valid status; choose from {', '.join(sorted(valid))}.")
+        queryset = queryset.filter(status=status)
+    if params.get('since'):
+        queryset = queryset.filter(**{f'{date_field}__gte': parse_bound(params['since'])})
+    if params.get('until'):
+        queryset = queryset.filter(**{f'{date_field}__lte': parse_bound(params['until'], end_of_day=True)})
+
+    queryset = queryset.order_by('id').values_list(*(path for _, path in columns))
+    return [name for name, _ in columns], queryset
+
+
+class _Echo:
+    """File-like object whose write() hands back the line instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_csv(columns, queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    rows = (
+        writer.writerow([value.isoformat() if isinstance(value, datetime.datetime) else value for value in row])
+        for row in queryset.iterator(chunk_size=CHUNK_SIZE)
+    )
+    yield from _batched(rows)
+
+
+def stream_ndjson(columns, queryset):
+    encoder = DjangoJSONEncoder()
+    rows = (
+        encoder.encode(dict(zip(columns, row))) + '\n'
+        for row in queryset.iterator(chunk_size=CHUNK_SIZE)
+    )
+    yield from _batched(rows)
+
+
+WRITERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
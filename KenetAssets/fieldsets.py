@@ -0,0 +1,120 @@
+"""
+Sparse fieldsets and values()-based serialization for the list endpoints.
+
+``?fields=id,serial_number,status`` narrows a list to those fields, both in
+the response and in the SELECT: the view defers every other column. Views
+with ``fast_serializer`` set go further and read each page with
+``.values()``. The rows come back as dicts and are returned almost as they
+are, with no model instances and no per-field DRF calls.
+``ValuesSerializer`` only formats the columns whose representation differs
+from the database value, such as datetimes and files.
+
+The fast path gives the same output as the view's ModelSerializer, so it
+suits plain read-only serializers (columns and foreign keys rendered as
+ids). Anything else should leave ``fast_serializer`` off.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+
+# Serializer fields whose to_representation returns the database value unchanged
+_PASSTHROUGH = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+def requested_fields(request, available):
+    """
+    The field names listed in ``?fields=``, in the serializer's order, or
+    None to keep them all. Unknown names are a 400.
+    """
+    value = request.query_params.get(FIELDS_PARAM) if request is not None else None
+    if not value:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = sorted(names - set(available))
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: [f"Unknown field(s): {', '.join(unknown)}."]})
+    return [name for name in available if name in names]
+
+
+def _column(field):
+    """ORM path a serializer field reads, e.g. 'receiving_id' or 'location__name'."""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return f'{field.source}_id'  # Rendered as the id, so no join
+    return field.source.replace('.', '__')
+
+
+class SparseFieldsMixin:
+    """Drop the serializer fields not listed in the request's ``?fields=``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = requested_fields(self.context.get('request'), list(self.fields))
+        if keep is not None:
+            for name in set(self.fields) - set(keep):
+                self.fields.pop(name)
+
+
+class ValuesSerializer:
+    """
+    Read-only, many=True stand-in for ``serializer``: turns rows from
+    ``.values(*columns)`` (see ``columns``) into the dicts ``serializer``
+    would have produced for the same rows.
+    """
+
+    def __init__(self, serializer, rows):
+        self.rows = rows
+        self.fields = []
+        for name, field in serializer.fields.items():
+            convert = None if isinstance(field, _PASSTHROUGH) else field.to_representation
+            self.fields.append((name, _column(field), convert))
+
+    @staticmethod
+    def columns(serializer):
+        return [_column(field) for field in serializer.fields.values()]
+
+    @property
+    def data(self):
+        passthrough = [(name, column) for name, column, convert in self.fields if convert is None]
+        converted = [(name, column, convert) for name, column, convert in self.fields if convert is not None]
+        data = []
+        for row in self.rows:
+            item = {name: row[column] for name, column in passthrough}
+            for name, column, convert in converted:
+                value = row[column]
+                item[name] = None if value is None else convert(value)
+            data.append(item)
+        return data
+
+
+class SparseListMixin:
+    """
+    For ``ListAPIView``s: honour ``?fields=`` in the SELECT as well as the
+    output, and with ``fast_serializer`` build the page from ``.values()``.
+    ``SparseFieldsMixin`` must be mixed into the serializer.
+    """
+    fast_serializer = False
+
+    def _keyset_columns(self):
+        # The paginator reads the ordering field off each row, so it is always selected
+        return ['id', *(field for field in getattr(self, 'ordering_fields', ()) if field != 'id')]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        columns = ValuesSerializer.columns(self.get_serializer())
+        columns += [column for column in self._keyset_columns() if column not in columns]
+        if self.fast_serializer:
+            return queryset.values(*columns)
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.fast_serializer and kwargs.get('many'):
+            serializer = super().get_serializer()  # Only for its (sparse) field list
+            return ValuesSerializer(serializer, args[0])
+        return super().get_serializer(*args, **kwargs)
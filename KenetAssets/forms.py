@@ -10,3 +10,11 @@ class AssetForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Filter the receiving field to show only approved items
         self.fields['receiving'].queryset = Receiving.objects.filter(status='approved')
+
+
+class BulkTagForm(forms.Form):
+    """Intermediate form for the 'Tag selected receivings' admin action."""
+    tag_prefix = forms.CharField(max_length=200, required=False, help_text="e.g. KENET-")
+    tag_start = forms.IntegerField(min_value=0, help_text="Number of the first tag")
+    tag_width = forms.IntegerField(min_value=0, max_value=20, initial=0, help_text="Zero-pad numbers to this many digits")
+    status = forms.ChoiceField(choices=Asset.STATUS_CHOICES, initial='available')
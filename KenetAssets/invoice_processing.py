@@ -0,0 +1,125 @@
+"""
+Post-processing of consignment invoices, run as the ``process_invoice``
+background job (queued by the Consignment signal handlers).
+
+Text is pulled out of .docx files with the standard library (the document is
+a zip of WordprocessingML), and out of PDFs with ``pypdf`` when it is
+installed, otherwise by scanning the content streams for text operators,
+which covers the simple, generated invoices suppliers send. The text gives
+an invoice number and a short plain-text preview, written back to the
+consignment.
+"""
+import os
+import re
+import zipfile
+import zlib
+from xml.etree import ElementTree
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+try:
+    import pypdf
+except ImportError:  # Optional: better PDF text extraction
+    pypdf = None
+
+from . import versioning
+from .models import Consignment
+from .services import propagate_consignment
+
+PREVIEW_LENGTH = 500
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_INVOICE_NUMBER_PATTERNS = [
+    re.compile(r'invoice\s*(?:no\.?|number|num\.?|#|ref\.?)\s*[:#.\-]?\s*([A-Z0-9][A-Z0-9\-/]{2,})', re.IGNORECASE),
+    re.compile(r'\b(INV[\-/ ]?\d[A-Z0-9\-/]*)', re.IGNORECASE),
+]
+
+
+def docx_text(fileobj):
+    with zipfile.ZipFile(fileobj) as document:
+        root = ElementTree.fromstring(document.read('word/document.xml'))
+    return '\n'.join(
+        ''.join(node.text or '' for node in paragraph.iter(f'{_WORD_NS}t'))
+        for paragraph in root.iter(f'{_WORD_NS}p')
+    )
+
+
+_PDF_STREAM = re.compile(rb'stream\r?\n(.*?)\r?\nendstream', re.DOTALL)
+_PDF_STRING = re.compile(rb'\((?:\\.|[^\\)])*\)')
+_PDF_TEXT_OP = re.compile(rb'(\((?:\\.|[^\\)])*\))\s*(?:Tj|\'|")|\[((?:\\.|[^\]])*)\]\s*TJ')
+_PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def _pdf_string(literal):
+    body = literal[1:-1]
+    body = re.sub(rb'\\([nrtbf()\\])', lambda m: _PDF_ESCAPES.get(m.group(1), m.group(1)), body)
+    return body.decode('latin-1')
+
+
+def pdf_text(fileobj):
+    if pypdf is not None:
+        return '\n'.join(page.extract_text() or '' for page in pypdf.PdfReader(fileobj).pages)
+    lines = []
+    for stream in _PDF_STREAM.finditer(fileobj.read()):
+        data = stream.group(1)
+        try:
+            data = zlib.decompress(data)
+        except zlib.error:
+            pass  # Not Flate-encoded
+        for single, array in _PDF_TEXT_OP.findall(data):
+            strings = [single] if single else _PDF_STRING.findall(array)
+            lines.append(''.join(_pdf_string(s) for s in strings))
+    return '\n'.join(lines)
+
+
+EXTRACTORS = {
+    '.docx': docx_text,
+    '.pdf': pdf_text,
+    '.txt': lambda fileobj: fileobj.read().decode('utf-8', 'replace'),
+}
+
+
+def extract_text(name, fileobj):
+    """Text of the invoice stored as ``name``, or '' for formats with no extractor."""
+    extractor = EXTRACTORS.get(os.path.splitext(name)[1].lower())
+    return extractor(fileobj) if extractor else ''
+
+
+def detect_invoice_number(text):
+    for pattern in _INVOICE_NUMBER_PATTERNS:
+        for match in pattern.finditer(text):
+            candidate = match.group(1).strip(' -/')
+            if any(ch.isdigit() for ch in candidate):
+                return candidate.upper()
+    return None
+
+
+def process_invoice(consignment_id):
+    """Extract the invoice of a consignment and store the results on it."""
+    consignment = Consignment.objects.filter(pk=consignment_id).first()
+    if consignment is None or not consignment.invoice:
+        return
+    name = consignment.invoice.name
+    with consignment.invoice.open('rb') as invoice:
+        text = extract_text(name, invoice)
+    number = detect_invoice_number(text)
+    now = timezone.now()
+    values = {
+        'detected_invoice_number': number,
+        'invoice_preview': ' '.join(text.split())[:PREVIEW_LENGTH],
+        'invoice_processed_at': now,
+        'updated_at': now,  # update() skips auto_now; delta sync relies on it
+    }
+    with transaction.atomic():
+        # Skip the write if the invoice was replaced meanwhile; the new one has its own job
+        current = Consignment.objects.filter(pk=consignment.pk, invoice=name)
+        if not current.update(**values):
+            return
+        # Only fill in an invoice number nobody has entered
+        if number and current.filter(Q(invoice_number__isnull=True) | Q(invoice_number='')).update(invoice_number=number):
+            consignment.invoice_number = number
+            propagate_consignment(consignment)  # invoice_number is copied to the receivings and assets
+        versioning.bump(Consignment)
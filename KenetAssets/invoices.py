@@ -0,0 +1,108 @@
+"""
+Reference counts of the content-addressed invoice files.
+
+Each stored invoice has an ``InvoiceBlob`` row counting the consignments
+that point at it, kept current by the Consignment signal handlers. Files
+are only removed by ``prune`` (run from ``manage.py dedupe_invoices``)
+rather than as soon as a count drops to zero; run it while no invoices are
+being uploaded, since an upload of an identical file reuses the blob.
+"""
+import hashlib
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import versioning
+from .models import Consignment, InvoiceBlob
+from .storage import digest_of, invoice_storage
+
+
+def add_reference(name, delta):
+    """Change the reference count of the blob stored as ``name`` by ``delta``."""
+    if not delta or digest_of(name) is None:
+        return
+    with transaction.atomic():
+        if InvoiceBlob.objects.filter(name=name).update(references=F('references') + delta) or delta < 0:
+            return
+        storage = invoice_storage()
+        size = storage.size(name) if storage.exists(name) else 0
+        try:
+            with transaction.atomic():
+                InvoiceBlob.objects.create(name=name, digest=digest_of(name), size=size, references=delta)
+        except IntegrityError:
+            # Another writer created the row first
+            InvoiceBlob.objects.filter(name=name).update(references=F('references') + delta)
+
+
+def move_reference(old_name, new_name):
+    if (old_name or '') != (new_name or ''):
+        add_reference(old_name, -1)
+        add_reference(new_name, 1)
+
+
+def rebuild_references():
+    """Recount every blob's references from the consignment table."""
+    counts = dict(
+        Consignment.objects.exclude(invoice__isnull=True).exclude(invoice='')
+        .values_list('invoice').annotate(n=Count('pk')).order_by()
+    )
+    with transaction.atomic():
+        InvoiceBlob.objects.update(references=0)
+        for name, n in counts.items():
+            if digest_of(name) is not None:
+                add_reference(name, n)
+
+
+def migrate_legacy(name, delete_original=True):
+    """
+    Move the invoice stored under the pre-deduplication ``name`` into the
+    content-addressed layout and repoint its consignments. Returns the new
+    name, or None if the file is missing.
+    """
+    storage = invoice_storage()
+    if not storage.exists(name):
+        return None
+    with storage.open(name) as original:
+        new_name = storage.save(name, original)
+    with transaction.atomic():
+        # Bypasses the signal handlers; counts are recomputed by rebuild_references
+        Consignment.objects.filter(invoice=name).update(invoice=new_name, updated_at=timezone.now())
+        versioning.bump(Consignment)
+    if delete_original and new_name != name:
+        storage.delete(name)
+    return new_name
+
+
+def stored_copies(directory):
+    """
+    Yield ``(path, blob name or None)`` for every file under ``directory``:
+    the blob already holding the same content, if any. The blobs themselves
+    are skipped, so the storage directory can be scanned too.
+    """
+    storage = invoice_storage()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    digest.update(chunk)
+            blob = InvoiceBlob.objects.filter(digest=digest.hexdigest()).first()
+            if blob is not None and os.path.realpath(storage.path(blob.name)) == os.path.realpath(path):
+                continue
+            yield path, blob.name if blob else None
+
+
+def prune():
+    """Delete blobs nothing references any more. Returns ``(files, bytes)`` freed."""
+    storage = invoice_storage()
+    files = freed = 0
+    for blob in InvoiceBlob.objects.filter(references__lte=0):
+        if InvoiceBlob.objects.filter(pk=blob.pk, references__lte=0).delete()[0]:
+            storage.delete(blob.name)
+            files += 1
+            freed += blob.size
+    return files, freed
@@ -0,0 +1,104 @@
+"""
+A database-backed job queue, so slow post-processing can leave the request
+without needing a message broker.
+
+``enqueue`` inserts a ``Job`` row, inside the caller's transaction, so a job
+exists exactly when the change that caused it was committed. Workers (see
+``KenetAssets.workers``) ``claim`` queued jobs with a conditional UPDATE, which
+works on SQLite as well as on databases with ``SELECT ... FOR UPDATE``, and
+``run`` them. A failing job is retried with a growing delay up to
+``KENET_JOB_MAX_ATTEMPTS`` times; a job whose worker died is requeued once it
+has been running for ``KENET_JOB_TIMEOUT`` seconds, or failed if that was its
+last attempt (a job that crashes or hangs its worker every time must stop).
+"""
+import datetime
+import traceback
+
+from django.conf import settings
+from django.db.models import Case, F, Q, TextField, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+# Job kind -> dotted path of the function run with the job's payload as keyword arguments
+HANDLERS = {
+    'process_invoice': 'KenetAssets.invoice_processing.process_invoice',
+}
+
+RETRY_DELAY = 30  # Seconds before the first retry, doubled for each later one
+
+
+def enqueue(kind, **payload):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'.")
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+def claim(worker, limit):
+    """Mark up to ``limit`` due jobs as running by ``worker`` and return their ids."""
+    now = timezone.now()
+    timeout = datetime.timedelta(seconds=getattr(settings, 'KENET_JOB_TIMEOUT', 600))
+    last_attempt = Q(attempts__gte=getattr(settings, 'KENET_JOB_MAX_ATTEMPTS', 3))
+    Job.objects.filter(status='running', locked_at__lt=now - timeout).update(
+        status=Case(When(last_attempt, then=Value('failed')), default=Value('queued')),
+        finished_at=Case(When(last_attempt, then=Value(now)), default=None),
+        error=Case(
+            When(last_attempt, then=Value("Timed out on its last attempt.")), default=F('error'), output_field=TextField(),
+        ),
+        locked_by=None,
+    )
+
+    candidates = Job.objects.filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+    claimed = []
+    for pk in candidates.values_list('pk', flat=True)[:limit]:
+        # Only one worker's UPDATE can still see the job as queued
+        if Job.objects.filter(pk=pk, status='queued').update(
+                status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1):
+            claimed.append(pk)
+    return claimed
+
+
+def run(job_id, worker=None):
+    """
+    Run one claimed job and record the outcome. Returns the job's new
+    status, or None if it is no longer ``worker``'s to run.
+
+    A job can wait in a worker pool's queue after it was claimed. Its
+    ``locked_at`` is moved to when it actually starts, so the timeout is
+    measured from there; a job that waited so long that it was requeued
+    (and possibly claimed by another worker) is not run a second time.
+    """
+    started = Job.objects.filter(pk=job_id, status='running')
+    if worker is not None:
+        started = started.filter(locked_by=worker)
+    if not started.update(locked_at=timezone.now()):
+        return None
+    job = Job.objects.get(pk=job_id)
+    try:
+        import_string(HANDLERS[job.kind])(**job.payload)
+    except Exception:
+        if job.attempts < getattr(settings, 'KENET_JOB_MAX_ATTEMPTS', 3):
+            status = 'queued'
+            run_after = timezone.now() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            status, run_after = 'failed', job.run_after
+        Job.objects.filter(pk=job.pk).update(
+            status=status, run_after=run_after, locked_by=None, error=traceback.format_exc(),
+            finished_at=timezone.now() if status == 'failed' else None,
+        )
+        return status
+    Job.objects.filter(pk=job.pk).update(status='done', locked_by=None, error=None, finished_at=timezone.now())
+    return 'done'
+
+
+def run_pending(worker='inline', batch_size=20):
+    """Run due jobs in this process until none are left. Returns how many were run."""
+    count = 0
+    while True:
+        claimed = claim(worker, batch_size)
+        if not claimed:
+            return count
+        for pk in claimed:
+            run(pk, worker)
+        count += len(claimed)
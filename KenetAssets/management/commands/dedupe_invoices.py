@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from KenetAssets import invoices
+from KenetAssets.models import Consignment, InvoiceBlob
+from KenetAssets.storage import digest_of
+
+
+class Command(BaseCommand):
+    help = (
+        "Move invoices uploaded before content-addressed storage into it (so identical files are kept once), "
+        "recount blob references and delete blobs no consignment uses. Only files consignments reference "
+        "are moved; copies no row points at (e.g. stray uploads outside MEDIA_ROOT) are left alone unless "
+        "their directory is given with --scan-dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-originals', action='store_true', help="Leave the pre-deduplication files in place")
+        parser.add_argument('--no-prune', action='store_true', help="Keep unreferenced blobs")
+        parser.add_argument(
+            '--scan-dir', action='append', default=[], metavar='DIR',
+            help="Also delete files under DIR whose content is already stored (repeatable; "
+                 "with --keep-originals they are only listed)",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Consignment.objects.exclude(invoice__isnull=True).exclude(invoice='')
+            .order_by('invoice').values_list('invoice', flat=True).distinct()
+        )
+        for name in [name for name in names if digest_of(name) is None]:
+            new_name = invoices.migrate_legacy(name, delete_original=not options['keep_originals'])
+            if new_name is None:
+                self.stderr.write(self.style.WARNING(f"{name}: file missing, left as is"))
+            else:
+                self.stdout.write(f"{name} -> {new_name}")
+
+        invoices.rebuild_references()
+        if not options['no_prune']:
+            files, freed = invoices.prune()
+            self.stdout.write(f"Pruned {files} unreferenced blobs ({freed} bytes).")
+
+        for directory in options['scan_dir']:
+            for path, blob_name in invoices.stored_copies(directory):
+                if blob_name is None:
+                    self.stderr.write(self.style.WARNING(f"{path}: not a stored invoice, left as is"))
+                elif options['keep_originals']:
+                    self.stdout.write(f"{path}: copy of {blob_name}")
+                else:
+                    os.remove(path)
+                    self.stdout.write(f"{path}: copy of {blob_name}, deleted")
+
+        stored = InvoiceBlob.objects.aggregate(blobs=Count('pk'), size=Sum('size'), references=Sum('references'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{stored['blobs'] or 0} unique invoices ({stored['size'] or 0} bytes) "
+            f"referenced {stored['references'] or 0} times."
+        ))
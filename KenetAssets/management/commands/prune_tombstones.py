@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from KenetAssets import sync
+
+
+class Command(BaseCommand):
+    help = "Delete the delta-sync deletion records older than KENET_TOMBSTONE_RETENTION_DAYS (or --days)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Keep this many days instead of the setting")
+
+    def handle(self, *args, **options):
+        count = sync.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {count} tombstones."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from KenetAssets import summary
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard summary counts from the asset, receiving and dispatch tables."
+
+    def handle(self, *args, **options):
+        summary.rebuild()
+        self.stdout.write(self.style.SUCCESS("Inventory summary rebuilt."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from KenetAssets import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search index over receivings, assets and dispatches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not search.is_supported(options['database']):
+            self.stdout.write("This database has no full-text index; search uses icontains lookups.")
+            return
+        search.rebuild(options['database'])
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
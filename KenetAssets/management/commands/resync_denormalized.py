@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from KenetAssets.models import Consignment
+from KenetAssets import summary
+from KenetAssets.services import chunked, resync_consignments
+
+
+class Command(BaseCommand):
+    help = "Re-copy supplier, location, invoice number etc. from consignments to their receivings and assets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Consignments per UPDATE batch")
+
+    def handle(self, *args, **options):
+        ids = Consignment.objects.order_by('pk').values_list('pk', flat=True)
+        total_receivings = total_assets = 0
+        for batch in chunked(ids, options['batch_size']):
+            receivings, assets = resync_consignments(batch)
+            total_receivings += receivings
+            total_assets += assets
+            self.stdout.write(f"Consignments {batch[0]}-{batch[-1]}: {receivings} receivings, {assets} assets")
+        summary.rebuild()  # Locations may have moved assets between summary groups
+        self.stdout.write(self.style.SUCCESS(f"Resynced {total_receivings} receivings and {total_assets} assets."))
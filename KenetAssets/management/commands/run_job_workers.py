@@ -0,0 +1,22 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from KenetAssets import workers
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (invoice post-processing) in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Worker processes; 0 runs jobs in this process")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between checks of an empty queue")
+
+    def handle(self, *args, **options):
+        try:
+            workers.serve(options['processes'], once=options['once'], poll_interval=options['poll_interval'],
+                          log=self.stdout.write)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
@@ -0,0 +1,28 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from KenetAssets.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = "Refresh the SQLite read replica with a consistent snapshot of the default database (online backup API)."
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError("No replica database is configured (set KENET_REPLICA_DB).")
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError("sync_replica only copies SQLite databases; use the database's own replication.")
+
+        primary.ensure_connection()
+        replica = sqlite3.connect(str(settings.DATABASES[alias]['NAME']))
+        try:
+            # Copies page by page; readers of the replica see either the old or the new snapshot
+            primary.connection.backup(replica, pages=1024)
+        finally:
+            replica.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {primary.settings_dict['NAME']} to {settings.DATABASES[alias]['NAME']}."))
@@ -0,0 +1,265 @@
+"""
+Per-route request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records, for every request, its latency (histogram),
+status code, response size and the number and total time of the database
+queries it ran, labelled by the matched URL route rather than the raw path
+so the label set stays bounded. ``/metrics`` renders them.
+
+Each process keeps its own counters in memory. With ``KENET_METRICS_DIR``
+set, every process also writes them to its own file in that directory (at
+most once per ``KENET_METRICS_FLUSH_SECONDS``) and ``/metrics`` sums all the
+files, so a scrape that lands on any gunicorn worker sees the totals of all
+of them. Clear the directory when deploying, as counters start from zero
+in new processes.
+
+With ``KENET_SLOW_REQUEST_SECONDS`` set, requests taking longer are logged
+to the ``KenetAssets.metrics`` logger together with their SQL.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_LOG_MAX_QUERIES = 50
+
+# name -> (type, help)
+METRICS = {
+    'kenet_http_requests_total': ('counter', 'Requests by route, method and status code.'),
+    'kenet_http_request_duration_seconds': ('histogram', 'Request latency by route and method.'),
+    'kenet_http_response_bytes_total': ('counter', 'Bytes of response bodies (streamed ones included) by route.'),
+    'kenet_db_queries_total': ('counter', 'Database queries run while serving requests, by route.'),
+    'kenet_db_query_seconds_total': ('counter', 'Time spent in database queries while serving requests, by route.'),
+    'kenet_token_cache_lookups_total': ('counter', 'Cached API token lookups, by outcome (hit or miss).'),
+}
+
+
+class Registry:
+    """Counters and histograms keyed by (metric name, sorted label pairs)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+registry = Registry()
+_process_file = f'{os.getpid()}-{time.time_ns()}.json'
+_last_flush = 0.0
+
+
+def _directory():
+    return getattr(settings, 'KENET_METRICS_DIR', None)
+
+
+def flush(force=False):
+    """Write this process's metrics to its file in KENET_METRICS_DIR (if configured)."""
+    global _last_flush
+    directory = _directory()
+    now = time.monotonic()
+    if not directory or (not force and now - _last_flush < getattr(settings, 'KENET_METRICS_FLUSH_SECONDS', 1.0)):
+        return
+    _last_flush = now
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(temp_path, os.path.join(directory, _process_file))  # Readers never see a partial file
+
+
+atexit.register(lambda: _directory() and flush(force=True))
+
+
+def collect():
+    """Metrics of every process sharing KENET_METRICS_DIR (or just this one), summed."""
+    snapshots = [registry.snapshot()]
+    directory = _directory()
+    if directory and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith('.json') and filename != _process_file:
+                try:
+                    with open(os.path.join(directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # Removed or replaced while we were reading
+
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value:g}')
+        else:
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, values):
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", f"{bound:g}")])} {count}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {values[-2]:g}')
+                lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    flush(force=True)
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class _QueryRecorder:
+    """Database execute wrapper counting queries and their time (and keeping the SQL for the slow log)."""
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if self.statements is not None and len(self.statements) < SLOW_LOG_MAX_QUERIES:
+                self.statements.append((elapsed, sql, params))
+
+
+@contextmanager
+def _recording(recorder):
+    with ExitStack() as stack:
+        for connection in connections.all():  # The primary and the replica, if any
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    # The route pattern (e.g. "async/assets/<int:pk>/"), never the raw path, to bound the label values
+    return match.route if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Records each request once its response is complete: for streaming
+    responses (exports) that is when the body has been sent, so the time,
+    queries and bytes of the streamed part are included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_threshold = getattr(settings, 'KENET_SLOW_REQUEST_SECONDS', None)
+        recorder = _QueryRecorder(keep_sql=slow_threshold is not None)
+        start = time.perf_counter()
+        with _recording(recorder):
+            response = self.get_response(request)
+        if not response.streaming:
+            self._record(request, response, recorder, start, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self._astream(request, response, response.streaming_content, recorder, start)
+        else:
+            response.streaming_content = self._stream(request, response, response.streaming_content, recorder, start)
+        return response
+
+    def _stream(self, request, response, content, recorder, start):
+        size = 0
+        try:
+            with _recording(recorder):  # The rows of an export are read while it streams
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self._record(request, response, recorder, start, size)
+
+    async def _astream(self, request, response, content, recorder, start):
+        size = 0
+        try:
+            async for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._record(request, response, recorder, start, size)
+
+    def _record(self, request, response, recorder, start, size):
+        elapsed = time.perf_counter() - start
+        route, method = _route(request), request.method
+        registry.inc('kenet_http_requests_total', (('method', method), ('route', route), ('status', str(response.status_code))))
+        registry.observe('kenet_http_request_duration_seconds', (('method', method), ('route', route)), elapsed)
+        registry.inc('kenet_db_queries_total', (('route', route),), recorder.count)
+        registry.inc('kenet_db_query_seconds_total', (('route', route),), recorder.seconds)
+        registry.inc('kenet_http_response_bytes_total', (('route', route),), size)
+        flush()
+
+        slow_threshold = getattr(settings, 'KENET_SLOW_REQUEST_SECONDS', None)
+        if slow_threshold is not None and elapsed >= slow_threshold:
+            logger.warning(
+                "Slow request %s %s: %.3fs, %d queries (%.3fs)\n%s",
+                method, request.get_full_path(), elapsed, recorder.count, recorder.seconds,
+                '\n'.join(f'  [{t * 1000:.1f} ms] {sql} {params!r}' for t, sql, params in recorder.statements or ()),
+            )
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+def seed_slk_sequence(apps, schema_editor):
+    from KenetAssets.sequences import SLK_SEQUENCE, initial_slk_value
+
+    Consignment = apps.get_model('KenetAssets', 'Consignment')
+    Sequence = apps.get_model('KenetAssets', 'Sequence')
+    Sequence.objects.update_or_create(name=SLK_SEQUENCE, defaults={'value': initial_slk_value(Consignment)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0006_alter_consignment_slk_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_slk_sequence, migrations.RunPython.noop),
+    ]
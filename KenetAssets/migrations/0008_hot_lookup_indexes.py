@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0007_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['status', 'location'], name='asset_status_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consignment',
+            index=models.Index(fields=['datetime'], name='consignment_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['asset', 'datetime'], name='dispatch_asset_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['datetime'], name='dispatch_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receiving',
+            index=models.Index(fields=['status', 'category'], name='receiving_status_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receiving',
+            index=models.Index(fields=['consignment', 'status'], name='receiving_consign_status_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from KenetAssets import search
+
+    search.rebuild(schema_editor.connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    from KenetAssets import search
+
+    search.uninstall(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0008_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        # SQLite only; on other databases search falls back to icontains lookups
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
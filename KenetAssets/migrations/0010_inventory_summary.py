@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+def build_summary(apps, schema_editor):
+    from KenetAssets import summary
+
+    summary.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('location_key', models.PositiveIntegerField(default=0)),
+                ('category_key', models.PositiveIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('status', 'location_key', 'category_key'), name='asset_summary_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DispatchSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=10)),
+                ('location_key', models.PositiveIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('status', 'location_key'), name='dispatch_summary_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReceivingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consignment_key', models.PositiveIntegerField()),
+                ('status', models.CharField(max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('consignment_key', 'status'), name='receiving_summary_key')],
+            },
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
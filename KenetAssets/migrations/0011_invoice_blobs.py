@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:17
+
+import KenetAssets.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0010_inventory_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('references', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='consignment',
+            name='invoice',
+            field=models.FileField(blank=True, null=True, storage=KenetAssets.storage.invoice_storage, upload_to='invoices/'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0012_background_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['supplier'], name='asset_supplier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consignment',
+            index=models.Index(fields=['supplier'], name='consignment_supplier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['status', 'datetime'], name='dispatch_status_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receiving',
+            index=models.Index(fields=['supplier'], name='receiving_supplier_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:34
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_search_triggers(apps, schema_editor):
+    from KenetAssets import search
+
+    search.drop_triggers(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0013_list_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Adding the columns rebuilds the tables; the triggers are reinstalled after migrate
+        migrations.RunPython(drop_search_triggers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='consignment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='receiving',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['updated_at', 'id'], name='asset_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consignment',
+            index=models.Index(fields=['updated_at', 'id'], name='consignment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dispatch',
+            index=models.Index(fields=['updated_at', 'id'], name='dispatch_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receiving',
+            index=models.Index(fields=['updated_at', 'id'], name='receiving_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['resource', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, drop_search_triggers),
+    ]
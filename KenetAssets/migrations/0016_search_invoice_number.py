@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def rebuild_search_index(apps, schema_editor):
+    from KenetAssets import search
+
+    search.rebuild_if_installed(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('KenetAssets', '0015_status_changes'),
+    ]
+
+    operations = [
+        # Receiving documents now carry the invoice number
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
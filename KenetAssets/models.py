@@ -3,7 +3,8 @@ from django.db import models, IntegrityError
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Max
+
+from .storage import invoice_storage
 
 # Set timezone to Kenyan time (EAT)
 import pytz
@@ -21,6 +22,66 @@ class Location(models.Model):
     def __str__(self):
         return self.name
 
+class Sequence(models.Model):
+    """A named counter handed out by KenetAssets.sequences (e.g. the SLK numbers of consignments)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)  # Last number handed out
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``manage.py run_job_workers`` (see KenetAssets.jobs)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),  # Claim query
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+class InvoiceBlob(models.Model):
+    """A stored invoice file and the number of consignments pointing at it (see KenetAssets.invoices)."""
+    name = models.CharField(max_length=255, unique=True)  # Storage name, derived from the digest
+    digest = models.CharField(max_length=64, db_index=True)  # SHA-256 of the content
+    size = models.BigIntegerField(default=0)
+    references = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
+
+class Tombstone(models.Model):
+    """A deleted inventory row, kept for the delta sync endpoint (see KenetAssets.sync)."""
+    resource = models.CharField(max_length=20)  # 'consignments', 'receivings', 'assets' or 'dispatches'
+    object_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
 class Consignment(models.Model):
     id = models.AutoField(primary_key=True)
     slk_id = models.CharField(max_length=20, unique=True, blank=True, editable=False)  # Make slk_id uneditable
@@ -29,16 +90,27 @@ class Consignment(models.Model):
     location = models.ForeignKey(Location, on_delete=models.CASCADE)
     datetime = models.DateTimeField(default=timezone.now)
     invoice_number = models.CharField(max_length=100, blank=True, null=True)
-    invoice = models.FileField(upload_to='invoices/', blank=True, null=True)
+    invoice = models.FileField(upload_to='invoices/', storage=invoice_storage, blank=True, null=True)  # Stored once per content
+    # Filled in by the process_invoice background job (see KenetAssets.invoice_processing)
+    detected_invoice_number = models.CharField(max_length=100, blank=True, null=True)
+    invoice_preview = models.TextField(blank=True, null=True)
+    invoice_processed_at = models.DateTimeField(blank=True, null=True)
     received_by = models.ForeignKey(User, on_delete=models.CASCADE)
     comments = models.TextField(blank=True, null=True)
     project = models.CharField(max_length=255, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Set explicitly by QuerySet.update() callers too
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['datetime'], name='consignment_datetime_idx'),  # Date-range filters and exports
+            models.Index(fields=['supplier'], name='consignment_supplier_idx'),  # ?supplier= list filter
+            models.Index(fields=['updated_at', 'id'], name='consignment_updated_idx'),  # Delta sync
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slk_id:
-            last_slk = Consignment.objects.aggregate(Max('id'))['id__max']
-            new_id = 1 if last_slk is None else last_slk + 1
-            self.slk_id = f'SLK{new_id:03}'
+            from .sequences import next_slk_number
+            self.slk_id = f'SLK{next_slk_number():03}'
         super().save(*args, **kwargs)
 
     def get_received_by_full_name(self):
@@ -68,6 +140,14 @@ class Receiving(models.Model):
         ('rejected', 'Rejected'),
         ('pending', 'Pending'),
     ]
+    # Status -> statuses a bulk transition may move it to (see services.bulk_transition).
+    # Approved is final: assets may already have been tagged from it.
+    STATUS_TRANSITIONS = {
+        'pending': {'testing', 'rejected'},
+        'testing': {'approved', 'rejected', 'pending'},
+        'rejected': {'testing'},
+        'approved': set(),
+    }
     
     consignment = models.ForeignKey(Consignment, on_delete=models.CASCADE)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
@@ -80,9 +160,17 @@ class Receiving(models.Model):
     received_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)  # New field
     invoice_number = models.CharField(max_length=255, blank=True, null=True)  # New field
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)  # Auto-populated
+    updated_at = models.DateTimeField(auto_now=True)  # Set explicitly by QuerySet.update() callers too
     
     class Meta:
+        # The unique index leads with serial_number, so it also serves the duplicate-serial checks
         unique_together = ('serial_number', 'consignment')
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='receiving_updated_idx'),  # Delta sync
+            models.Index(fields=['status', 'category'], name='receiving_status_cat_idx'),  # Admin/list filters
+            models.Index(fields=['consignment', 'status'], name='receiving_consign_status_idx'),  # Per-consignment status counts
+            models.Index(fields=['supplier'], name='receiving_supplier_idx'),  # ?supplier= list filter
+        ]
 
     def save(self, *args, **kwargs):
         # Check if the serial_number already exists in the database
@@ -116,6 +204,13 @@ class Asset(models.Model):
         ('maintenance', 'Maintenance'),
         ('decommissioned', 'Decommissioned'),
     ]
+    # Status -> statuses a bulk transition may move it to; decommissioned is final
+    STATUS_TRANSITIONS = {
+        'available': {'in_use', 'maintenance', 'decommissioned'},
+        'in_use': {'available', 'maintenance', 'decommissioned'},
+        'maintenance': {'available', 'in_use', 'decommissioned'},
+        'decommissioned': set(),
+    }
     
     receiving = models.ForeignKey(Receiving, on_delete=models.CASCADE, related_name='assets')
     tag_number = models.CharField(max_length=255, unique=True)
@@ -128,9 +223,15 @@ class Asset(models.Model):
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)  # Auto-populated
     invoice_number = models.CharField(max_length=255, blank=True, null=True)  # Auto-populated
     supplier = models.CharField(max_length=255, blank=True, null=True)  # Auto-populated
+    updated_at = models.DateTimeField(auto_now=True)  # Set explicitly by QuerySet.update() callers too
 
     class Meta:
         unique_together = ('serial_number', 'receiving')
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='asset_updated_idx'),  # Delta sync
+            models.Index(fields=['status', 'location'], name='asset_status_location_idx'),  # Status/location filters
+            models.Index(fields=['supplier'], name='asset_supplier_idx'),  # ?supplier= list filter
+        ]
 
     def save(self, *args, **kwargs):
         # Ensure validation is called before saving
@@ -173,6 +274,15 @@ class Dispatch(models.Model):
     comments = models.TextField(blank=True, null=True)
     destination = models.CharField(max_length=255, blank=True, null=True)  # New field
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)  # Auto-populated
+    updated_at = models.DateTimeField(auto_now=True)  # Set explicitly by QuerySet.update() callers too
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='dispatch_updated_idx'),  # Delta sync
+            models.Index(fields=['asset', 'datetime'], name='dispatch_asset_datetime_idx'),  # Dispatch history per asset
+            models.Index(fields=['datetime'], name='dispatch_datetime_idx'),  # Date-range filters and exports
+            models.Index(fields=['status', 'datetime'], name='dispatch_status_datetime_idx'),  # ?status= list filter
+        ]
 
     def save(self, *args, **kwargs):
         # Auto-populate the location from the asset if it's not already set
@@ -193,3 +303,57 @@ class Dispatch(models.Model):
 
     def __str__(self):
         return f"Dispatch {self.asset.tag_number} by {self.user.username}"
+
+
+class StatusChange(models.Model):
+    """Audit entry written for each row of a bulk status transition (see services.bulk_transition)."""
+    resource = models.CharField(max_length=20)  # 'receivings' or 'assets'
+    object_id = models.PositiveIntegerField()
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='status_changes')
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'object_id', 'changed_at'], name='status_change_object_idx'),  # History per row
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id}: {self.from_status} -> {self.to_status}"
+
+
+# Dashboard counters maintained incrementally by KenetAssets.summary. Keys are plain
+# integers (0 = none) rather than foreign keys so that every group, including
+# "no location", is covered by the unique constraint and deletes never cascade.
+
+class AssetSummary(models.Model):
+    status = models.CharField(max_length=20)
+    location_key = models.PositiveIntegerField(default=0)
+    category_key = models.PositiveIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'location_key', 'category_key'], name='asset_summary_key'),
+        ]
+
+class ReceivingSummary(models.Model):
+    consignment_key = models.PositiveIntegerField()
+    status = models.CharField(max_length=10)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consignment_key', 'status'], name='receiving_summary_key'),
+        ]
+
+class DispatchSummary(models.Model):
+    status = models.CharField(max_length=10)
+    location_key = models.PositiveIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'location_key'], name='dispatch_summary_key'),
+        ]
@@ -0,0 +1,181 @@
+from math import ceil
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination for the list endpoints.
+
+    Pages are fetched with ``WHERE id < <cursor>`` on the primary key rather
+    than an OFFSET, so every page costs the same no matter how deep the
+    client scrolls. The next/previous cursors are opaque strings.
+
+    ``apaginate_queryset`` is the same pagination for the async views, with
+    the page fetched through the async ORM.
+    """
+    ordering = '-id'  # Newest first; id is unique so no offset is ever needed
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        # Read from settings per request so the sizes can be tuned without a code change
+        self.page_size = getattr(settings, 'KENET_PAGE_SIZE', 50)
+        self.max_page_size = getattr(settings, 'KENET_MAX_PAGE_SIZE', 500)
+        return super().get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self._window(queryset, request, view)
+        if window is None:
+            return None
+        return self._paginate_results(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self._window(queryset, request, view)
+        if window is None:
+            return None
+        return self._paginate_results([obj async for obj in window.aiterator()])
+
+    def get_paginated_data(self, data):
+        """The body ``get_paginated_response`` wraps in a DRF Response, as a plain dict."""
+        return {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+
+    # CursorPagination.paginate_queryset, split around the one query it runs
+
+    def _window(self, queryset, request, view=None):
+        """Queryset of the rows for this page plus one, or None when paging is off."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (self._offset, self._reverse, self._current_position) = (0, False, None)
+        else:
+            (self._offset, self._reverse, self._current_position) = self.cursor
+
+        if self._reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self._current_position is not None:
+            order = self.ordering[0]
+            order_attr = order.lstrip('-')
+            # (cursor reversed) XOR (queryset reversed)
+            if self.cursor.reverse != order.startswith('-'):
+                queryset = queryset.filter(**{order_attr + '__lt': self._current_position})
+            else:
+                queryset = queryset.filter(**{order_attr + '__gt': self._current_position})
+
+        # One extra row tells whether a following page exists
+        return queryset[self._offset:self._offset + self.page_size + 1]
+
+    def _paginate_results(self, results):
+        offset, reverse, current_position = self._offset, self._reverse, self._current_position
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The query ran in reverse, so put the page back in display order
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for the admin changelists of the big tables, which never runs
+    a full ``COUNT(*)``.
+
+    Unfiltered, the count is estimated from the highest id (one index seek;
+    ids are never reused, so deletions only make it high). Filtered or
+    searched, rows are counted exactly up to ``KENET_ADMIN_EXACT_COUNT_LIMIT``
+    and the count stops there. Tables smaller than the limit get an exact
+    count either way.
+
+    Neither kind of inexact count bounds the page number: any page can be
+    requested (past the last row it is just empty), and a full page always
+    links to the next one. ``display_count`` is the count as the changelist
+    shows it, "about N" or "N+" when it is not exact.
+    """
+    _exact = True
+    display_count = None
+    _last_full_page = None
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = getattr(settings, 'KENET_ADMIN_EXACT_COUNT_LIMIT', 10000)
+        if not queryset.query.where:
+            estimate = queryset.aggregate(max_id=Max('pk'))['max_id'] or 0
+            if estimate > limit:
+                self._exact, self.display_count = False, f'about {estimate}'
+                return estimate
+        count = queryset.order_by().values('pk')[:limit + 1].count()
+        if count > limit:
+            self._exact, self.display_count = False, f'{limit}+'
+            return limit
+        return count
+
+    @property
+    def num_pages(self):
+        pages = super().num_pages if self.count_is_exact else ceil(self.count / self.per_page)
+        return max(pages, self._last_full_page + 1) if self._last_full_page else pages
+
+    @property
+    def count_is_exact(self):
+        self.count  # Sets _exact
+        return self._exact
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = self.object_list[bottom:bottom + self.per_page]
+        if len(rows) == self.per_page:  # Evaluates the page, which the changelist does anyway
+            self._last_full_page = number
+        return self._get_page(rows, number, self)
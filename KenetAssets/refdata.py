@@ -0,0 +1,94 @@
+"""
+Cached reference data: locations and categories.
+
+Both tables are small and almost never change, so the full set of rows is
+kept in Django's cache (in-process with the local-memory backend, shared
+between workers with the file-based one) and reused by the router-backed
+viewsets and by foreign-key validation in the create serializers. The entry
+is dropped whenever a row is saved or deleted, and again once that write
+commits so a reader cannot re-cache data from before the commit.
+
+With the local-memory backend that only reaches the worker that made the
+change, so each write also bumps the model's version counter (see
+``KenetAssets.versioning``) and the rows are cached together with the
+version they were read at. When the version cache is shared between
+workers, a set cached before another worker's write no longer matches and is
+reloaded. Otherwise a stale set expires after ``KENET_REFDATA_TIMEOUT``
+seconds; in both cases a pk that is not in it is looked up in the database
+before it is reported missing.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework import serializers
+
+from . import versioning
+
+KEY_PREFIX = 'kenet:refdata:v2:'  # v2: (version, rows) pairs
+
+
+def _cache():
+    return caches[getattr(settings, 'KENET_REFDATA_CACHE', 'default')]
+
+
+def _key(model):
+    return KEY_PREFIX + model._meta.label_lower
+
+
+def by_pk(model):
+    """All rows of ``model`` as an ordered ``{pk: instance}`` dict."""
+    # Read before the rows, so a write committing in between leaves the entry outdated, not wrong
+    version = versioning.current((model,))[0] if versioning.is_shared() else None
+    cached = _cache().get(_key(model))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    # From the primary: a lagging read replica would be cached until the next change
+    rows = {row.pk: row for row in model.objects.using(DEFAULT_DB_ALIAS).order_by('pk')}
+    _cache().set(_key(model), (version, rows), timeout=getattr(settings, 'KENET_REFDATA_TIMEOUT', 300))
+    return rows
+
+
+def all(model):
+    return list(by_pk(model).values())
+
+
+def get(model, pk):
+    instance = by_pk(model).get(pk)
+    if instance is None:
+        # Possibly created by another worker since this one cached the rows
+        instance = model.objects.using(DEFAULT_DB_ALIAS).filter(pk=pk).first()
+        if instance is not None:
+            invalidate(model)
+    return instance
+
+
+def missing(model, pks):
+    """The pks in ``pks`` with no row, with one query for those the cache does not have."""
+    unknown = set(pks) - by_pk(model).keys()
+    if unknown:
+        found = set(model.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=unknown).values_list('pk', flat=True))
+        if found:
+            invalidate(model)
+        unknown -= found
+    return unknown
+
+
+def invalidate(model):
+    _cache().delete(_key(model))
+    transaction.on_commit(lambda: _cache().delete(_key(model)))
+    versioning.bump(model)  # For the other workers' caches
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that validates against the cached rows instead of querying."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            instance = get(self.get_queryset().model, int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
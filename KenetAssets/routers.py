@@ -0,0 +1,86 @@
+"""
+Read/write splitting for the KenetAssets models.
+
+With a ``replica`` database configured (``KENET_REPLICA_DB``, see the
+settings), reads made while serving a request (list endpoints, exports,
+search, the dashboard, admin changelists) go to the replica and writes go
+to ``default``. Requests with an unsafe method (POST, PUT, PATCH, DELETE)
+read from ``default`` throughout, since the reads that validate a write
+(uniqueness checks, related-object lookups) must see the rows the write
+will meet. A request is pinned to ``default`` for its remaining reads once
+it writes, and for ``KENET_REPLICA_STICKY_SECONDS`` afterwards through a
+cookie, so a client always sees its own changes even while the replica
+lags. Reads inside a transaction, and everything outside a request
+(management commands, job workers), stay on ``default``.
+
+A replica can be any copy that keeps up with the primary: a second SQLite
+file refreshed with ``manage.py sync_replica``, or a streamed copy. Note
+that list ETags are bumped as soon as a write commits, so a client outside
+the sticky window may see the replica's older rows under the new ETag until
+the next write; keep the replica lag well under the polling interval.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+APP_LABEL = 'KenetAssets'
+COOKIE_NAME = 'kenet_primary'
+
+# Per-request routing state: {'pinned': bool, 'wrote': bool}; None outside requests
+_request_state = ContextVar('kenet_db_routing', default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, 'KENET_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        state = _request_state.get()
+        if state is None or state['pinned'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['pinned'] = state['wrote'] = True  # Read-your-writes for the rest of the request
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, never migrated by itself
+        return False if db == replica_alias() else None
+
+
+class StickyPrimaryMiddleware:
+    """Scope the router's state to each request and carry the sticky window in a cookie."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'pinned': request.method not in SAFE_METHODS or COOKIE_NAME in request.COOKIES, 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote']:
+            response.set_cookie(
+                COOKIE_NAME, '1', max_age=getattr(settings, 'KENET_REPLICA_STICKY_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,240 @@
+"""
+Full-text search over receivings, assets and dispatches.
+
+On SQLite the searchable text lives in an FTS5 table using the ``trigram``
+tokenizer, so any 3+ character fragment of a serial, tag or model number
+matches through the index instead of an ``icontains`` scan. The table is
+kept in sync by triggers on the source tables, which means rows written by
+``bulk_create`` and ``QuerySet.update`` are indexed too.
+
+Each document's rowid is ``<source id> * 4 + <kind code>``, so triggers can
+replace or delete a document by rowid without scanning the index.
+
+Other databases fall back to ``icontains`` lookups over the same columns.
+"""
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Receiving, Asset, Dispatch
+
+TABLE = 'kenetassets_search'
+MIN_QUERY_LENGTH = 3  # Shortest fragment the trigram tokenizer can match
+
+KIND_CODES = {'receiving': 1, 'asset': 2, 'dispatch': 3}
+
+# Columns after kind/ref, and the bm25 weight of each (identifiers outrank free text)
+COLUMNS = ['serial_number', 'tag_number', 'name', 'model', 'description', 'extra']
+WEIGHTS = [10.0, 10.0, 2.0, 2.0, 1.0, 1.0]
+
+_receiving = Receiving._meta.db_table
+_asset = Asset._meta.db_table
+_dispatch = Dispatch._meta.db_table
+
+# kind -> (source table, columns whose change re-indexes a row, document values for source row {row}).
+# Dispatch documents also carry their asset's identifiers, read through the alias ``a``.
+_DOCUMENTS = {
+    'receiving': (_receiving, ('serial_number', 'name', 'model', 'description', 'supplier', 'invoice_number'),
+                  "{row}.id * 4 + 1, 'receiving', {row}.id, {row}.serial_number, '', {row}.name, {row}.model, "
+                  "{row}.description, COALESCE({row}.supplier, '') || ' ' || COALESCE({row}.invoice_number, '')"),
+    'asset': (_asset, ('tag_number', 'serial_number', 'name', 'model', 'description', 'supplier'),
+              "{row}.id * 4 + 2, 'asset', {row}.id, {row}.serial_number, {row}.tag_number, {row}.name, {row}.model, "
+              "{row}.description, {row}.supplier"),
+    'dispatch': (_dispatch, ('asset_id', 'destination', 'comments'),
+                 "{row}.id * 4 + 3, 'dispatch', {row}.id, a.serial_number, a.tag_number, a.name, a.model, "
+                 "{row}.comments, {row}.destination"),
+}
+
+# Model fields (as search/lookup paths) each kind's documents cover
+INDEXED_FIELDS = {
+    'receiving': {'serial_number', 'name', 'model', 'description', 'supplier', 'invoice_number'},
+    'asset': {'tag_number', 'serial_number', 'name', 'model', 'description', 'supplier'},
+    'dispatch': {'asset__serial_number', 'asset__tag_number', 'asset__name', 'asset__model', 'comments', 'destination'},
+}
+
+_INSERT = f"INSERT INTO {TABLE}(rowid, kind, ref, {', '.join(COLUMNS)})"
+
+
+def _insert_sql(kind, row):
+    """INSERT of the document for ``new`` inside a trigger."""
+    values = _DOCUMENTS[kind][2].format(row=row)
+    if kind == 'dispatch':
+        return f'{_INSERT} SELECT {values} FROM "{_asset}" AS a WHERE a.id = {row}.asset_id;'
+    return f'{_INSERT} VALUES ({values});'
+
+
+def _delete_sql(kind, row):
+    return f"DELETE FROM {TABLE} WHERE rowid = {row}.id * 4 + {KIND_CODES[kind]};"
+
+
+def _trigger_statements():
+    for kind, (table, watched, _) in _DOCUMENTS.items():
+        watched = ', '.join(f'"{column}"' for column in watched)
+        yield f"""
+            CREATE TRIGGER IF NOT EXISTS {TABLE}_{kind}_ai AFTER INSERT ON "{table}" BEGIN
+                {_insert_sql(kind, 'new')}
+            END
+        """
+        yield f"""
+            CREATE TRIGGER IF NOT EXISTS {TABLE}_{kind}_au AFTER UPDATE OF {watched} ON "{table}" BEGIN
+                {_delete_sql(kind, 'old')}
+                {_insert_sql(kind, 'new')}
+            END
+        """
+        yield f"""
+            CREATE TRIGGER IF NOT EXISTS {TABLE}_{kind}_ad AFTER DELETE ON "{table}" BEGIN
+                {_delete_sql(kind, 'old')}
+            END
+        """
+    # Dispatch documents carry their asset's identifiers, so refresh them when those change
+    yield f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_asset_dispatches_au
+        AFTER UPDATE OF "tag_number", "serial_number", "name", "model" ON "{_asset}" BEGIN
+            DELETE FROM {TABLE} WHERE rowid IN (SELECT id * 4 + 3 FROM "{_dispatch}" WHERE asset_id = new.id);
+            {_INSERT} SELECT {_DOCUMENTS['dispatch'][2].format(row='d')}
+                FROM "{_dispatch}" AS d JOIN "{_asset}" AS a ON a.id = d.asset_id WHERE d.asset_id = new.id;
+        END
+    """
+
+
+def is_supported(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def is_installed(using='default'):
+    if not is_supported(using):
+        return False
+    return TABLE in connections[using].introspection.table_names()
+
+
+def install(using='default'):
+    """
+    Create the FTS table and its triggers if they are missing. Safe to run
+    repeatedly; it is called after every ``migrate`` because SQLite table
+    rebuilds drop the triggers on the rebuilt table.
+    """
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            f"kind UNINDEXED, ref UNINDEXED, {', '.join(COLUMNS)}, tokenize = 'trigram')"
+        )
+        for statement in _trigger_statements():
+            cursor.execute(statement)
+
+
+def drop_triggers(using='default'):
+    """
+    Drop the triggers, keeping the index. Migrations that rebuild a source
+    table call this first, since SQLite refuses to rebuild a table another
+    table's trigger refers to; ``install`` puts them back after ``migrate``.
+    """
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        for kind in _DOCUMENTS:
+            for suffix in ('ai', 'au', 'ad'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {TABLE}_{kind}_{suffix}")
+        cursor.execute(f"DROP TRIGGER IF EXISTS {TABLE}_asset_dispatches_au")
+
+
+def uninstall(using='default'):
+    if not is_supported(using):
+        return
+    drop_triggers(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+def rebuild(using='default'):
+    """Re-index every receiving, asset and dispatch in three INSERT ... SELECT statements."""
+    if not is_supported(using):
+        return
+    install(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        for kind, (table, _, values) in _DOCUMENTS.items():
+            join = f' JOIN "{_asset}" AS a ON a.id = src.asset_id' if kind == 'dispatch' else ''
+            cursor.execute(f'{_INSERT} SELECT {values.format(row="src")} FROM "{table}" AS src{join}')
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+def _match_expression(query):
+    # Quote every term so user input cannot inject FTS5 operators; terms are ANDed
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+def rebuild_if_installed(using='default'):
+    """Re-index after a document definition changes; the triggers are replaced too."""
+    if is_installed(using):
+        drop_triggers(using)
+        rebuild(using)
+
+
+def matching(kind, query):
+    """
+    Subquery of the ids of ``kind`` rows matching every term of ``query``, for
+    ``filter(pk__in=...)``. SQLite only, and terms must be at least
+    MIN_QUERY_LENGTH characters long.
+    """
+    return RawSQL(
+        f"SELECT ref FROM {TABLE} WHERE {TABLE} MATCH %s AND kind = %s", (_match_expression(query), kind)
+    )
+
+
+def search(query, kinds=None, limit=20, using='default'):
+    """
+    Return up to ``limit`` ranked hits for ``query`` as dicts with ``kind``,
+    ``id``, the identifying columns and a ``score`` (lower is better on
+    SQLite, where it is the bm25 rank).
+    """
+    kinds = [kind for kind in (kinds or KIND_CODES) if kind in KIND_CODES]
+    if not is_supported(using):
+        return _fallback_search(query, kinds, limit, using)
+
+    terms = [term for term in query.split() if len(term) >= MIN_QUERY_LENGTH]
+    if not terms or not kinds:
+        return []
+    weights = ', '.join(map(str, [0.0, 0.0] + WEIGHTS))
+    sql = (
+        f"SELECT kind, ref, serial_number, tag_number, name, model, bm25({TABLE}, {weights}) AS score "
+        f"FROM {TABLE} WHERE {TABLE} MATCH %s AND kind IN ({', '.join(['%s'] * len(kinds))}) "
+        f"ORDER BY score LIMIT %s"
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [_match_expression(' '.join(terms))] + kinds + [limit])
+        rows = cursor.fetchall()
+    return [
+        {'kind': kind, 'id': ref, 'serial_number': serial, 'tag_number': tag or None,
+         'name': name, 'model': model, 'score': score}
+        for kind, ref, serial, tag, name, model, score in rows
+    ]
+
+
+def _fallback_search(query, kinds, limit, using):
+    sources = {
+        'receiving': (Receiving.objects.using(using), {}, ['serial_number', 'name', 'model', 'description', 'supplier',
+                                                          'invoice_number']),
+        'asset': (Asset.objects.using(using), {}, ['tag_number', 'serial_number', 'name', 'model', 'description', 'supplier']),
+        'dispatch': (Dispatch.objects.using(using), {'serial_number': 'asset__serial_number', 'tag_number': 'asset__tag_number',
+                                                    'name': 'asset__name', 'model': 'asset__model'},
+                     ['asset__tag_number', 'asset__serial_number', 'destination', 'comments']),
+    }
+    hits = []
+    for kind in kinds:
+        queryset, renamed, fields = sources[kind]
+        condition = Q()
+        for term in query.split():
+            term_condition = Q()
+            for field in fields:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        columns = {column: renamed.get(column, column) for column in ('serial_number', 'tag_number', 'name', 'model')}
+        if kind == 'receiving':
+            columns.pop('tag_number')
+        for row in queryset.filter(condition).values('id', *columns.values())[:limit]:
+            hit = {'kind': kind, 'id': row['id'], 'tag_number': None, 'score': None}
+            hit.update({column: row[path] for column, path in columns.items()})
+            hits.append(hit)
+    return hits[:limit]
@@ -0,0 +1,79 @@
+"""
+Counter allocation for human-readable identifiers such as ``SLK001``.
+
+Numbers come from a single ``Sequence`` row that is bumped with
+``UPDATE ... SET value = value + n``. The update takes the row (or, on
+SQLite, the database) write lock, so two transactions can never be handed
+the same number and the cost does not grow with the consignment table.
+
+Setting ``KENET_SLK_BLOCK_SIZE`` above 1 makes each process reserve that many
+numbers at a time and hand them out from memory, trading gaps in the
+sequence (unused numbers are lost when a worker exits) and strict ordering
+across workers for one write per block instead of one per consignment.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+SLK_SEQUENCE = 'consignment_slk'
+
+_lock = threading.Lock()
+_blocks = {}  # sequence name -> [next number, last number] reserved by this process
+
+
+def initial_slk_value(consignment_model):
+    """Highest SLK number already issued, used to seed the sequence."""
+    highest = consignment_model.objects.aggregate(Max('id'))['id__max'] or 0
+    for slk_id in consignment_model.objects.values_list('slk_id', flat=True).iterator():
+        digits = slk_id[3:] if slk_id and slk_id.startswith('SLK') else ''
+        if digits.isdigit():
+            highest = max(highest, int(digits))
+    return highest
+
+
+def reserve(name, count=1, initial=None):
+    """
+    Reserve ``count`` consecutive numbers from sequence ``name`` and return
+    them as a range. ``initial`` is a callable giving the starting value if
+    the sequence row does not exist yet.
+    """
+    from .models import Sequence
+
+    with transaction.atomic():
+        if not Sequence.objects.filter(name=name).update(value=F('value') + count):
+            try:
+                with transaction.atomic():
+                    Sequence.objects.create(name=name, value=(initial() if initial else 0) + count)
+            except IntegrityError:
+                # Created concurrently; take our numbers from the winner's row
+                Sequence.objects.filter(name=name).update(value=F('value') + count)
+        last = Sequence.objects.filter(name=name).values_list('value', flat=True).get()
+    return range(last - count + 1, last + 1)
+
+
+def next_number(name, block_size=1, initial=None):
+    # A block reserved inside a transaction that later rolls back would hand out
+    # numbers the database no longer counts as used, so only reserve blocks in
+    # autocommit mode and take single numbers otherwise
+    if block_size <= 1 or transaction.get_connection().in_atomic_block:
+        return reserve(name, 1, initial)[0]
+    with _lock:
+        block = _blocks.get(name)
+        if block is None or block[0] > block[1]:
+            numbers = reserve(name, block_size, initial)
+            block = _blocks[name] = [numbers[0], numbers[-1]]
+        number = block[0]
+        block[0] += 1
+    return number
+
+
+def next_slk_number():
+    from .models import Consignment
+
+    return next_number(
+        SLK_SEQUENCE,
+        block_size=getattr(settings, 'KENET_SLK_BLOCK_SIZE', 1),
+        initial=lambda: initial_slk_value(Consignment),
+    )
@@ -1,5 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import *
+from django.core.exceptions import ValidationError as DjangoValidationError
+from . import refdata
+from .refdata import CachedPrimaryKeyRelatedField
+from .fieldsets import SparseFieldsMixin
+from .services import bulk_receive, bulk_tag_assets, bulk_transition, tag_number_range
 
 class ConsignmentSerializer(serializers.ModelSerializer):
     location_name = serializers.CharField(source='location.name', read_only=True)
@@ -21,7 +27,7 @@ class ConsignmentSerializer(serializers.ModelSerializer):
         ]
         
 class ConsignmentCreateSerializer(serializers.ModelSerializer):
-    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all())  # Dropdown for location
+    location = CachedPrimaryKeyRelatedField(queryset=Location.objects.all())  # Dropdown for location
     invoice = serializers.FileField()  # For file upload
 
     class Meta:
@@ -33,7 +39,7 @@ class ConsignmentCreateSerializer(serializers.ModelSerializer):
         validated_data['received_by'] = request.user  # Set the received_by field as the current user
         return super().create(validated_data)
 
-class ReceivingSerializer(serializers.ModelSerializer):
+class ReceivingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Receiving
         fields = '__all__'
@@ -44,7 +50,7 @@ from .models import Receiving, Consignment, Category
 
 class ReceivingCreateSerializer(serializers.ModelSerializer):
     consignment = serializers.PrimaryKeyRelatedField(queryset=Consignment.objects.all())
-    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), allow_null=True, required=False)
+    category = CachedPrimaryKeyRelatedField(queryset=Category.objects.all(), allow_null=True, required=False)
     
     # Dropdown for status field
     status = serializers.ChoiceField(choices=Receiving.STATUS_CHOICES)
@@ -73,7 +79,35 @@ class ReceivingCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class AssetSerializer(serializers.ModelSerializer):
+class ReceivingBulkItemSerializer(serializers.Serializer):
+    serial_number = serializers.CharField(max_length=255)
+    description = serializers.CharField()
+    name = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    model = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    category = serializers.IntegerField(required=False, allow_null=True)  # Checked for the whole batch below
+    status = serializers.ChoiceField(choices=Receiving.STATUS_CHOICES, default='pending')
+
+
+class ReceivingBulkCreateSerializer(serializers.Serializer):
+    consignment = serializers.PrimaryKeyRelatedField(queryset=Consignment.objects.all())
+    items = ReceivingBulkItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        limit = getattr(settings, 'KENET_BULK_MAX_ITEMS', 5000)
+        if len(items) > limit:
+            raise serializers.ValidationError(f"At most {limit} items can be received in one request.")
+
+        category_ids = {item['category'] for item in items if item.get('category') is not None}
+        unknown = sorted(refdata.missing(Category, category_ids))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown category id(s): {', '.join(map(str, unknown))}.")
+        return items
+
+    def create(self, validated_data):
+        return bulk_receive(validated_data['consignment'], validated_data['items'])
+
+
+class AssetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Asset
         fields = '__all__'
@@ -107,6 +141,8 @@ class LoginSerializer(serializers.Serializer):
 
 
 class DispatchSerializer(serializers.ModelSerializer):
+    location = CachedPrimaryKeyRelatedField(queryset=Location.objects.all(), allow_null=True, required=False)
+
     class Meta:
         model = Dispatch
         fields = ['id', 'asset', 'user', 'approver', 'status', 'datetime', 'comments', 'destination', 'location']
@@ -148,6 +184,53 @@ class AssetCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class AssetBulkTagSerializer(serializers.Serializer):
+    """Tag approved receivings with either an explicit list of tag numbers or a numbered range."""
+    receivings = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    tag_numbers = serializers.ListField(child=serializers.CharField(max_length=255), required=False)
+    tag_prefix = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    tag_start = serializers.IntegerField(min_value=0, required=False)
+    tag_width = serializers.IntegerField(min_value=0, max_value=20, default=0)
+    status = serializers.ChoiceField(choices=Asset.STATUS_CHOICES, default='available')
+
+    def validate(self, attrs):
+        limit = getattr(settings, 'KENET_BULK_MAX_ITEMS', 5000)
+        if len(attrs['receivings']) > limit:
+            raise serializers.ValidationError(f"At most {limit} receivings can be tagged in one request.")
+        if 'tag_numbers' in attrs:
+            if 'tag_start' in attrs:
+                raise serializers.ValidationError("Give either tag_numbers or tag_start, not both.")
+        elif 'tag_start' in attrs:
+            attrs['tag_numbers'] = tag_number_range(
+                attrs.get('tag_prefix', ''), attrs['tag_start'], len(attrs['receivings']), attrs['tag_width']
+            )
+        else:
+            raise serializers.ValidationError("Either tag_numbers or tag_start is required.")
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            return bulk_tag_assets(validated_data['receivings'], validated_data['tag_numbers'], validated_data['status'])
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+
+
+class StatusTransitionSerializer(serializers.Serializer):
+    """Move a batch of receivings or assets (the ``model`` in the context) to one status."""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.CharField(max_length=20)  # Checked against the model's transitions by bulk_transition
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        try:
+            return bulk_transition(
+                self.context['model'], validated_data['ids'], validated_data['status'],
+                user=request.user if request and request.user.is_authenticated else None,
+            )
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+
+
 from .models import Location
 
 class LocationSerializer(serializers.ModelSerializer):
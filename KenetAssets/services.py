@@ -0,0 +1,276 @@
+"""
+Set-based operations on inventory rows.
+
+These bypass the per-row ``save()`` methods on the models, so each function is
+responsible for doing the same denormalisation those methods do, just once
+per batch instead of once per row.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import summary, sync, versioning
+from .models import Consignment, Receiving, Asset, AssetSummary, ReceivingSummary, StatusChange
+
+# Keep well under SQLite's bound-parameter limit for IN (...) lookups
+IN_BATCH_SIZE = 900
+
+
+def chunked(values, size=IN_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def existing_serial_numbers(serial_numbers):
+    """Return the subset of ``serial_numbers`` already used by a Receiving."""
+    existing = set()
+    for chunk in chunked(set(serial_numbers)):
+        existing.update(
+            Receiving.objects.filter(serial_number__in=chunk).values_list('serial_number', flat=True)
+        )
+    return existing
+
+
+def bulk_receive(consignment, items):
+    """
+    Create a Receiving for every item in ``items`` (dicts with serial_number,
+    description and optionally name, model, category and status) under
+    ``consignment``.
+
+    Serial numbers that already exist, or repeat within the batch, are
+    skipped. Returns one result dict per item, in input order.
+    """
+    results = []
+    to_create = []
+    with transaction.atomic():
+        taken = existing_serial_numbers(item['serial_number'] for item in items)
+        for item in items:
+            serial_number = item['serial_number']
+            if serial_number in taken:
+                results.append({
+                    'serial_number': serial_number,
+                    'status': 'duplicate',
+                    'error': f"An item with the serial number '{serial_number}' already exists.",
+                })
+                continue
+            taken.add(serial_number)
+            receiving = Receiving(
+                consignment=consignment,
+                serial_number=serial_number,
+                description=item['description'],
+                name=item.get('name'),
+                model=item.get('model'),
+                category_id=item.get('category'),
+                status=item.get('status', 'pending'),
+                # Copied from the consignment once for the whole batch, as Receiving.save does per row
+                supplier=consignment.supplier,
+                received_by_id=consignment.received_by_id,
+                invoice_number=consignment.invoice_number,
+                location_id=consignment.location_id,
+            )
+            to_create.append(receiving)
+            results.append({'serial_number': serial_number, 'status': 'created', 'receiving': receiving})
+
+        Receiving.objects.bulk_create(to_create, batch_size=500)
+        summary.apply(ReceivingSummary, Counter(summary.receiving_key(consignment.pk, r.status) for r in to_create))
+        versioning.bump(Receiving)
+
+    for result in results:
+        if 'receiving' in result:
+            result['id'] = result.pop('receiving').pk
+    return results
+
+
+def tag_number_range(prefix, start, count, width=0):
+    """``tag_number_range('KENET-', 7, 3, width=4)`` -> KENET-0007, KENET-0008, KENET-0009"""
+    return [f'{prefix}{number:0{width}d}' for number in range(start, start + count)]
+
+
+def bulk_tag_assets(receiving_ids, tag_numbers, status='available'):
+    """
+    Create one Asset per approved Receiving in ``receiving_ids``, pairing them
+    with ``tag_numbers`` in order. The whole batch is validated up front and
+    either every asset is created or a ValidationError lists what is wrong.
+    """
+    receiving_ids = list(receiving_ids)
+    tag_numbers = list(tag_numbers)
+    errors = []
+    if len(tag_numbers) != len(receiving_ids):
+        errors.append(f"Got {len(tag_numbers)} tag numbers for {len(receiving_ids)} receivings.")
+    if len(set(receiving_ids)) != len(receiving_ids):
+        errors.append("The same receiving was selected more than once.")
+    repeated = sorted(tag for tag, n in Counter(tag_numbers).items() if n > 1)
+    if repeated:
+        errors.append(f"Tag numbers repeated in the request: {', '.join(repeated)}.")
+
+    with transaction.atomic():
+        receivings = {}
+        tagged = set()
+        taken = set()
+        for chunk in chunked(receiving_ids):
+            receivings.update((r.pk, r) for r in Receiving.objects.filter(pk__in=chunk))
+            tagged.update(Asset.objects.filter(receiving_id__in=chunk).values_list('receiving_id', flat=True))
+        for chunk in chunked(tag_numbers):
+            taken.update(Asset.objects.filter(tag_number__in=chunk).values_list('tag_number', flat=True))
+
+        missing = [pk for pk in receiving_ids if pk not in receivings]
+        if missing:
+            errors.append(f"Unknown receiving id(s): {', '.join(map(str, missing))}.")
+        unapproved = [str(r) for r in receivings.values() if r.status != 'approved']
+        if unapproved:
+            errors.append(f"Only approved receivings can be tagged: {', '.join(unapproved)}.")
+        if tagged:
+            errors.append(f"Already tagged: {', '.join(str(receivings[pk]) for pk in sorted(tagged))}.")
+        if taken:
+            errors.append(f"Tag numbers already in use: {', '.join(sorted(taken))}.")
+        if errors:
+            raise ValidationError(errors)
+
+        assets = []
+        for pk, tag_number in zip(receiving_ids, tag_numbers):
+            receiving = receivings[pk]
+            # The same fields Asset.save copies from its receiving
+            assets.append(Asset(
+                receiving=receiving,
+                tag_number=tag_number,
+                status=status,
+                description=receiving.description,
+                serial_number=receiving.serial_number,
+                name=receiving.name,
+                model=receiving.model,
+                received_by_id=receiving.received_by_id,
+                location_id=receiving.location_id,
+                invoice_number=receiving.invoice_number,
+                supplier=receiving.supplier,
+            ))
+        Asset.objects.bulk_create(assets, batch_size=500)
+        summary.apply(AssetSummary, Counter(
+            summary.asset_key(a.status, a.location_id, a.receiving.category_id) for a in assets
+        ))
+        versioning.bump(Asset)
+    return assets
+
+
+# Fields Receiving.save copies from its consignment, and Asset.save from its receiving
+CONSIGNMENT_COPIED_FIELDS = ('supplier', 'received_by', 'invoice_number', 'location')
+RECEIVING_COPIED_FIELDS = (
+    'description', 'serial_number', 'name', 'model', 'received_by', 'location', 'invoice_number', 'supplier',
+)
+
+
+
+def consignment_copied_attnames():
+    """Column attribute names (location_id rather than location) so no related rows get loaded."""
+    return [Consignment._meta.get_field(field).attname for field in CONSIGNMENT_COPIED_FIELDS]
+
+
+def propagate_consignment(consignment):
+    """
+    Rewrite the copies of ``consignment``'s supplier, received_by,
+    invoice_number and location held by its receivings and their assets.
+    Two UPDATE statements regardless of how many rows are affected.
+    """
+    values = {name: getattr(consignment, name) for name in consignment_copied_attnames()}
+    values['updated_at'] = timezone.now()  # update() skips auto_now; delta sync relies on it
+    assets = Asset.objects.filter(receiving__consignment_id=consignment.pk)
+    with transaction.atomic():
+        before = summary.grouped_keys(assets)
+        receivings = Receiving.objects.filter(consignment_id=consignment.pk).update(**values)
+        updated = assets.update(**values)
+        # A location change moves the assets between summary groups
+        after = summary.grouped_keys(assets)
+        summary.apply(AssetSummary, {key: after[key] - before[key] for key in before.keys() | after.keys()})
+        versioning.bump(Receiving, Asset)
+    return receivings, updated
+
+
+def resync_consignments(consignment_ids):
+    """
+    Re-copy every denormalised field for the receivings and assets under
+    ``consignment_ids`` from their parents, using correlated subqueries so the
+    database does the copying. Returns ``(receivings, assets)`` rows updated.
+    """
+    consignment = Consignment.objects.filter(pk=OuterRef('consignment_id'))
+    receiving = Receiving.objects.filter(pk=OuterRef('receiving_id'))
+    with transaction.atomic():
+        # Receivings first so the assets copy the refreshed values
+        now = timezone.now()
+        receivings = Receiving.objects.filter(consignment_id__in=consignment_ids).update(updated_at=now, **{
+            field: Subquery(consignment.values(field)[:1]) for field in CONSIGNMENT_COPIED_FIELDS
+        })
+        assets = Asset.objects.filter(receiving__consignment_id__in=consignment_ids).update(updated_at=now, **{
+            field: Subquery(receiving.values(field)[:1]) for field in RECEIVING_COPIED_FIELDS
+        })
+        versioning.bump(Receiving, Asset)
+    return receivings, assets
+
+
+def bulk_transition(model, ids, to_status, user=None):
+    """
+    Move every Receiving or Asset in ``ids`` to ``to_status``. The whole set is
+    checked against ``model.STATUS_TRANSITIONS`` up front, reading the current
+    statuses with one query per IN_BATCH_SIZE ids. Then either every row is
+    moved, with one UPDATE per (current status, chunk) and a StatusChange
+    written for each, or a ValidationError lists what is wrong. Rows already in
+    ``to_status`` are left alone. Returns ``(changed, unchanged)`` counts.
+    """
+    ids = list(dict.fromkeys(ids))
+    limit = getattr(settings, 'KENET_BULK_TRANSITION_MAX_ITEMS', 20000)
+    if len(ids) > limit:
+        raise ValidationError(f"At most {limit} rows can be transitioned in one request.")
+    valid = {choice for choice, _ in model.STATUS_CHOICES}
+    if to_status not in valid:
+        raise ValidationError(f"'{to_status}' is not a valid status; choose from {', '.join(sorted(valid))}.")
+
+    # Each row's summary key, which includes its status
+    summary_model = summary.SUMMARY_FOR[model]
+    paths = summary.SOURCES[summary_model][1]
+    status_index = summary.KEY_FIELDS[summary_model].index('status')
+    build = summary.KEY_BUILDERS[model]
+    with transaction.atomic():
+        keys = {}
+        for chunk in chunked(ids):
+            keys.update((pk, build(*row)) for pk, *row in model.objects.filter(pk__in=chunk).values_list('pk', *paths))
+
+        errors = []
+        missing = [pk for pk in ids if pk not in keys]
+        if missing:
+            errors.append(f"Unknown id(s): {', '.join(map(str, missing[:20]))}{' ...' if len(missing) > 20 else ''}.")
+        by_status = defaultdict(list)
+        for pk, key in keys.items():
+            by_status[key[status_index]].append(pk)
+        for from_status, pks in sorted(by_status.items()):
+            if from_status != to_status and to_status not in model.STATUS_TRANSITIONS.get(from_status, ()):
+                errors.append(f"{len(pks)} row(s) cannot go from {from_status} to {to_status}.")
+        if errors:
+            raise ValidationError(errors)
+
+        now = timezone.now()
+        resource = sync.RESOURCE_FOR[model]
+        deltas = Counter()
+        changes = []
+        for from_status, pks in by_status.items():
+            if from_status == to_status:
+                continue
+            for chunk in chunked(pks):
+                # Matching on the status read above keeps the summary deltas exact
+                if model.objects.filter(pk__in=chunk, status=from_status).update(status=to_status, updated_at=now) != len(chunk):
+                    raise ValidationError("Some rows changed status during the transition; try again.")
+            for pk in pks:
+                key = keys[pk]
+                deltas[key] -= 1
+                deltas[key[:status_index] + (to_status,) + key[status_index + 1:]] += 1
+                changes.append(StatusChange(
+                    resource=resource, object_id=pk, from_status=from_status, to_status=to_status,
+                    changed_by=user, changed_at=now,
+                ))
+        StatusChange.objects.bulk_create(changes, batch_size=500)
+        summary.apply(summary_model, deltas)
+        if changes:
+            versioning.bump(model)
+    return len(changes), len(ids) - len(changes)
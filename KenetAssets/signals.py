@@ -0,0 +1,173 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from . import authentication, invoices, jobs, refdata, search, summary, sync, versioning
+from .models import Location, Category, Consignment, Receiving, Asset, Dispatch
+from .services import consignment_copied_attnames, propagate_consignment
+
+
+@receiver(pre_save, sender=Consignment)
+def detect_copied_field_changes(sender, instance, raw=False, **kwargs):
+    instance._copied_fields_changed = False
+    instance._stored_invoice = None
+    if raw or instance.pk is None:
+        return
+    attnames = consignment_copied_attnames()
+    previous = sender.objects.filter(pk=instance.pk).values('invoice', *attnames).first()
+    if previous is not None:
+        instance._copied_fields_changed = any(previous[name] != getattr(instance, name) for name in attnames)
+        instance._stored_invoice = previous['invoice']
+
+
+@receiver(post_save, sender=Consignment)
+def propagate_copied_fields(sender, instance, created, raw=False, **kwargs):
+    # Receivings and assets copy these fields only when they are saved, so push
+    # corrections down once the consignment change has been committed
+    if not raw and not created and getattr(instance, '_copied_fields_changed', False):
+        transaction.on_commit(lambda: propagate_consignment(instance))
+
+
+@receiver(post_save, sender=Consignment)
+def count_invoice_reference(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invoices.move_reference(getattr(instance, '_stored_invoice', None), instance.invoice.name)
+
+
+@receiver(post_save, sender=Consignment)
+def queue_invoice_processing(sender, instance, created, raw=False, **kwargs):
+    # Extraction is slow, so it runs in a background worker (manage.py run_job_workers).
+    # The job row commits or rolls back together with the consignment.
+    if not raw and instance.invoice and (created or instance._stored_invoice != instance.invoice.name):
+        jobs.enqueue('process_invoice', consignment_id=instance.pk)
+
+
+@receiver(post_delete, sender=Consignment)
+def release_invoice_reference(sender, instance, **kwargs):
+    invoices.add_reference(instance.invoice.name, -1)
+
+
+def install_search_triggers(sender, using, plan=None, **kwargs):
+    # SQLite drops a table's triggers whenever a migration rebuilds it, so put them back
+    if search.is_installed(using):
+        search.install(using)
+
+
+# Inventory summary counters (see KenetAssets.summary)
+
+@receiver(pre_save, sender=Asset)
+@receiver(pre_save, sender=Receiving)
+@receiver(pre_save, sender=Dispatch)
+def remember_summary_key(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._summary_key = summary.stored_key(instance)
+        if sender is Receiving and instance.pk is not None:
+            instance._stored_category_id = Receiving.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_save, sender=Receiving)
+@receiver(post_save, sender=Dispatch)
+def update_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    summary_model, key = summary.key_for(instance)
+    summary.move(summary_model, None if created else getattr(instance, '_summary_key', None), key)
+
+    old_category_id = getattr(instance, '_stored_category_id', None)
+    if sender is Receiving and not created and old_category_id != instance.category_id:
+        # Assets are counted under their receiving's category
+        deltas = Counter()
+        for (status, location_key, category_key), n in summary.grouped_keys(instance.assets.all()).items():
+            deltas[(status, location_key, category_key)] += n
+            deltas[summary.asset_key(status, location_key, old_category_id)] -= n
+        summary.apply(summary.AssetSummary, deltas)
+
+
+@receiver(pre_delete, sender=Asset)
+@receiver(pre_delete, sender=Receiving)
+@receiver(pre_delete, sender=Dispatch)
+def remember_deleted_summary_key(sender, instance, **kwargs):
+    # Read before anything is deleted; an asset's receiving may go in the same cascade
+    instance._summary_key = summary.stored_key(instance)
+
+
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=Receiving)
+@receiver(post_delete, sender=Dispatch)
+def update_summary_on_delete(sender, instance, **kwargs):
+    key = getattr(instance, '_summary_key', None)
+    if key is not None:
+        summary.apply(summary.SUMMARY_FOR[sender], {key: -1})
+
+
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Category)
+def rebuild_summary_after_reference_delete(sender, instance, **kwargs):
+    # Rows pointing at the deleted location/category are set to NULL with a
+    # bulk UPDATE that sends no signals; rare enough to simply recount
+    transaction.on_commit(summary.rebuild)
+
+
+# List versions for ETags and the list response cache (see KenetAssets.versioning)
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Consignment)
+@receiver(post_save, sender=Receiving)
+@receiver(post_save, sender=Asset)
+@receiver(post_save, sender=Dispatch)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Consignment)
+@receiver(post_delete, sender=Receiving)
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=Dispatch)
+def bump_list_version(sender, **kwargs):
+    versioning.bump(sender)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Category)
+def invalidate_reference_data(sender, **kwargs):
+    refdata.invalidate(sender)
+
+
+# Delta sync (see KenetAssets.sync)
+
+@receiver(post_delete, sender=Consignment)
+@receiver(post_delete, sender=Receiving)
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=Dispatch)
+def record_tombstone(sender, instance, **kwargs):
+    sync.record_deletion(instance)
+
+
+@receiver(pre_delete, sender=Location)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=User)
+def touch_rows_losing_a_reference(sender, instance, **kwargs):
+    # The rows' foreign keys change under the list ETags too
+    versioning.bump(*sync.touch_referencing(instance))
+
+
+# Cached token authentication (see KenetAssets.authentication)
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    authentication.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, raw=False, **kwargs):
+    # The cached token carries a copy of the user, so any change (deactivation,
+    # new password, renamed) has to be re-read from the database
+    if not raw:
+        authentication.invalidate(Token.objects.filter(user=instance).values_list('key', flat=True))
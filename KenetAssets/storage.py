@@ -0,0 +1,73 @@
+"""
+Content-addressed file storage for consignment invoices.
+
+An upload is streamed to a temporary file in chunks while its SHA-256 is
+computed, then moved to ``<upload_to>/<first two hex digits>/<digest><ext>``.
+If that file already exists the upload is discarded and the existing name
+returned, so identical invoices are stored once however often they are
+uploaded. Reference counts live in ``InvoiceBlob`` (see ``KenetAssets.invoices``).
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+_BLOB_NAME = re.compile(r'(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})(\.[^/]*)?$')
+
+
+def digest_of(name):
+    """The SHA-256 a content-addressed ``name`` was stored under, or None for any other name."""
+    match = _BLOB_NAME.search(name or '')
+    return match.group(1) if match else None
+
+
+@deconstructible(path='KenetAssets.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content, see _save
+        return name
+
+    def blob_name(self, digest, name):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            blob_name = self.blob_name(digest.hexdigest(), name)
+            path = self.path(blob_name)
+            if os.path.exists(path):
+                os.remove(temp_path)  # Already stored
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.directory_permissions_mode is not None:
+                    os.chmod(os.path.dirname(path), self.directory_permissions_mode)
+                os.replace(temp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return blob_name
+
+
+_invoice_storage = ContentAddressedStorage()
+
+
+def invoice_storage():
+    """Storage of ``Consignment.invoice`` (a callable so migrations don't record settings-derived paths)."""
+    return _invoice_storage
@@ -0,0 +1,153 @@
+"""
+Incrementally maintained inventory counts for the dashboard.
+
+* ``AssetSummary``: assets by status x location x category (via the receiving)
+* ``ReceivingSummary``: receivings by consignment x status
+* ``DispatchSummary``: dispatches by status x location
+
+Per-row saves and deletes are tracked by the signal handlers in
+``KenetAssets.signals``. The set-based functions in ``KenetAssets.services``
+bypass those signals and call ``apply`` with the deltas for their batch.
+``rebuild`` recomputes everything with GROUP BY queries.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import (
+    Location, Category, Consignment, Asset, Receiving, Dispatch, AssetSummary, ReceivingSummary, DispatchSummary,
+)
+
+# summary model -> key fields, in the order keys are stored as tuples
+KEY_FIELDS = {
+    AssetSummary: ('status', 'location_key', 'category_key'),
+    ReceivingSummary: ('consignment_key', 'status'),
+    DispatchSummary: ('status', 'location_key'),
+}
+
+# summary model -> (source model, source paths producing its key fields)
+SOURCES = {
+    AssetSummary: (Asset, ('status', 'location_id', 'receiving__category_id')),
+    ReceivingSummary: (Receiving, ('consignment_id', 'status')),
+    DispatchSummary: (Dispatch, ('status', 'location_id')),
+}
+
+
+def asset_key(status, location_id, category_id):
+    return (status, location_id or 0, category_id or 0)
+
+
+def receiving_key(consignment_id, status):
+    return (consignment_id, status)
+
+
+def dispatch_key(status, location_id):
+    return (status, location_id or 0)
+
+
+def key_for(instance):
+    """Summary model and key an Asset, Receiving or Dispatch currently counts towards."""
+    if isinstance(instance, Asset):
+        category_id = instance.receiving.category_id if instance.receiving_id else None
+        return AssetSummary, asset_key(instance.status, instance.location_id, category_id)
+    if isinstance(instance, Receiving):
+        return ReceivingSummary, receiving_key(instance.consignment_id, instance.status)
+    return DispatchSummary, dispatch_key(instance.status, instance.location_id)
+
+
+SUMMARY_FOR = {Asset: AssetSummary, Receiving: ReceivingSummary, Dispatch: DispatchSummary}
+KEY_BUILDERS = {Asset: asset_key, Receiving: receiving_key, Dispatch: dispatch_key}
+
+
+def stored_key(instance):
+    """Key of ``instance`` as currently stored in the database, or None if it is not saved yet."""
+    if instance.pk is None:
+        return None
+    model = type(instance)
+    row = model.objects.filter(pk=instance.pk).values_list(*SOURCES[SUMMARY_FOR[model]][1]).first()
+    return None if row is None else KEY_BUILDERS[model](*row)
+
+
+def grouped_keys(queryset):
+    """Counter of summary keys for the rows of an Asset/Receiving/Dispatch queryset, in one GROUP BY."""
+    summary_model = SUMMARY_FOR[queryset.model]
+    paths = SOURCES[summary_model][1]
+    build = KEY_BUILDERS[queryset.model]
+    rows = queryset.order_by().values_list(*paths).annotate(n=Count('pk'))
+    counts = Counter()
+    for *key, n in rows:
+        counts[build(*key)] += n
+    return counts
+
+
+def apply(summary_model, deltas):
+    """Add ``deltas`` (a mapping of key tuple -> change in count) to ``summary_model``."""
+    fields = KEY_FIELDS[summary_model]
+    with transaction.atomic():
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            lookup = dict(zip(fields, key))
+            if summary_model.objects.filter(**lookup).update(count=F('count') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    summary_model.objects.create(count=delta, **lookup)
+            except IntegrityError:
+                # Another writer created the group first
+                summary_model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def move(summary_model, old_key, new_key):
+    if old_key != new_key:
+        apply(summary_model, {key: delta for key, delta in ((old_key, -1), (new_key, 1)) if key is not None})
+
+
+def rebuild():
+    """Recompute every summary table from scratch."""
+    with transaction.atomic():
+        for summary_model, (source, _) in SOURCES.items():
+            summary_model.objects.all().delete()
+            fields = KEY_FIELDS[summary_model]
+            summary_model.objects.bulk_create([
+                summary_model(count=n, **dict(zip(fields, key)))
+                for key, n in grouped_keys(source.objects.all()).items()
+            ], batch_size=500)
+
+
+def snapshot(consignment=None):
+    """
+    The dashboard counts, with location/category/consignment names resolved
+    in one query per table. Cost depends on the number of groups, not rows.
+    """
+    assets = list(AssetSummary.objects.filter(count__gt=0).order_by('status', 'location_key', 'category_key'))
+    receivings = ReceivingSummary.objects.filter(count__gt=0).order_by('consignment_key', 'status')
+    if consignment is not None:
+        receivings = receivings.filter(consignment_key=consignment)
+    receivings = list(receivings)
+    dispatches = list(DispatchSummary.objects.filter(count__gt=0).order_by('status', 'location_key'))
+
+    locations = dict(Location.objects.filter(
+        pk__in={row.location_key for row in assets + dispatches}).values_list('pk', 'name'))
+    categories = dict(Category.objects.filter(pk__in={row.category_key for row in assets}).values_list('pk', 'name'))
+    consignments = dict(Consignment.objects.filter(
+        pk__in={row.consignment_key for row in receivings}).values_list('pk', 'slk_id'))
+
+    return {
+        'assets': [
+            {'status': row.status, 'location_id': row.location_key or None, 'location': locations.get(row.location_key),
+             'category_id': row.category_key or None, 'category': categories.get(row.category_key), 'count': row.count}
+            for row in assets
+        ],
+        'receivings': [
+            {'consignment_id': row.consignment_key, 'consignment': consignments.get(row.consignment_key),
+             'status': row.status, 'count': row.count}
+            for row in receivings
+        ],
+        'dispatches': [
+            {'status': row.status, 'location_id': row.location_key or None, 'location': locations.get(row.location_key),
+             'count': row.count}
+            for row in dispatches
+        ],
+    }
@@ -0,0 +1,136 @@
+"""
+Delta sync for offline clients: "what changed since my last sync".
+
+Consignments, receivings, assets and dispatches carry an ``updated_at``
+(``auto_now`` on save; every ``QuerySet.update()`` on them sets it
+explicitly). Deletions leave a ``Tombstone``. A client pages through
+``sync/<resource>/`` and keeps the returned ``cursor``, an opaque pair of
+watermarks: ``(updated_at, id)`` of the last changed row it has received,
+and ``(deleted_at, id)`` of the last tombstone. The next sync returns only
+what comes after them, read in order from the ``(updated_at, id)`` indexes,
+so its cost follows the number of changes, not the table size.
+
+Rows stamped in the last ``KENET_SYNC_LAG_SECONDS`` are held back until the
+next sync. A transaction that took its timestamp earlier but commits later
+would otherwise land behind a watermark a client has already passed.
+Tombstones are kept for ``KENET_TOMBSTONE_RETENTION_DAYS``
+(``manage.py prune_tombstones``). A cursor older than that gets a 410, and
+the client starts over without a cursor.
+"""
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import SET_NULL, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Consignment, Receiving, Asset, Dispatch, Tombstone
+
+RESOURCES = {
+    'consignments': Consignment,
+    'receivings': Receiving,
+    'assets': Asset,
+    'dispatches': Dispatch,
+}
+RESOURCE_FOR = {model: resource for resource, model in RESOURCES.items()}
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class SyncError(ValueError):
+    pass
+
+
+class CursorExpired(SyncError):
+    pass
+
+
+def encode_cursor(changed, deleted):
+    payload = json.dumps([changed[0].isoformat(), changed[1], deleted[0].isoformat(), deleted[1]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        changed_at, changed_id, deleted_at, deleted_id = payload
+        changed = (parse_datetime(changed_at), int(changed_id))
+        deleted = (parse_datetime(deleted_at), int(deleted_id))
+    except (TypeError, ValueError):
+        raise SyncError("Invalid cursor.")
+    if changed[0] is None or deleted[0] is None:
+        raise SyncError("Invalid cursor.")
+    return changed, deleted
+
+
+def _after(field, watermark):
+    moment, pk = watermark
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk})
+
+
+def changes(resource, cursor=None, limit=500):
+    """
+    One page of changes to ``resource`` after ``cursor`` (None for a full
+    sync). Returns ``(changed_ids, deleted_ids, next_cursor, more)``;
+    ``changed_ids`` are in (updated_at, id) order.
+    """
+    model = RESOURCES[resource]
+    now = timezone.now()
+    horizon = now - datetime.timedelta(seconds=getattr(settings, 'KENET_SYNC_LAG_SECONDS', 2))
+    if cursor is None:
+        # Nothing deleted before the first sync concerns the client
+        changed, deleted = (_EPOCH, 0), (horizon, 0)
+    else:
+        changed, deleted = decode_cursor(cursor)
+        retention = datetime.timedelta(days=getattr(settings, 'KENET_TOMBSTONE_RETENTION_DAYS', 90))
+        if deleted[0] < now - retention:
+            raise CursorExpired("The cursor is older than the kept deletions; sync again without it.")
+
+    rows = list(
+        model.objects.filter(_after('updated_at', changed), updated_at__lte=horizon)
+        .order_by('updated_at', 'id').values_list('updated_at', 'id')[:limit + 1]
+    )
+    tombstones = list(
+        Tombstone.objects.filter(_after('deleted_at', deleted), resource=resource, deleted_at__lte=horizon)
+        .order_by('deleted_at', 'id').values_list('deleted_at', 'id', 'object_id')[:limit + 1]
+    )
+    more = len(rows) > limit or len(tombstones) > limit
+    rows, tombstones = rows[:limit], tombstones[:limit]
+    if rows:
+        changed = rows[-1]
+    if tombstones:
+        deleted = tombstones[-1][:2]
+    elif deleted[0] < horizon:
+        # Nothing deleted up to the horizon: move past it, so a client that syncs
+        # regularly never falls behind the tombstone retention
+        deleted = (horizon, 0)
+    return [pk for _, pk in rows], [object_id for _, _, object_id in tombstones], encode_cursor(changed, deleted), more
+
+
+def record_deletion(instance):
+    Tombstone.objects.create(resource=RESOURCE_FOR[type(instance)], object_id=instance.pk)
+
+
+def touch_referencing(instance):
+    """
+    Stamp the synced rows whose SET_NULL foreign keys point at ``instance``,
+    which is about to be deleted: the collector nulls them with an UPDATE
+    that leaves ``updated_at`` alone and sends no signals. Returns the models
+    that had such rows, whose list versions must be bumped too.
+    """
+    now = timezone.now()
+    touched = set()
+    for model in RESOURCES.values():
+        for field in model._meta.concrete_fields:
+            if field.is_relation and field.related_model is type(instance) and field.remote_field.on_delete is SET_NULL:
+                if model.objects.filter(**{field.name: instance}).update(updated_at=now):
+                    touched.add(model)
+    return touched
+
+
+def prune(days=None):
+    """Delete tombstones older than the retention period. Returns how many."""
+    days = getattr(settings, 'KENET_TOMBSTONE_RETENTION_DAYS', 90) if days is None else days
+    return Tombstone.objects.filter(deleted_at__lt=timezone.now() - datetime.timedelta(days=days)).delete()[0]
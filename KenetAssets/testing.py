@@ -0,0 +1,70 @@
+"""
+Helpers shared by the KenetAssets test-suite.
+
+``seed_inventory`` creates complete consignment -> receiving -> asset ->
+dispatch chains, each with its own location and users so that a missing
+``select_related`` shows up as extra queries. ``QueryBudgetMixin`` seeds
+growing amounts of data and asserts that an endpoint keeps running the same
+number of queries.
+"""
+import itertools
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Location, Category, Consignment, Receiving, Asset, Dispatch
+
+_counter = itertools.count(1)
+
+
+def seed_inventory(n, status='approved'):
+    """Create ``n`` full inventory chains and return the created dispatches."""
+    dispatches = []
+    for _ in range(n):
+        i = next(_counter)
+        user = User.objects.create_user(username=f'seed-user-{i}', first_name='Seed', last_name=str(i))
+        location = Location.objects.create(name=f'Seed Location {i}')
+        category = Category.objects.create(name=f'Seed Category {i}')
+        consignment = Consignment.objects.create(
+            supplier=f'Supplier {i}', quantity=1, location=location, received_by=user,
+            invoice_number=f'INV-{i}',
+        )
+        receiving = Receiving.objects.create(
+            consignment=consignment, serial_number=f'SEED-SN-{i}', description='Seeded item',
+            name='Router', model='ASR-920', category=category, status=status,
+        )
+        asset = Asset.objects.create(receiving=receiving, tag_number=f'SEED-TAG-{i}')
+        dispatches.append(Dispatch.objects.create(asset=asset, user=user, approver=user, status='pending'))
+    return dispatches
+
+
+class QueryBudgetMixin:
+    """
+    Mix into a ``TestCase`` to assert that an endpoint's query count does not
+    depend on the number of rows it returns.
+    """
+    query_budget_sizes = (2, 12)
+
+    def count_queries(self, url, client=None, **extra):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, budget=None, seed=seed_inventory, client=None, **extra):
+        """
+        Seed rows in steps of ``query_budget_sizes`` and check ``url`` runs the
+        same number of queries after each step (and no more than ``budget``).
+        """
+        counts = []
+        seeded = 0
+        for size in self.query_budget_sizes:
+            seed(size - seeded)
+            seeded = size
+            counts.append(self.count_queries(url, client=client, **extra))
+        self.assertEqual(len(set(counts)), 1, f'{url} query count grows with rows: {counts}')
+        if budget is not None:
+            self.assertLessEqual(counts[0], budget, f'{url} ran {counts[0]} queries, budget is {budget}')
+        return counts[0]
@@ -1,6 +1,10 @@
+import json
+
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db import connection, connections
 
 class UserAuthTests(TestCase):
 
@@ -21,3 +25,1329 @@ class UserAuthTests(TestCase):
         })
         self.assertEqual(response.status_code, 302)  # Check for redirect on success
         self.assertTrue(response.wsgi_request.user.is_authenticated)
+
+
+from django.test import override_settings
+from .models import Location, Consignment, Receiving
+
+
+@override_settings(KENET_PAGE_SIZE=2)
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='clerk', password='password123')
+        location = Location.objects.create(name='Nairobi')
+        consignment = Consignment.objects.create(supplier='Cisco', quantity=5, location=location, received_by=user)
+        for i in range(5):
+            Receiving.objects.create(consignment=consignment, serial_number=f'SN{i}', description='Switch')
+
+    def test_walks_every_page_once(self):
+        seen = []
+        url = reverse('list_receivings')
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(row['serial_number'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, ['SN4', 'SN3', 'SN2', 'SN1', 'SN0'])
+
+    def test_page_size_param_is_capped(self):
+        with self.settings(KENET_MAX_PAGE_SIZE=3):
+            response = self.client.get(reverse('list_receivings'), {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 3)
+
+
+from rest_framework.authtoken.models import Token
+from .testing import QueryBudgetMixin
+
+
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def test_list_consignments(self):
+        self.assertConstantQueries(reverse('list_consignments'), budget=1)
+
+    def test_list_receivings(self):
+        self.assertConstantQueries(reverse('list_receivings'), budget=1)
+
+    def test_list_assets(self):
+        self.assertConstantQueries(reverse('list_assets'), budget=1)
+
+    @override_settings(KENET_TOKEN_CACHE_SHARED=True)
+    def test_list_dispatches(self):
+        token = Token.objects.create(user=User.objects.create_user(username='viewer'))
+        auth = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        self.client.get(reverse('list_dispatches'), **auth)  # Caches the token, see CachedTokenAuthentication
+        self.assertConstantQueries(reverse('list_dispatches'), budget=1, **auth)
+
+    def test_reference_viewsets(self):
+        self.assertConstantQueries('/api/locations/', budget=1)
+        self.assertConstantQueries('/api/categories/', budget=1)
+
+
+from rest_framework.test import APIClient
+
+
+class BulkReceivingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='receiver', password='password123')
+        self.location = Location.objects.create(name='Mombasa')
+        self.consignment = Consignment.objects.create(
+            supplier='Juniper', quantity=500, location=self.location, received_by=self.user, invoice_number='INV-9'
+        )
+        Receiving.objects.create(consignment=self.consignment, serial_number='TAKEN', description='Old')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_intake_reports_per_row_results(self):
+        items = [{'serial_number': f'BULK{i}', 'description': 'Optic'} for i in range(3)]
+        items += [{'serial_number': 'TAKEN', 'description': 'Dup'}, {'serial_number': 'BULK0', 'description': 'Dup'}]
+        response = self.client.post(reverse('bulk_receiving'), {'consignment': self.consignment.pk, 'items': items}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (3, 2))
+        self.assertEqual([row['status'] for row in response.data['results']],
+                         ['created', 'created', 'created', 'duplicate', 'duplicate'])
+        receiving = Receiving.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual((receiving.supplier, receiving.invoice_number, receiving.location, receiving.received_by),
+                         ('Juniper', 'INV-9', self.location, self.user))
+
+    def test_bulk_intake_query_count_is_independent_of_batch_size(self):
+        items = [{'serial_number': f'Q{i}', 'description': 'Optic'} for i in range(400)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('bulk_receiving'), {'consignment': self.consignment.pk, 'items': items}, format='json')
+        self.assertEqual(response.data['created'], 400)
+        # Consignment lookup, one duplicate check, a few multi-row INSERTs and the summary
+        # counter update instead of 1200+ round trips
+        self.assertLess(len(ctx.captured_queries), 16)
+
+    def test_unknown_category_rejects_batch(self):
+        items = [{'serial_number': 'X1', 'description': 'Optic', 'category': 999}]
+        response = self.client.post(reverse('bulk_receiving'), {'consignment': self.consignment.pk, 'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Receiving.objects.filter(serial_number='X1').exists())
+
+
+from .models import Asset
+
+
+class BulkAssetTagTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='tagger', password='password123')
+        location = Location.objects.create(name='Kisumu')
+        consignment = Consignment.objects.create(supplier='HP', quantity=3, location=location, received_by=self.user)
+        self.receivings = [
+            Receiving.objects.create(consignment=consignment, serial_number=f'HP{i}', description='Server', status='approved')
+            for i in range(3)
+        ]
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_tag_range_creates_assets_with_copied_fields(self):
+        response = self.api.post(reverse('asset-bulk-tag'), {
+            'receivings': [r.pk for r in self.receivings], 'tag_prefix': 'KE-', 'tag_start': 9, 'tag_width': 3,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['tag_number'] for row in response.data['results']], ['KE-009', 'KE-010', 'KE-011'])
+        asset = Asset.objects.get(tag_number='KE-009')
+        self.assertEqual((asset.serial_number, asset.supplier, asset.location.name), ('HP0', 'HP', 'Kisumu'))
+
+    def test_batch_is_rejected_as_a_whole(self):
+        Asset.objects.create(receiving=self.receivings[0], tag_number='USED')
+        self.receivings[1].status = 'testing'
+        self.receivings[1].save()
+        response = self.api.post(reverse('asset-bulk-tag'), {
+            'receivings': [r.pk for r in self.receivings], 'tag_numbers': ['A', 'USED', 'C'],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data), 3)  # Unapproved, already tagged and tag in use
+        self.assertEqual(Asset.objects.count(), 1)
+
+    def test_admin_action(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:KenetAssets_receiving_changelist')
+        data = {'action': 'tag_receivings', '_selected_action': [r.pk for r in self.receivings]}
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Create assets')
+        response = self.client.post(url, {**data, 'apply': '1', 'tag_prefix': 'ADM-', 'tag_start': 1, 'tag_width': 0, 'status': 'available'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(Asset.objects.values_list('tag_number', flat=True)), ['ADM-1', 'ADM-2', 'ADM-3'])
+
+
+from .testing import seed_inventory
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        seed_inventory(3)
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user(username='auditor'))
+
+    def test_csv_export_streams_all_rows(self):
+        response = self.api.get(reverse('export_inventory', args=['assets', 'csv']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'tag_number', 'serial_number'])
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson_export_filters(self):
+        location = Location.objects.order_by('id').first()
+        response = self.api.get(reverse('export_inventory', args=['dispatches', 'ndjson']),
+                                {'location': location.slug, 'status': 'pending', 'since': '2000-01-01'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['location'], location.name)
+
+    def test_bad_filters_and_unknown_exports(self):
+        self.assertEqual(self.api.get(reverse('export_inventory', args=['assets', 'csv']), {'status': 'lost'}).status_code, 400)
+        self.assertEqual(self.api.get(reverse('export_inventory', args=['assets', 'csv']), {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.api.get(reverse('export_inventory', args=['users', 'csv'])).status_code, 404)
+
+
+from django.core.management import call_command
+from io import StringIO
+
+
+class DenormalizedPropagationTests(TestCase):
+
+    def setUp(self):
+        seed_inventory(2)
+        self.consignment = Consignment.objects.order_by('id').first()
+        self.new_location = Location.objects.create(name='Eldoret')
+
+    def test_consignment_edit_rewrites_children_on_commit(self):
+        self.consignment.supplier = 'Corrected Supplier'
+        self.consignment.location = self.new_location
+        with self.captureOnCommitCallbacks(execute=True):
+            self.consignment.save()
+        receiving = Receiving.objects.get(consignment=self.consignment)
+        asset = Asset.objects.get(receiving=receiving)
+        for row in (receiving, asset):
+            self.assertEqual((row.supplier, row.location), ('Corrected Supplier', self.new_location))
+        # The other consignment's rows are untouched
+        self.assertFalse(Receiving.objects.exclude(consignment=self.consignment).filter(supplier='Corrected Supplier').exists())
+
+    def test_unrelated_edit_does_not_propagate(self):
+        self.consignment.comments = 'Checked'
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.consignment.save()
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "KenetAssets_receiving"')])
+
+    def test_resync_command(self):
+        Receiving.objects.update(supplier='stale', location=None)
+        Asset.objects.update(supplier='stale', serial_number='stale')
+        out = StringIO()
+        call_command('resync_denormalized', batch_size=1, stdout=out)
+        self.assertIn('Resynced 2 receivings and 2 assets', out.getvalue())
+        for asset in Asset.objects.select_related('receiving__consignment'):
+            consignment = asset.receiving.consignment
+            self.assertEqual((asset.receiving.supplier, asset.receiving.location_id), (consignment.supplier, consignment.location_id))
+            self.assertEqual((asset.supplier, asset.serial_number), (consignment.supplier, asset.receiving.serial_number))
+
+
+from concurrent.futures import ThreadPoolExecutor
+from django.test import TransactionTestCase
+from .models import Sequence
+from .sequences import SLK_SEQUENCE, next_number
+
+
+class SlkAllocationTests(TransactionTestCase):
+    reset_sequences = True  # Seeding reads the highest consignment id, so ids must not carry over from other tests
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='intake')
+        self.location = Location.objects.create(name='Nakuru')
+
+    def _create(self, i):
+        try:
+            return Consignment.objects.create(supplier=f'S{i}', quantity=1, location=self.location, received_by=self.user).slk_id
+        finally:
+            connections.close_all()
+
+    def test_parallel_creates_get_distinct_slk_ids(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            slk_ids = list(pool.map(self._create, range(40)))
+        self.assertEqual(len(set(slk_ids)), 40)
+        self.assertEqual(Consignment.objects.count(), 40)
+        self.assertEqual(Sequence.objects.get(name=SLK_SEQUENCE).value, 40)
+
+    def test_block_allocation_hands_out_reserved_numbers(self):
+        numbers = [next_number('test_block', block_size=5) for _ in range(7)]
+        self.assertEqual(numbers, list(range(1, 8)))
+        self.assertEqual(Sequence.objects.get(name='test_block').value, 10)  # Two blocks reserved
+
+    def test_sequence_seeded_from_existing_consignments(self):
+        Consignment.objects.create(supplier='Legacy', quantity=1, location=self.location, received_by=self.user, slk_id='SLK041')
+        Sequence.objects.all().delete()
+        self.assertEqual(Consignment.objects.create(supplier='New', quantity=1, location=self.location, received_by=self.user).slk_id, 'SLK042')
+
+
+from . import search
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        seed_inventory(3)
+
+    def test_partial_serial_matches_every_kind(self):
+        serial = Receiving.objects.order_by('id').first().serial_number
+        response = self.client.get(reverse('search_inventory'), {'q': serial[-6:].lower()})
+        self.assertEqual(response.status_code, 200)
+        hits = [hit for hit in response.data['results'] if hit['serial_number'] == serial]
+        self.assertEqual({hit['kind'] for hit in hits}, {'receiving', 'asset', 'dispatch'})
+
+    def test_kind_filter(self):
+        hits = search.search('SEED-TAG', kinds=['asset'])
+        self.assertEqual(len(hits), 3)
+        self.assertTrue(all(hit['kind'] == 'asset' for hit in hits))
+
+    def test_index_follows_bulk_writes_updates_and_deletes(self):
+        asset = Asset.objects.order_by('id').first()
+        Asset.objects.filter(pk=asset.pk).update(tag_number='RETAGGED-77')
+        hits = search.search('tagged-77', kinds=['asset', 'dispatch'])
+        self.assertEqual({(hit['kind'], hit['tag_number']) for hit in hits}, {('asset', 'RETAGGED-77'), ('dispatch', 'RETAGGED-77')})
+        asset.delete()
+        self.assertEqual(search.search('tagged-77'), [])
+
+    def test_query_too_short(self):
+        self.assertEqual(self.client.get(reverse('search_inventory'), {'q': 'ab'}).status_code, 400)
+
+    def test_operators_in_query_are_treated_as_text(self):
+        self.assertEqual(self.client.get(reverse('search_inventory'), {'q': 'SEED" OR "x'}).status_code, 200)
+
+
+from . import summary as inventory_summary
+from .models import Category, AssetSummary, ReceivingSummary, DispatchSummary
+from .services import bulk_receive, bulk_tag_assets
+
+
+class InventorySummaryTests(TestCase):
+
+    def assertMatchesRebuild(self):
+        def rows():
+            return {
+                model: sorted(model.objects.filter(count__gt=0).values_list(*inventory_summary.KEY_FIELDS[model], 'count'))
+                for model in (AssetSummary, ReceivingSummary, DispatchSummary)
+            }
+        incremental = rows()
+        inventory_summary.rebuild()
+        self.assertEqual(incremental, rows())
+
+    def test_counts_follow_creates_updates_and_deletes(self):
+        dispatches = seed_inventory(3)
+        asset = dispatches[0].asset
+        asset.status = 'maintenance'
+        asset.save()
+        receiving = asset.receiving
+        receiving.category = Category.objects.create(name='Moved')
+        receiving.save()
+        dispatches[1].status = 'delivered'
+        dispatches[1].save()
+        dispatches[2].asset.receiving.delete()  # Cascades to the asset and its dispatch
+        self.assertMatchesRebuild()
+
+    def test_counts_follow_bulk_operations(self):
+        seed_inventory(2)
+        consignment = Consignment.objects.order_by('id').first()
+        results = bulk_receive(consignment, [{'serial_number': f'BS{i}', 'description': 'x', 'status': 'approved'} for i in range(4)])
+        bulk_tag_assets([row['id'] for row in results], ['BT1', 'BT2', 'BT3', 'BT4'])
+        consignment.location = Location.objects.create(name='Garissa')
+        with self.captureOnCommitCallbacks(execute=True):
+            consignment.save()
+        self.assertMatchesRebuild()
+
+    def test_dashboard_endpoint(self):
+        seed_inventory(2)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('inventory_summary'))
+        self.assertEqual(sum(row['count'] for row in response.data['assets']), 2)
+        self.assertEqual({row['status'] for row in response.data['receivings']}, {'approved'})
+        self.assertTrue(all(row['location'] for row in response.data['dispatches']))
+
+
+from django.core.cache import cache
+
+
+@override_settings(KENET_VERSION_CACHE_SHARED=True)  # One process, so its local-memory cache is shared
+class ConditionalListTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            seed_inventory(2)
+
+    def test_unchanged_poll_gets_304_without_queries(self):
+        url = reverse('list_consignments')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_write_changes_the_etag(self):
+        url = reverse('list_consignments')
+        etag = self.client.get(url)['ETag']
+        location = Location.objects.order_by('id').first()
+        location.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            location.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', {row['location_name'] for row in response.data['results']})
+
+    def test_bulk_services_bump_versions(self):
+        url = reverse('list_receivings')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_receive(Consignment.objects.first(), [{'serial_number': 'NEW-1', 'description': 'x'}])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleting_a_referenced_row_changes_the_etag(self):
+        # SET_NULL is a bulk UPDATE without signals on the receivings themselves
+        url = reverse('list_receivings')
+        etag = self.client.get(url)['ETag']
+        receiving = Receiving.objects.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            receiving.category.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone({row['id']: row for row in response.data['results']}[receiving.pk]['category'])
+
+    @override_settings(KENET_VERSION_CACHE_SHARED=None)
+    def test_per_process_version_cache_disables_conditional_responses(self):
+        url = reverse('list_consignments')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 200)
+        self.assertNotIn('ETag', self.client.get('/async/assets/'))
+
+    @override_settings(KENET_LIST_CACHE_TIMEOUT=60)
+    def test_response_cache_skips_database(self):
+        url = reverse('list_assets')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+
+
+from .refdata import by_pk
+
+
+class ReferenceDataCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.location = Location.objects.create(name='Machakos')
+        self.category = Category.objects.create(name='Optics')
+        self.user = User.objects.create_user(username='refclerk')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_viewsets_read_from_cache(self):
+        by_pk(Location), by_pk(Category)
+        with self.assertNumQueries(0):
+            listed = self.client.get('/api/locations/')
+            detail = self.client.get(f'/api/categories/{self.category.pk}/')
+        self.assertEqual([row['name'] for row in listed.data], ['Machakos'])
+        self.assertEqual(detail.data['slug'], 'optics')
+        self.assertEqual(self.client.get('/api/categories/999/').status_code, 404)
+
+    def test_save_and_delete_invalidate(self):
+        by_pk(Location)
+        Location.objects.create(name='Thika')
+        self.assertEqual([row['name'] for row in self.client.get('/api/locations/').data], ['Machakos', 'Thika'])
+        self.location.delete()
+        self.assertEqual([row['name'] for row in self.client.get('/api/locations/').data], ['Thika'])
+
+    def test_create_serializers_validate_fk_from_cache(self):
+        consignment = Consignment.objects.create(supplier='HP', quantity=1, location=self.location, received_by=self.user)
+        by_pk(Location), by_pk(Category)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api.post(reverse('add_receiving'), {
+                'consignment': consignment.pk, 'serial_number': 'REF-1', 'description': 'x',
+                'category': self.category.pk, 'status': 'pending',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "KenetAssets_category"' in q['sql']])
+        response = self.api.post(reverse('add_receiving'), {
+            'consignment': consignment.pk, 'serial_number': 'REF-2', 'description': 'x', 'category': 999, 'status': 'pending',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.data)
+
+    def test_rows_missing_from_a_stale_cache_are_looked_up(self):
+        consignment = Consignment.objects.create(supplier='HP', quantity=1, location=self.location, received_by=self.user)
+        by_pk(Category)
+        # As if created by another worker, whose invalidation never reached this cache
+        [category] = Category.objects.bulk_create([Category(name='Fibre', slug='fibre')])
+        response = self.api.post(reverse('add_receiving'), {
+            'consignment': consignment.pk, 'serial_number': 'REF-3', 'description': 'x',
+            'category': category.pk, 'status': 'pending',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIn(category.pk, by_pk(Category))
+        self.assertEqual(self.client.get(f'/api/categories/{category.pk}/').data['slug'], 'fibre')
+
+    @override_settings(
+        KENET_VERSION_CACHE_SHARED=True,
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'worker-a': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'a'},
+            'worker-b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'b'},
+        },
+    )
+    def test_deletion_in_another_worker_is_honoured(self):
+        pk = self.location.pk
+        with self.settings(KENET_REFDATA_CACHE='worker-a'):
+            self.assertIn(pk, by_pk(Location))
+        with self.settings(KENET_REFDATA_CACHE='worker-b'), self.captureOnCommitCallbacks(execute=True):
+            self.location.delete()  # Handled by worker b, whose invalidation never reaches worker a's cache
+        with self.settings(KENET_REFDATA_CACHE='worker-a'):
+            self.assertNotIn(pk, by_pk(Location))
+            response = self.api.post(reverse('add_consignment'), {
+                'supplier': 'HP', 'quantity': 1, 'location': pk,
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('location', response.data)
+
+
+from .authentication import CachedTokenAuthentication, reset_stats, stats
+
+
+@override_settings(KENET_TOKEN_CACHE_SHARED=True)  # One process, so its local-memory cache is shared
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.user = User.objects.create_user(username='poller')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        self.url = reverse('list_dispatches')
+
+    def test_second_request_skips_token_lookup(self):
+        self.assertEqual(self.client.get(self.url, **self.auth).status_code, 200)
+        with self.assertNumQueries(1):  # Only the dispatch page itself
+            self.assertEqual(self.client.get(self.url, **self.auth).status_code, 200)
+        self.assertEqual(stats(), {'hits': 1, 'misses': 1})
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url, **self.auth)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url, **self.auth).status_code, 401)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(self.url, **self.auth)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url, **self.auth).status_code, 401)
+
+    def test_lookups_are_exported_as_metrics(self):
+        self.client.get(self.url, **self.auth)
+        self.client.get(self.url, **self.auth)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertRegex(body, r'kenet_token_cache_lookups_total\{outcome="hit"\} [1-9]')
+        self.assertRegex(body, r'kenet_token_cache_lookups_total\{outcome="miss"\} [1-9]')
+
+    @override_settings(
+        KENET_TOKEN_CACHE_SHARED=None,
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'worker-a': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'a'},
+            'worker-b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'b'},
+        },
+    )
+    def test_revocation_in_another_worker_is_honoured(self):
+        with self.settings(KENET_TOKEN_CACHE='worker-a'):
+            self.assertEqual(self.client.get(self.url, **self.auth).status_code, 200)
+        with self.settings(KENET_TOKEN_CACHE='worker-b'):
+            self.token.delete()  # Handled by worker b, whose invalidation never reaches worker a
+        with self.settings(KENET_TOKEN_CACHE='worker-a'):
+            self.assertEqual(self.client.get(self.url, **self.auth).status_code, 401)
+        self.assertEqual(stats(), {'hits': 0, 'misses': 0})  # Not cached at all per process
+
+
+from django.test import AsyncClient
+
+
+class AsyncReadEndpointTests(TestCase):
+
+    def setUp(self):
+        seed_inventory(3)
+        self.async_client = AsyncClient()
+
+    async def test_lists_match_the_sync_endpoints(self):
+        for resource in ('consignments', 'receivings', 'assets'):
+            expected = (await self.async_client.get(f'/{resource}/', {'page_size': 2})).json()['results']
+            response = await self.async_client.get(f'/async/{resource}/', {'page_size': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], expected)
+
+    async def test_cursor_walks_every_row(self):
+        ids = []
+        url = '/async/receivings/?page_size=2'
+        while url:
+            body = (await self.async_client.get(url)).json()
+            ids += [row['id'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(ids, [r.id async for r in Receiving.objects.order_by('-id')])
+
+    @override_settings(KENET_VERSION_CACHE_SHARED=True)
+    async def test_not_modified(self):
+        response = await self.async_client.get('/async/assets/')
+        again = await self.async_client.get('/async/assets/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    async def test_detail(self):
+        asset = await Asset.objects.afirst()
+        response = await self.async_client.get(f'/async/assets/{asset.pk}/')
+        self.assertEqual(response.json()['tag_number'], asset.tag_number)
+        self.assertEqual((await self.async_client.get('/async/assets/999999/')).status_code, 404)
+        response = await self.async_client.get(f'/async/receivings/{asset.receiving_id}/', {'fields': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+    async def test_dispatches_require_a_token(self):
+        self.assertEqual((await self.async_client.get('/async/dispatches/')).status_code, 401)
+        token = await Token.objects.acreate(user=await User.objects.acreate(username='async-viewer'))
+        response = await self.async_client.get('/async/dispatches/', headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+
+
+import hashlib
+import os
+import shutil
+import tempfile
+from django.core.files.base import ContentFile
+from .models import InvoiceBlob
+
+
+class InvoiceMediaMixin:
+    """Consignments with invoices, stored under a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='invoicer')
+        self.location = Location.objects.create(name='Kisumu')
+        self.content = os.urandom(200_000)  # Several upload chunks
+
+    def consignment(self, **kwargs):
+        return Consignment.objects.create(supplier='Dell', quantity=1, location=self.location, received_by=self.user, **kwargs)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+
+class InvoiceStorageTests(InvoiceMediaMixin, TestCase):
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.consignment(invoice=ContentFile(self.content, name='invoice.docx'))
+        second = self.consignment(invoice=ContentFile(self.content, name='invoice (copy).DOCX'))
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(first.invoice.name, f'invoices/{digest[:2]}/{digest}.docx')
+        self.assertEqual(second.invoice.name, first.invoice.name)
+        self.assertEqual(self.stored_files(), [first.invoice.name])
+        self.assertEqual(InvoiceBlob.objects.get().references, 2)
+
+        first.delete()
+        self.assertEqual(InvoiceBlob.objects.get().references, 1)
+        second.invoice = ContentFile(b'other', name='other.pdf')
+        second.save()
+        self.assertEqual(dict(InvoiceBlob.objects.values_list('digest', 'references')),
+                         {digest: 0, hashlib.sha256(b'other').hexdigest(): 1})
+        out = StringIO()
+        call_command('dedupe_invoices', stdout=out)
+        self.assertEqual(self.stored_files(), [second.invoice.name])
+
+    def test_dedupe_command_migrates_legacy_copies(self):
+        os.makedirs(os.path.join(self.media_root, 'invoices'))
+        legacy = ['invoices/Attachment_Information_Form.docx', 'invoices/Attachment_Information_Form_3bbLbEd.docx']
+        consignments = []
+        for name in legacy:
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(self.content)
+            consignment = self.consignment()
+            Consignment.objects.filter(pk=consignment.pk).update(invoice=name)
+            consignments.append(consignment)
+
+        call_command('dedupe_invoices', stdout=StringIO())
+        names = {c.invoice.name for c in Consignment.objects.all()}
+        self.assertEqual(len(names), 1)
+        self.assertEqual(self.stored_files(), list(names))
+        blob = InvoiceBlob.objects.get()
+        self.assertEqual((blob.references, blob.size), (2, len(self.content)))
+
+    def test_dedupe_command_deletes_unreferenced_copies_in_scanned_dirs(self):
+        stored = self.consignment(invoice=ContentFile(self.content, name='invoice.docx')).invoice.name
+        stray = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, stray)
+        for name, content in (('Form.docx', self.content), ('Form_3bbLbEd.docx', self.content), ('other.pdf', b'x')):
+            with open(os.path.join(stray, name), 'wb') as f:
+                f.write(content)
+
+        err = StringIO()
+        call_command('dedupe_invoices', '--scan-dir', stray, '--scan-dir', self.media_root, stdout=StringIO(), stderr=err)
+        self.assertEqual(sorted(os.listdir(stray)), ['other.pdf'])
+        self.assertIn('other.pdf: not a stored invoice', err.getvalue())
+        self.assertEqual(self.stored_files(), [stored])
+
+
+import io
+import zipfile
+import zlib
+import datetime
+from unittest import mock
+from django.utils import timezone
+from . import jobs
+from .invoice_processing import extract_text
+from .models import Job
+
+
+def docx_bytes(*paragraphs):
+    ns = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    body = ''.join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as document:
+        document.writestr('word/document.xml', f'<w:document xmlns:w="{ns}"><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+
+def failing_job(**payload):
+    raise RuntimeError('boom')
+
+
+class InvoiceProcessingTests(InvoiceMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.invoice = ContentFile(docx_bytes('Safaricom Ltd', 'Invoice No: KE-2024-0042', 'Total 1,200'), name='inv.docx')
+
+    def test_create_queues_a_job_and_the_worker_fills_in_the_results(self):
+        consignment = self.consignment(invoice=self.invoice)
+        Receiving.objects.create(consignment=consignment, serial_number='SN-JOB-1', description='Router')
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.payload, job.status), ('process_invoice', {'consignment_id': consignment.pk}, 'queued'))
+        self.assertIsNone(Consignment.objects.get().invoice_processed_at)
+
+        self.assertEqual(jobs.run_pending(), 1)
+        consignment.refresh_from_db()
+        self.assertEqual(consignment.detected_invoice_number, 'KE-2024-0042')
+        self.assertEqual(consignment.invoice_number, 'KE-2024-0042')
+        self.assertIn('Invoice No: KE-2024-0042', consignment.invoice_preview)
+        self.assertEqual(Receiving.objects.get().invoice_number, 'KE-2024-0042')
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_entered_invoice_number_is_kept(self):
+        consignment = self.consignment(invoice=self.invoice, invoice_number='MANUAL-1')
+        jobs.run_pending()
+        consignment.refresh_from_db()
+        self.assertEqual((consignment.invoice_number, consignment.detected_invoice_number), ('MANUAL-1', 'KE-2024-0042'))
+
+    def test_pdf_text(self):
+        stream = zlib.compress(b'BT /F1 12 Tf (Acme Supplies) Tj 0 -14 Td [(Invoice # ) -20 (INV-778)] TJ ET')
+        pdf = b'%PDF-1.4\n4 0 obj << /Filter /FlateDecode >> stream\n' + stream + b'\nendstream endobj\n%%EOF'
+        self.assertEqual(extract_text('invoices/ab/x.pdf', io.BytesIO(pdf)), 'Acme Supplies\nInvoice # INV-778')
+
+    def test_failed_job_is_retried_then_given_up(self):
+        self.consignment(invoice=self.invoice)
+        with mock.patch.dict(jobs.HANDLERS, {'process_invoice': 'KenetAssets.tests.failing_job'}), \
+                override_settings(KENET_JOB_MAX_ATTEMPTS=2):
+            jobs.run_pending()
+            job = Job.objects.get()
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+            self.assertIn('boom', job.error)
+            Job.objects.update(run_after=timezone.now())
+            jobs.run_pending()
+            self.assertEqual(Job.objects.get().status, 'failed')
+
+    def test_timed_out_job_is_requeued_then_given_up(self):
+        self.consignment(invoice=self.invoice)
+        stale = timezone.now() - datetime.timedelta(hours=1)
+        with override_settings(KENET_JOB_MAX_ATTEMPTS=2):
+            for _ in range(2):
+                self.assertEqual(len(jobs.claim('crashed', 10)), 1)  # The worker dies mid-job
+                Job.objects.update(locked_at=stale)
+            self.assertEqual(jobs.claim('next', 10), [])
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('failed', 2, None))
+        self.assertIn('Timed out', job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_timeout_counts_from_when_a_job_starts(self):
+        self.consignment(invoice=self.invoice)
+        [pk] = jobs.claim('pool', 10)
+        Job.objects.update(locked_at=timezone.now() - datetime.timedelta(hours=1))  # Waited in the pool's queue
+        # Another worker's claim() sweeps for timed-out jobs while this one runs
+        with mock.patch('KenetAssets.invoice_processing.process_invoice', side_effect=lambda **payload: jobs.claim('other', 10)):
+            self.assertEqual(jobs.run(pk, 'pool'), 'done')
+        self.assertEqual(Job.objects.get().attempts, 1)  # Not requeued while it ran
+
+    def test_job_requeued_while_waiting_is_not_run_twice(self):
+        self.consignment(invoice=self.invoice)
+        [pk] = jobs.claim('pool', 10)
+        Job.objects.update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(jobs.claim('other', 10), [pk])
+        self.assertIsNone(jobs.run(pk, 'pool'))
+        self.assertEqual(jobs.run(pk, 'other'), 'done')
+
+
+class JobWorkerPoolTests(TransactionTestCase):
+
+    def test_process_pool_runs_queued_jobs(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            user = User.objects.create_user(username='pool')
+            location = Location.objects.create(name='Eldoret')
+            for n in range(3):
+                Consignment.objects.create(
+                    supplier='HP', quantity=1, location=location, received_by=user,
+                    invoice=ContentFile(docx_bytes(f'Invoice Number: HP-{n}00'), name='hp.docx'),
+                )
+            call_command('run_job_workers', processes=2, once=True, stdout=StringIO())
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(sorted(Consignment.objects.values_list('detected_invoice_number', flat=True)),
+                         ['HP-000', 'HP-100', 'HP-200'])
+
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.test import APIRequestFactory, force_authenticate
+from . import exports
+from .routers import COOKIE_NAME, ReplicaRouter, StickyPrimaryMiddleware
+from .views import export_inventory
+
+
+@mock.patch('KenetAssets.routers.replica_alias', return_value='replica')
+class ReplicaRouterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exporter = User.objects.create_user(username='exporter')
+
+    def setUp(self):
+        # Every TestCase runs inside a transaction, which the router keeps on the primary
+        patcher = mock.patch.object(connections['default'], 'in_atomic_block', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, view, method='get', **cookies):
+        request = getattr(RequestFactory(), method)('/assets/')
+        request.COOKIES.update(cookies)
+        return StickyPrimaryMiddleware(view)(request)
+
+    def test_request_reads_use_the_replica_until_a_write(self, _):
+        router = ReplicaRouter()
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Asset))
+            seen.append(router.db_for_write(Asset))
+            seen.append(router.db_for_read(Asset))
+            seen.append(router.db_for_read(User))  # Other apps are left to the default routing
+            return HttpResponse()
+
+        response = self.serve(view)
+        self.assertEqual(seen, ['replica', 'default', 'default', None])
+        self.assertEqual(response.cookies[COOKIE_NAME]['max-age'], 5)
+
+    def test_sticky_cookie_pins_reads_to_the_primary(self, _):
+        router = ReplicaRouter()
+        seen = []
+        response = self.serve(lambda request: seen.append(router.db_for_read(Asset)) or HttpResponse(), **{COOKIE_NAME: '1'})
+        self.assertEqual(seen, ['default'])
+        self.assertNotIn(COOKIE_NAME, response.cookies)
+
+    def test_unsafe_requests_read_from_the_primary_before_writing(self, _):
+        router = ReplicaRouter()
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Receiving))  # e.g. the duplicate-serial check
+            seen.append(router.db_for_write(Receiving))
+            return HttpResponse()
+
+        response = self.serve(view, method='post')
+        self.assertEqual(seen, ['default', 'default'])
+        self.assertIn(COOKIE_NAME, response.cookies)
+
+    def test_reads_outside_requests_and_in_transactions_use_the_primary(self, _):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Asset), 'default')  # Management commands, job workers
+
+        def view(request):
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                seen.append(router.db_for_read(Asset))
+            return HttpResponse()
+
+        seen = []
+        self.serve(view)
+        self.assertEqual(seen, ['default'])
+
+    @override_settings(DATABASE_ROUTERS=['KenetAssets.routers.ReplicaRouter'])
+    def test_streamed_export_reads_from_the_replica(self, _):
+        seen = []
+
+        def writer(columns, queryset):
+            seen.append(queryset.db)  # Runs only once the body is consumed
+            yield b''
+
+        request = APIRequestFactory().get('/export/assets.csv')
+        force_authenticate(request, self.exporter)
+        with mock.patch.dict(exports.WRITERS, {'csv': writer}):
+            response = StickyPrimaryMiddleware(lambda r: export_inventory(r, resource='assets', fmt='csv'))(request)
+            b''.join(response.streaming_content)
+        self.assertEqual(seen, ['replica'])
+
+    def test_replica_is_never_migrated(self, _):
+        self.assertIs(ReplicaRouter().allow_migrate('replica', 'KenetAssets'), False)
+        self.assertIsNone(ReplicaRouter().allow_migrate('default', 'KenetAssets'))
+
+
+from benchmarks.api import SCENARIOS, Context, run_scenario
+from . import urls
+
+
+class ApiBenchmarkScenarioTests(TestCase):
+
+    def test_every_url_has_a_working_scenario(self):
+        names = set()
+        patterns = list(urls.urlpatterns)
+        while patterns:
+            pattern = patterns.pop()
+            if hasattr(pattern, 'url_patterns'):
+                patterns += pattern.url_patterns
+            else:
+                names.add(pattern.name)
+        self.assertEqual(names, set(SCENARIOS))
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        seed_inventory(3)
+        with override_settings(MEDIA_ROOT=media_root, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            ctx = Context()
+            for name in SCENARIOS:
+                self.assertEqual(run_scenario(ctx, name, requests=1, warmup=0)['errors'], 0, name)
+
+
+from . import metrics
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        seed_inventory(2)
+
+    def test_requests_are_recorded_by_route(self):
+        self.client.get('/assets/', {'page_size': 1})
+        self.client.get('/async/assets/999999/')
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('kenet_http_requests_total{method="GET",route="assets/",status="200"} 1', body)
+        self.assertIn('kenet_http_requests_total{method="GET",route="async/assets/<int:pk>/",status="404"} 1', body)
+        self.assertIn('kenet_http_request_duration_seconds_bucket{method="GET",route="assets/",le="+Inf"} 1', body)
+        self.assertIn('kenet_http_request_duration_seconds_count{method="GET",route="assets/"} 1', body)
+        queries = [line for line in body.splitlines() if line.startswith('kenet_db_queries_total{route="assets/"}')]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(float(queries[0].split()[-1]), 0)
+        self.assertIn('# TYPE kenet_http_response_bytes_total counter', body)
+
+    def test_scrape_sums_the_files_of_other_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = metrics.Registry()
+        other.inc('kenet_http_requests_total', (('method', 'GET'), ('route', 'assets/'), ('status', '200')), 4)
+        other.observe('kenet_http_request_duration_seconds', (('method', 'GET'), ('route', 'assets/')), 0.02)
+        with open(os.path.join(directory, '1-1.json'), 'w') as f:
+            json.dump(other.snapshot(), f)
+
+        with override_settings(KENET_METRICS_DIR=directory):
+            self.client.get('/assets/', {'page_size': 1})
+            body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('kenet_http_requests_total{method="GET",route="assets/",status="200"} 5', body)
+        self.assertIn('kenet_http_request_duration_seconds_bucket{method="GET",route="assets/",le="0.01"} ', body)
+        self.assertIn('kenet_http_request_duration_seconds_bucket{method="GET",route="assets/",le="0.025"} ', body)
+        self.assertIn('kenet_http_request_duration_seconds_count{method="GET",route="assets/"} 2', body)
+        self.assertIn(metrics._process_file, os.listdir(directory))
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with override_settings(KENET_SLOW_REQUEST_SECONDS=0), self.assertLogs('KenetAssets.metrics', 'WARNING') as logs:
+            self.client.get('/assets/', {'page_size': 1})
+        self.assertIn('Slow request GET /assets/?page_size=1', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_streamed_responses_are_recorded_when_the_stream_ends(self):
+        api = APIClient()
+        api.force_authenticate(User.objects.create_user(username='auditor'))
+        with override_settings(KENET_SLOW_REQUEST_SECONDS=0), self.assertLogs('KenetAssets.metrics', 'WARNING') as logs:
+            response = api.get(reverse('export_inventory', args=['assets', 'csv']))
+            self.assertNotIn('exports/', metrics.render())  # Nothing recorded before the body is sent
+            body = b''.join(response.streaming_content)
+        text = metrics.render()
+
+        self.assertIn('kenet_http_requests_total{method="GET",route="exports/<slug:resource>.<slug:fmt>",status="200"} 1', text)
+        self.assertIn(f'kenet_http_response_bytes_total{{route="exports/<slug:resource>.<slug:fmt>"}} {len(body)}', text)
+        self.assertIn('FROM "KenetAssets_asset"', logs.output[0])  # The rows read while streaming
+
+
+from rest_framework.request import Request
+from .filters import ListFilterBackend
+from .views import ListAssets, ListConsignments, ListDispatches, ListReceivings
+
+
+class ListFilterTests(TestCase):
+
+    def setUp(self):
+        self.dispatches = seed_inventory(3)
+        self.receivings = [dispatch.asset.receiving for dispatch in self.dispatches]
+        Receiving.objects.filter(pk=self.receivings[0].pk).update(status='testing')
+
+    def serials(self, response):
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return [row['serial_number'] for row in response.json()['results']]
+
+    def test_filters_combine(self):
+        first, second, third = self.receivings
+        response = self.client.get(reverse('list_receivings'), {'status': 'approved,testing', 'consignment': f'{first.consignment_id},{third.consignment_id}'})
+        self.assertEqual(self.serials(response), [third.serial_number, first.serial_number])
+        response = self.client.get(reverse('list_assets'), {'location': second.location.slug, 'status': 'available'})
+        self.assertEqual(self.serials(response), [second.serial_number])
+        response = self.client.get(reverse('list_receivings'), {'supplier': first.supplier, 'since': '2000-01-01'})
+        self.assertEqual(self.serials(response), [first.serial_number])
+        response = self.client.get(reverse('async_list_receivings'), {'category': second.category_id})
+        self.assertEqual(self.serials(response), [second.serial_number])
+
+    def test_bad_values_are_rejected(self):
+        response = self.client.get(reverse('list_receivings'), {'status': 'lost', 'consignment': 'x', 'until': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'status', 'consignment', 'until'})
+        self.assertEqual(self.client.get(reverse('async_list_assets'), {'status': 'lost'}).status_code, 400)
+
+    def test_ordering_is_limited_to_indexed_fields_and_pages_by_keyset(self):
+        seen = []
+        url, params = reverse('list_receivings'), {'ordering': 'serial_number', 'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            seen += self.serials(response)
+            url, params = response.json()['next'], None
+        self.assertEqual(seen, sorted(r.serial_number for r in self.receivings))
+
+        # description is not indexed, so the default ordering (newest first) is kept
+        response = self.client.get(reverse('list_receivings'), {'ordering': 'description'})
+        self.assertEqual(self.serials(response), [r.serial_number for r in reversed(self.receivings)])
+
+    def test_every_filter_uses_an_index(self):
+        samples = {'ids': '1', 'location': '1', 'exact': 'x', 'since': '2024-01-01', 'until': '2024-01-01'}
+        for view_class in (ListConsignments, ListReceivings, ListAssets, ListDispatches):
+            model = view_class.queryset.model
+            for param, (kind, _) in view_class.filter_fields.items():
+                value = model.STATUS_CHOICES[0][0] if kind == 'choice' else samples[kind]
+                request = Request(RequestFactory().get('/', {param: value}))
+                plan = ListFilterBackend().filter_queryset(request, view_class.queryset.all(), view_class()).explain()
+                self.assertNotRegex(plan, r'(?m)SCAN \w+$', f'{view_class.__name__} ?{param}=\n{plan}')
+
+
+from .fieldsets import ValuesSerializer
+from .serializers import AssetSerializer, ReceivingSerializer
+
+
+class SparseFieldsetTests(TestCase):
+
+    def setUp(self):
+        seed_inventory(3)
+
+    def test_fast_serializer_matches_the_model_serializer(self):
+        for serializer_class, model, url in ((AssetSerializer, Asset, 'list_assets'),
+                                             (ReceivingSerializer, Receiving, 'list_receivings')):
+            queryset = model.objects.order_by('-id')
+            expected = [dict(row) for row in serializer_class(queryset, many=True).data]
+            serializer = serializer_class()
+            rows = queryset.values(*ValuesSerializer.columns(serializer))
+            self.assertEqual(ValuesSerializer(serializer, rows).data, expected)
+            self.assertEqual(self.client.get(reverse(url)).json()['results'], expected)
+
+    def test_fields_narrow_the_output_and_the_select(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('list_assets'), {'fields': 'tag_number,status', 'ordering': 'tag_number'})
+        self.assertEqual(response.json()['results'], [
+            {'tag_number': tag, 'status': 'available'} for tag in sorted(Asset.objects.values_list('tag_number', flat=True))
+        ])
+        self.assertNotIn('"description"', ctx.captured_queries[-1]['sql'])
+
+        response = self.client.get(reverse('async_list_receivings'), {'fields': 'id,consignment'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'consignment'})
+        response = self.client.get(reverse('async_asset_detail', args=[Asset.objects.first().pk]), {'fields': 'id'})
+        self.assertEqual(set(response.json()), {'id'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('list_receivings'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['fields'][0])
+
+
+from . import sync
+from .models import Tombstone
+from .services import propagate_consignment
+
+
+@override_settings(KENET_SYNC_LAG_SECONDS=0)
+class DeltaSyncTests(TestCase):
+
+    def setUp(self):
+        self.dispatches = seed_inventory(3)
+
+    def sync(self, resource, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('sync_changes', args=[resource]), params)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.json()
+
+    def sync_all(self, resource, cursor=None, **params):
+        changed, deleted = [], []
+        while True:
+            page = self.sync(resource, cursor, **params)
+            changed += [row['id'] for row in page['changed']]
+            deleted += page['deleted']
+            cursor = page['cursor']
+            if not page['more']:
+                return changed, deleted, cursor
+
+    def test_only_changes_after_the_cursor_are_returned(self):
+        changed, deleted, cursor = self.sync_all('assets', limit=2)
+        self.assertEqual(sorted(changed), sorted(Asset.objects.values_list('id', flat=True)))
+        self.assertEqual(self.sync_all('assets', cursor)[:2], ([], []))
+
+        first, second, third = (dispatch.asset for dispatch in self.dispatches)
+        third.status = 'maintenance'
+        third.save()
+        consignment = first.receiving.consignment
+        consignment.supplier = 'Renamed'
+        propagate_consignment(consignment)  # QuerySet.update() on the receivings and assets
+        deleted_pk = second.pk
+        second.delete()
+
+        changed, deleted, cursor = self.sync_all('assets', cursor)
+        self.assertEqual(changed, [third.pk, first.pk])
+        self.assertEqual(deleted, [deleted_pk])
+        page = self.sync('assets', cursor)
+        self.assertEqual((page['changed'], page['deleted']), ([], []))
+
+    def test_rows_are_serialized_like_the_list_endpoint(self):
+        page = self.sync('receivings', fields='id,status')
+        self.assertEqual(page['changed'], [{'id': r.pk, 'status': 'approved'} for r in Receiving.objects.order_by('id')])
+        self.assertEqual(self.client.get(reverse('sync_changes', args=['dispatches'])).status_code, 401)
+
+    def test_deleting_a_location_touches_the_rows_that_pointed_at_it(self):
+        _, _, cursor = self.sync_all('receivings')
+        receiving = self.dispatches[1].asset.receiving
+        Consignment.objects.filter(pk=receiving.consignment_id).update(location=Location.objects.create(name='Spare'))
+        receiving.location.delete()
+        changed, _, _ = self.sync_all('receivings', cursor)
+        self.assertEqual(changed, [receiving.pk])
+
+    def test_bad_and_expired_cursors(self):
+        url = reverse('sync_changes', args=['assets'])
+        self.assertEqual(self.client.get(url, {'cursor': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('sync_changes', args=['users'])).status_code, 404)
+        cursor = self.sync('assets')['cursor']
+        with override_settings(KENET_TOMBSTONE_RETENTION_DAYS=0):
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 410)
+            Asset.objects.first().delete()  # And its dispatch
+            self.assertEqual(sync.prune(), 2)
+        self.assertFalse(Tombstone.objects.exists())
+
+
+from .models import StatusChange
+from .services import bulk_transition
+
+
+class BulkStatusTransitionTests(TestCase):
+
+    def setUp(self):
+        self.dispatches = seed_inventory(3)
+        self.user = User.objects.create_superuser(username='qa', password='password123')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.assets = [dispatch.asset for dispatch in self.dispatches]
+
+    def test_allowed_transition_moves_rows_and_logs_them(self):
+        ids = [asset.pk for asset in self.assets]
+        self.assets[0].status = 'maintenance'
+        self.assets[0].save()
+        response = self.api.post(reverse('asset-bulk-transition'), {'ids': ids, 'status': 'maintenance'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'status': 'maintenance', 'changed': 2, 'unchanged': 1})
+        self.assertEqual(set(Asset.objects.filter(pk__in=ids).values_list('status', flat=True)), {'maintenance'})
+        self.assertEqual(
+            sorted(StatusChange.objects.values_list('resource', 'object_id', 'from_status', 'to_status', 'changed_by')),
+            [('assets', pk, 'available', 'maintenance', self.user.pk) for pk in ids[1:]],
+        )
+        InventorySummaryTests.assertMatchesRebuild(self)
+
+    def test_invalid_transition_rejects_the_whole_batch(self):
+        receivings = [asset.receiving for asset in self.assets]
+        Receiving.objects.filter(pk=receivings[0].pk).update(status='testing')
+        response = self.api.post(reverse('receiving-bulk-transition'), {
+            'ids': [r.pk for r in receivings] + [999999], 'status': 'pending',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data), 2)  # Unknown id, approved -> pending
+        self.assertEqual(Receiving.objects.filter(status='pending').count(), 0)
+        self.assertFalse(StatusChange.objects.exists())
+        self.assertEqual(self.api.post(reverse('receiving-bulk-transition'), {
+            'ids': [receivings[0].pk], 'status': 'shipped',
+        }, format='json').status_code, 400)
+        self.assertEqual(APIClient().post(reverse('receiving-bulk-transition'), {
+            'ids': [receivings[0].pk], 'status': 'pending',
+        }, format='json').status_code, 401)
+
+    def test_changed_rows_show_up_in_delta_sync(self):
+        self.client.force_login(self.user)
+        url = reverse('sync_changes', args=['assets'])
+        with override_settings(KENET_SYNC_LAG_SECONDS=0):
+            cursor = self.client.get(url).json()['cursor']
+            bulk_transition(Asset, [self.assets[1].pk], 'in_use')
+            changed = [row['id'] for row in self.client.get(url, {'cursor': cursor}).json()['changed']]
+        self.assertEqual(changed, [self.assets[1].pk])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        consignment = Consignment.objects.order_by('id').first()
+
+        def queries(count):
+            results = bulk_receive(consignment, [
+                {'serial_number': f'QC{count}-{i}', 'description': 'x', 'status': 'testing'} for i in range(count)
+            ])
+            with CaptureQueriesContext(connection) as captured:
+                bulk_transition(Receiving, [row['id'] for row in results], 'approved')
+            return len(captured)
+
+        self.assertEqual(queries(5), queries(50))
+
+    def test_admin_action(self):
+        self.client.force_login(self.user)
+        ids = [asset.pk for asset in self.assets]
+        response = self.client.post(reverse('admin:KenetAssets_asset_changelist'), {
+            'action': 'mark_decommissioned', '_selected_action': ids,
+        }, follow=True)
+        self.assertContains(response, 'Marked 3 as decommissioned')
+        self.assertEqual(Asset.objects.filter(status='decommissioned').count(), 3)
+        response = self.client.post(reverse('admin:KenetAssets_asset_changelist'), {
+            'action': 'mark_available', '_selected_action': ids,
+        }, follow=True)
+        self.assertContains(response, 'cannot go from decommissioned to available')
+        self.assertEqual(Asset.objects.filter(status='decommissioned').count(), 3)
+
+
+import re
+from django.contrib import admin as django_admin
+from .models import Dispatch
+from .pagination import EstimatedCountPaginator
+
+
+class AdminPerformanceTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin-perf', password='password123')
+        self.client.force_login(self.user)
+
+    def test_changelists_run_constant_queries(self):
+        for model in ('consignment', 'receiving', 'asset', 'dispatch'):
+            with self.subTest(model=model):
+                self.assertConstantQueries(reverse(f'admin:KenetAssets_{model}_changelist'))
+
+    def test_counts_are_estimated_past_the_limit(self):
+        seed_inventory(5)
+        assets = Asset.objects.order_by('-pk')
+        with override_settings(KENET_ADMIN_EXACT_COUNT_LIMIT=2):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(EstimatedCountPaginator(assets, 2).count, assets.first().pk)
+            self.assertNotIn('COUNT', captured[0]['sql'])
+            self.assertEqual(EstimatedCountPaginator(assets.filter(status='available'), 2).count, 2)
+        self.assertEqual(EstimatedCountPaginator(assets.filter(status='available'), 2).count, 5)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('admin:KenetAssets_asset_changelist'), {'status__exact': 'available'})
+        self.assertContains(response, '5 assets')
+        self.assertFalse([q for q in captured if re.search(r'COUNT\(\*\).*FROM "KenetAssets_asset"\s*$', q['sql'])])
+
+    def test_pages_past_an_inexact_count_are_reachable(self):
+        seed_inventory(10)
+        url = reverse('admin:KenetAssets_asset_changelist')
+        with override_settings(KENET_ADMIN_EXACT_COUNT_LIMIT=5), \
+                mock.patch.object(django_admin.site._registry[Asset], 'list_per_page', 2):
+            response = self.client.get(url, {'status__exact': 'available', 'p': 4})
+            self.assertEqual(response.status_code, 200)
+            cl = response.context['cl']
+            self.assertEqual(len(cl.result_list), 2)
+            self.assertEqual(cl.paginator.num_pages, 5)  # Links to the next page
+            self.assertContains(response, '5+ assets')
+            self.assertContains(response, '5+ results')
+
+            paginator = EstimatedCountPaginator(Asset.objects.order_by('-pk'), 4)
+            self.assertEqual(paginator.display_count, None)
+            self.assertEqual(len(paginator.page(3).object_list), 2)
+            self.assertEqual(paginator.display_count, f'about {Asset.objects.order_by("-pk").first().pk}')
+            self.assertEqual(list(paginator.page(40).object_list), [])  # Past the last row, not an error
+
+    def test_search_uses_the_full_text_index(self):
+        dispatches = seed_inventory(3)
+        asset = dispatches[1].asset
+        url = reverse('admin:KenetAssets_asset_changelist')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, {'q': asset.tag_number})
+        self.assertEqual([a.pk for a in response.context['cl'].result_list], [asset.pk])
+        self.assertTrue(any('MATCH' in q['sql'] for q in captured))
+        response = self.client.get(reverse('admin:KenetAssets_dispatch_changelist'), {'q': dispatches[2].user.username})
+        self.assertEqual([d.pk for d in response.context['cl'].result_list], [dispatches[2].pk])
+        response = self.client.get(url, {'q': 'AG'})  # Shorter than a trigram: plain icontains
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+
+    def test_every_search_field_is_still_searchable(self):
+        dispatch = seed_inventory(3)[1]
+        rows = {Dispatch: dispatch, Asset: dispatch.asset, Receiving: dispatch.asset.receiving}
+        for model, row in rows.items():
+            model_admin = django_admin.site._registry[model]
+            for field in model_admin.search_fields:
+                with self.subTest(model=model.__name__, field=field):
+                    *relations, column = field.split('__')
+                    target = row
+                    for relation in relations:
+                        target = getattr(target, relation)
+                    value = f'Zq{model.__name__}{column}x7'
+                    type(target).objects.filter(pk=target.pk).update(**{column: value})
+                    url = reverse(f'admin:KenetAssets_{model._meta.model_name}_changelist')
+                    response = self.client.get(url, {'q': value[1:-1].lower()})  # A partial, case-insensitive match
+                    self.assertEqual([obj.pk for obj in response.context['cl'].result_list], [row.pk])
+                    type(target).objects.filter(pk=target.pk).update(**{column: f'reset-{target.pk}-{column}'})
+
+    def test_receiving_autocomplete_offers_approved_receivings(self):
+        dispatches = seed_inventory(2)
+        pending = dispatches[0].asset.receiving
+        pending.status = 'pending'
+        pending.save()
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'KenetAssets', 'model_name': 'asset', 'field_name': 'receiving', 'term': 'SEED',
+        })
+        self.assertEqual([int(row['id']) for row in response.json()['results']], [dispatches[1].asset.receiving_id])
+        response = self.client.get(reverse('admin:KenetAssets_asset_change', args=[dispatches[1].asset.pk]))
+        self.assertContains(response, 'admin-autocomplete')
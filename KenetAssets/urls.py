@@ -3,6 +3,8 @@ from .views import *
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 from .views import LocationViewSet, CategoryViewSet,LocationCreate
+from . import async_views
+from .metrics import metrics_view
 
 
 router = DefaultRouter()
@@ -12,18 +14,22 @@ router.register(r'categories', CategoryViewSet)
 
 urlpatterns = [
     # Consignment URLs
-    path('consignments/', list_consignments, name='list_consignments'),
+    path('consignments/', ListConsignments.as_view(), name='list_consignments'),
     path('api/consignments/add/', AddConsignmentAPIView.as_view(), name='add_consignment'),
     # path('api/consignments/', add_consignment, name='add_consignment'),
 
     # Receiving URLs
-    path('receivings/', list_receivings, name='list_receivings'),
+    path('receivings/', ListReceivings.as_view(), name='list_receivings'),
      path('api/receivings/add/', AddReceivingAPIView.as_view(), name='add_receiving'),
+    path('api/receivings/bulk/', BulkReceivingAPIView.as_view(), name='bulk_receiving'),
+    path('api/receivings/transition/', BulkStatusTransitionAPIView.as_view(model=Receiving), name='receiving-bulk-transition'),
     # path('api/receivings/add/', add_receiving, name='add_receiving'),
 
     # Asset URLs
-    path('assets/', list_assets, name='list_assets'),
+    path('assets/', ListAssets.as_view(), name='list_assets'),
     path('assets/create/', AssetCreateView.as_view(), name='asset-create'),
+    path('api/assets/bulk-tag/', BulkAssetTagAPIView.as_view(), name='asset-bulk-tag'),
+    path('api/assets/transition/', BulkStatusTransitionAPIView.as_view(model=Asset), name='asset-bulk-transition'),
     # path('api/assets/add/', add_asset, name='add_asset'),
 
      # Dispatch URLs
@@ -31,6 +37,29 @@ urlpatterns = [
     path('api/dispatches/add/', AddDispatch.as_view(), name='add_dispatch'),  # Updated to use AddDispatch
 
 
+    # Streaming exports, e.g. exports/assets.csv or exports/dispatches.ndjson
+    path('exports/<slug:resource>.<slug:fmt>', export_inventory, name='export_inventory'),
+    path('search/', search_inventory, name='search_inventory'),
+    path('dashboard/summary/', inventory_summary, name='inventory_summary'),
+    # Delta sync for offline clients, e.g. sync/assets/?cursor=...
+    path('sync/<slug:resource>/', SyncChanges.as_view(), name='sync_changes'),
+
+
+    # Async (ASGI) read endpoints, see async_views.py
+    path('async/consignments/', async_views.list_consignments, name='async_list_consignments'),
+    path('async/consignments/<int:pk>/', async_views.consignment_detail, name='async_consignment_detail'),
+    path('async/receivings/', async_views.list_receivings, name='async_list_receivings'),
+    path('async/receivings/<int:pk>/', async_views.receiving_detail, name='async_receiving_detail'),
+    path('async/assets/', async_views.list_assets, name='async_list_assets'),
+    path('async/assets/<int:pk>/', async_views.asset_detail, name='async_asset_detail'),
+    path('async/dispatches/', async_views.list_dispatches, name='async_list_dispatches'),
+    path('async/dispatches/<int:pk>/', async_views.dispatch_detail, name='async_dispatch_detail'),
+
+
+    # Prometheus scrape endpoint, see metrics.py
+    path('metrics', metrics_view, name='metrics'),
+
+
     # Authentication URLs
     path('register/', RegisterAPIView.as_view(), name='register'),
     path('login/', LoginAPIView.as_view(), name='login'),
@@ -0,0 +1,126 @@
+"""
+Write-versioned list responses.
+
+Every model the list endpoints read from has a version counter in Django's
+cache, bumped after each committed write (signals for per-row saves,
+explicit ``bump`` calls in the set-based services). A list response's
+strong ETag is derived from the versions it depends on plus the request's
+query string, so an unchanged poll can be answered with ``304 Not Modified``
+before any query runs. With ``KENET_LIST_CACHE_TIMEOUT`` set, the serialized
+page is also cached under that ETag and reused by other clients.
+
+Counters start from ``time.time_ns()`` and an evicted counter is re-seeded
+the same way, so losing one can only cause a cache miss, never a stale 304.
+A counter bumped in one worker's local-memory cache is never seen by the
+others, which would keep answering 304 for stale data, so conditional
+responses are only enabled when the version cache is shared between
+processes (``is_shared``; the file-based cache of the production profile,
+see ``CACHES`` in the settings).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import caching
+
+KEY_PREFIX = 'kenet:version:'
+
+
+def _cache():
+    return caches[getattr(settings, 'KENET_VERSION_CACHE', 'default')]
+
+
+def _key(model):
+    return KEY_PREFIX + model._meta.label_lower
+
+
+def is_shared():
+    """
+    Whether every worker sees the same counters. ``KENET_VERSION_CACHE_SHARED``
+    overrides the guess from the backend, e.g. for a single-process server.
+    """
+    return caching.is_shared(_cache(), 'KENET_VERSION_CACHE_SHARED')
+
+
+def current(models):
+    """Current version of each model, as a tuple in the order given."""
+    cache = _cache()
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def _bump(models):
+    cache = _cache()
+    for model in models:
+        try:
+            cache.incr(_key(model))
+        except ValueError:
+            cache.set(_key(model), time.time_ns(), timeout=None)
+
+
+def bump(*models):
+    """Advance the versions of ``models`` once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(models))
+
+
+def list_etag(name, models, request, fmt='json'):
+    """Strong ETag for the ``fmt`` rendering of list ``name`` that reads ``models``."""
+    digest = hashlib.sha1(repr((
+        name,
+        current(models),
+        request.get_host(),
+        request.get_full_path(),
+        fmt,
+    )).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag):
+    """True when the request's If-None-Match already holds ``etag``."""
+    return _matches(request.headers.get('If-None-Match', ''), etag)
+
+
+def _matches(if_none_match, etag):
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class ConditionalListMixin:
+    """
+    For ``ListAPIView``s: answer ``If-None-Match`` with 304 when none of
+    ``version_models`` changed, and optionally serve the page from cache.
+    Without a shared version cache (``is_shared``) lists are served plainly.
+    """
+    version_models = ()
+
+    def get_etag(self, request):
+        return list_etag(type(self).__name__, self.version_models, request, request.accepted_renderer.format)
+
+    def list(self, request, *args, **kwargs):
+        if not is_shared():
+            return super().list(request, *args, **kwargs)
+        etag = self.get_etag(request)
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        timeout = getattr(settings, 'KENET_LIST_CACHE_TIMEOUT', 0)
+        cache_key = f'kenet:list:{etag}'
+        data = _cache().get(cache_key) if timeout else None
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if timeout and response.status_code == status.HTTP_200_OK:
+                _cache().set(cache_key, response.data, timeout)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
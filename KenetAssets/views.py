@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from .models import Dispatch
 from .serializers import DispatchSerializer
@@ -18,7 +19,15 @@ from .serializers import (
     RegisterSerializer, 
     LoginSerializer
 )
-from .models import Consignment, Receiving, Asset
+from .models import Location, Consignment, Receiving, Asset
+from .fieldsets import SparseListMixin
+from .filters import LIST_FILTER_BACKENDS
+from .pagination import KeysetPagination
+from . import exports, refdata, search, summary, sync
+from .versioning import ConditionalListMixin
+from django.conf import settings
+from django.db import router
+from django.http import StreamingHttpResponse
 from django.urls import reverse
 
 @api_view(['POST'])
@@ -30,19 +39,43 @@ def add_consignment(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
-# @permission_classes([IsAuthenticated])
-def list_consignments(request):
-    consignments = Consignment.objects.all()
-    serializer = ConsignmentSerializer(consignments, many=True)
-    return Response(serializer.data)
+class ListConsignments(ConditionalListMixin, generics.ListAPIView):
+    version_models = (Consignment, Location, User)  # Serializer reads location.name and received_by.username
+    # Join exactly what ConsignmentSerializer reads (location.name, received_by.username)
+    queryset = Consignment.objects.select_related('location', 'received_by').only(
+        'id', 'slk_id', 'supplier', 'quantity', 'datetime', 'invoice_number', 'invoice',
+        'comments', 'project', 'location__name', 'received_by__username',
+    )
+    serializer_class = ConsignmentSerializer
+    pagination_class = KeysetPagination
+    filter_backends = LIST_FILTER_BACKENDS
+    filter_fields = {
+        'location': ('location', 'location'),
+        'supplier': ('exact', 'supplier'),
+        'since': ('since', 'datetime'),
+        'until': ('until', 'datetime'),
+    }
+    ordering_fields = ('id', 'datetime', 'slk_id')
+    # permission_classes = [IsAuthenticated]
 
-@api_view(['GET'])
-# @permission_classes([IsAuthenticated])  # Only authenticated users can view Receiving instances
-def list_receivings(request):
-    receivings = Receiving.objects.all()
-    serializer = ReceivingSerializer(receivings, many=True)
-    return Response(serializer.data)
+class ListReceivings(SparseListMixin, ConditionalListMixin, generics.ListAPIView):
+    version_models = (Receiving,)
+    fast_serializer = True  # Pages are built from values(), see fieldsets.py
+    queryset = Receiving.objects.all()
+    serializer_class = ReceivingSerializer
+    pagination_class = KeysetPagination
+    filter_backends = LIST_FILTER_BACKENDS
+    filter_fields = {
+        'status': ('choice', 'status'),
+        'location': ('location', 'location'),
+        'category': ('ids', 'category_id'),
+        'supplier': ('exact', 'supplier'),
+        'consignment': ('ids', 'consignment_id'),
+        'since': ('since', 'consignment__datetime'),
+        'until': ('until', 'consignment__datetime'),
+    }
+    ordering_fields = ('id', 'serial_number')
+    # permission_classes = [IsAuthenticated]  # Only authenticated users can view Receiving instances
 
 @api_view(['POST'])
 # @permission_classes([IsAuthenticated])  # Only authenticated users can add Receiving instances
@@ -53,12 +86,25 @@ def add_receiving(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
-# @permission_classes([IsAuthenticated])  # Only authenticated users can view Asset instances
-def list_assets(request):
-    assets = Asset.objects.all()
-    serializer = AssetSerializer(assets, many=True)
-    return Response(serializer.data)
+class ListAssets(SparseListMixin, ConditionalListMixin, generics.ListAPIView):
+    version_models = (Asset,)
+    fast_serializer = True  # Pages are built from values(), see fieldsets.py
+    queryset = Asset.objects.all()
+    serializer_class = AssetSerializer
+    pagination_class = KeysetPagination
+    filter_backends = LIST_FILTER_BACKENDS
+    filter_fields = {
+        'status': ('choice', 'status'),
+        'location': ('location', 'location'),
+        'category': ('ids', 'receiving__category_id'),
+        'supplier': ('exact', 'supplier'),
+        'consignment': ('ids', 'receiving__consignment_id'),
+        'receiving': ('ids', 'receiving_id'),
+        'since': ('since', 'receiving__consignment__datetime'),
+        'until': ('until', 'receiving__consignment__datetime'),
+    }
+    ordering_fields = ('id', 'tag_number')
+    # permission_classes = [IsAuthenticated]  # Only authenticated users can view Asset instances
 
 @api_view(['POST'])
 # @permission_classes([IsAuthenticated])  # Only authenticated users can add Asset instances
@@ -69,6 +115,51 @@ def add_asset(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_inventory(request, resource, fmt):
+    """
+    Stream a full dump of assets, receivings or dispatches as CSV or NDJSON,
+    optionally filtered by ?location=, ?status=, ?since= and ?until=.
+    """
+    if resource not in exports.EXPORTS or fmt not in exports.WRITERS:
+        return Response({"error": "Unknown export"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        columns, queryset = exports.export_queryset(resource, request.query_params)
+    except exports.ExportError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Rows are read while the body streams, after StickyPrimaryMiddleware has reset
+    # the routing state, so pick the database now
+    queryset = queryset.using(router.db_for_read(queryset.model))
+    response = StreamingHttpResponse(exports.WRITERS[fmt](columns, queryset), content_type=exports.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{resource}.{fmt}"'
+    return response
+
+@api_view(['GET'])
+# @permission_classes([IsAuthenticated])
+def search_inventory(request):
+    """Ranked matches for ?q= across receivings, assets and dispatches (narrow with ?kind=asset,...)."""
+    query = request.query_params.get('q', '').strip()
+    if len(query) < search.MIN_QUERY_LENGTH:
+        return Response({"error": f"q must be at least {search.MIN_QUERY_LENGTH} characters"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind] or None
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"results": search.search(query, kinds=kinds, limit=max(limit, 1))})
+
+@api_view(['GET'])
+# @permission_classes([IsAuthenticated])
+def inventory_summary(request):
+    """Dashboard counts read from the incrementally maintained summary tables."""
+    consignment = request.query_params.get('consignment')
+    if consignment is not None and not consignment.isdigit():
+        return Response({"error": "consignment must be an id"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(summary.snapshot(consignment=consignment))
+
 class RegisterAPIView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
@@ -105,10 +196,23 @@ class LoginAPIView(APIView):
 
 
 
-class ListDispatches(generics.ListAPIView):
+class ListDispatches(ConditionalListMixin, generics.ListAPIView):
+    version_models = (Dispatch,)
+    # DispatchSerializer renders asset/user/approver/location as primary keys, which
+    # are read from the *_id columns, so no joins are needed here
     queryset = Dispatch.objects.all()
     serializer_class = DispatchSerializer
     permission_classes = [IsAuthenticated]  # Ensure the user is authenticated
+    filter_backends = LIST_FILTER_BACKENDS
+    filter_fields = {
+        'status': ('choice', 'status'),
+        'location': ('location', 'location'),
+        'asset': ('ids', 'asset_id'),
+        'user': ('ids', 'user_id'),
+        'since': ('since', 'datetime'),
+        'until': ('until', 'datetime'),
+    }
+    ordering_fields = ('id', 'datetime')
 
 class AddDispatch(generics.CreateAPIView):
     queryset = Dispatch.objects.all()
@@ -120,6 +224,56 @@ class AddDispatch(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
+# The list view whose queryset, serializer and permissions each sync resource uses
+SYNC_VIEWS = {
+    'consignments': ListConsignments,
+    'receivings': ListReceivings,
+    'assets': ListAssets,
+    'dispatches': ListDispatches,
+}
+
+class SyncChanges(APIView):
+    """
+    Rows of ``resource`` changed or deleted since ``?cursor=`` (omit it for a
+    full sync), paged with ``?limit=``. Keep requesting with the returned
+    cursor while ``more`` is true. See sync.py.
+    """
+
+    def get_permissions(self):
+        view_class = SYNC_VIEWS.get(self.kwargs.get('resource'))
+        return [permission() for permission in view_class.permission_classes] if view_class else []
+
+    def get(self, request, resource):
+        view_class = SYNC_VIEWS.get(resource)
+        if view_class is None:
+            return Response({"error": "Unknown resource"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = int(request.query_params.get('limit', settings.KENET_SYNC_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.KENET_MAX_PAGE_SIZE))
+        try:
+            changed_ids, deleted_ids, cursor, more = sync.changes(resource, request.query_params.get('cursor'), limit)
+        except sync.CursorExpired as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_410_GONE)
+        except sync.SyncError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Serialized exactly like the list endpoint (including ?fields=)
+        view = view_class(request=request, format_kwarg=self.format_kwarg, args=(), kwargs={})
+        position = {pk: i for i, pk in enumerate(changed_ids)}
+        rows = sorted(
+            view.get_queryset().filter(pk__in=changed_ids),
+            key=lambda row: position[row['id'] if isinstance(row, dict) else row.pk],
+        )
+        return Response({
+            "changed": view.get_serializer(rows, many=True).data,
+            "deleted": deleted_ids,
+            "cursor": cursor,
+            "more": more,
+        })
+
+
 
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
@@ -148,6 +302,24 @@ class AddReceivingAPIView(generics.CreateAPIView):
         # Automatically assign the current user as the one who received the item
         serializer.save(received_by=self.request.user)
 
+from .serializers import ReceivingBulkCreateSerializer
+
+class BulkReceivingAPIView(generics.GenericAPIView):
+    """Receive a whole batch of scanned serial numbers against one consignment."""
+    serializer_class = ReceivingBulkCreateSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response({
+            "created": created,
+            "duplicates": len(results) - created,
+            "results": results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
 from rest_framework import generics
 from .models import Asset
 from .serializers import AssetCreateSerializer
@@ -158,11 +330,59 @@ class AssetCreateView(generics.CreateAPIView):
     serializer_class = AssetCreateSerializer
     permission_classes = [IsAuthenticated]  # Ensures only authenticated users can add assets
 
+from .serializers import AssetBulkTagSerializer
+
+class BulkAssetTagAPIView(generics.GenericAPIView):
+    """Create assets for a batch of approved receivings in one request."""
+    serializer_class = AssetBulkTagSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assets = serializer.save()
+        return Response({
+            "created": len(assets),
+            "results": [{"id": a.pk, "receiving": a.receiving_id, "tag_number": a.tag_number} for a in assets],
+        }, status=status.HTTP_201_CREATED)
+
+
+from .serializers import StatusTransitionSerializer
+
+class BulkStatusTransitionAPIView(generics.GenericAPIView):
+    """Move a batch of receivings or assets (``model``) to a new status in one request."""
+    serializer_class = StatusTransitionSerializer
+    permission_classes = [IsAuthenticated]
+    model = None
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'model': self.model}
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed, unchanged = serializer.save()
+        return Response({"status": serializer.validated_data['status'], "changed": changed, "unchanged": unchanged})
+
 
 from rest_framework import viewsets
 from .models import Location
 from .serializers import LocationSerializer
-class LocationViewSet(viewsets.ModelViewSet):
+class CachedReferenceViewSet(viewsets.ModelViewSet):
+    """ModelViewSet whose reads come from the reference-data cache; writes go to the database as usual."""
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(refdata.all(self.queryset.model), many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        instance = refdata.get(self.queryset.model, int(lookup)) if str(lookup).isdigit() else None
+        if instance is None:
+            raise NotFound()
+        return Response(self.get_serializer(instance).data)
+
+class LocationViewSet(CachedReferenceViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     
@@ -176,7 +396,7 @@ from rest_framework import viewsets
 from .models import Category
 from .serializers import CategorySerializer
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReferenceViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     
@@ -0,0 +1,82 @@
+"""
+Process pool running the background jobs of ``KenetAssets.jobs``; started
+with ``manage.py run_job_workers``.
+
+The parent claims jobs and hands their ids to a ``ProcessPoolExecutor``, so
+throughput grows with ``processes`` as long as jobs are CPU bound (text
+extraction is). Children are started with the ``spawn`` method and open
+their own database connections, since a connection must not be shared
+across ``fork``. This module imports no models so it can be loaded in a
+child before Django is set up.
+"""
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+# Settings a child must share with the parent even when the parent changed them at runtime
+INHERITED_SETTINGS = ('DATABASES', 'MEDIA_ROOT')
+
+
+def setup_process(overrides):
+    """Pool initializer: configure Django in a fresh child with the parent's database and storage settings."""
+    import django
+    from django.conf import settings
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+
+def serve(processes, once=False, poll_interval=1.0, log=print):
+    """
+    Claim and run jobs until interrupted (or, with ``once``, until the
+    queue is empty). ``processes=0`` runs them in this process.
+    """
+    from django.conf import settings
+    from django.db import connections
+
+    from . import jobs
+
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    if not processes:
+        while True:
+            count = jobs.run_pending(worker)
+            if count:
+                log(f"Ran {count} jobs")
+            elif once:
+                return
+            else:
+                time.sleep(poll_interval)
+
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_process,
+        initargs=({name: getattr(settings, name) for name in INHERITED_SETTINGS},),
+    )
+    in_flight = {}
+    try:
+        while True:
+            free = processes * 2 - len(in_flight)  # Keep every child busy with one job queued behind it
+            if free > 0:
+                for pk in jobs.claim(worker, free):
+                    in_flight[pool.submit(jobs.run, pk, worker)] = pk
+            if not in_flight:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                pk = in_flight.pop(future)
+                try:
+                    log(f"Job {pk}: {future.result() or 'skipped, it timed out while waiting and was requeued'}")
+                except Exception as exc:
+                    # The child died before recording an outcome; the job is requeued after KENET_JOB_TIMEOUT
+                    log(f"Job {pk}: worker error {exc!r}")
+    finally:
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,43 @@
+"""
+Benchmarks for the KenetAssets project.
+
+Each module is a script run from the repository root, e.g.::
+
+    python -m benchmarks.indexes --rows 100000
+
+Benchmarks never touch ``db.sqlite3``; ``setup()`` points Django at a
+scratch database and migrates it before any data is generated.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup(db_name=None, migrate=True, **database_options):
+    """
+    Configure Django against ``db_name`` (a fresh temporary file by default),
+    run the migrations unless ``migrate`` is false and return the database path.
+    """
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+    if db_name is None:
+        fd, db_name = tempfile.mkstemp(prefix='kenet-bench-', suffix='.sqlite3')
+        os.close(fd)
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = str(db_name)
+    settings.DATABASES['default'].update(database_options)
+    settings.DEBUG = False
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    return db_name
@@ -0,0 +1,325 @@
+"""
+Scenario benchmark of every KenetAssets URL.
+
+    python -m benchmarks.api --consignments 200 --receivings 50 --requests 200 --output results.json
+    python -m benchmarks.api --scenarios list_assets,search_inventory --compare results.json
+
+Seeds a scratch database with ``datagen.generate`` and then, for each
+scenario (one per URL name in ``KenetAssets/urls.py``), issues ``--requests``
+requests through Django's test client after ``--warmup`` untimed ones,
+from ``--concurrency`` threads. Reported per scenario: p50/p95/p99/mean
+latency in ms, throughput in requests/s, queries per request, and errors
+(unexpected status codes). Async endpoints go through the same client, so
+they run as under WSGI; ``benchmarks.asgi`` compares the two servers.
+
+``--output`` writes the results as JSON, along with the git commit, the
+dataset size and the options, so runs can be compared between commits with
+``--compare``.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from . import ROOT, setup
+
+
+class Context:
+    """Ids and credentials the scenarios draw on, plus counters for unique names."""
+
+    def __init__(self, seed=1):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from KenetAssets.models import Location, Category, Consignment, Receiving, Asset, Dispatch
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.user = User.objects.create_user(username='bench-api', password='bench-password-1')
+        self.token = Token.objects.create(user=self.user).key
+        self.consignments = list(Consignment.objects.values_list('pk', flat=True))
+        self.receivings = list(Receiving.objects.values_list('pk', flat=True))
+        self.assets = list(Asset.objects.values_list('pk', flat=True))
+        self.dispatches = list(Dispatch.objects.values_list('pk', flat=True))
+        self.available_assets = list(Asset.objects.filter(status='available').values_list('pk', flat=True))
+        self.locations = list(Location.objects.values_list('pk', flat=True))
+        self.categories = list(Category.objects.values_list('pk', flat=True))
+        self.serials = list(Receiving.objects.values_list('serial_number', flat=True)[:5000])
+        self.untagged = []  # Filled by prepare_untagged
+        self.pools = None  # Filled by prepare_transition_pools
+        self.pool_lock = threading.Lock()
+
+    def unique(self, prefix):
+        with self.lock:
+            self.counter += 1
+            return f'{prefix}-{self.counter:07d}'
+
+    def pick(self, values):
+        with self.lock:
+            return self.rng.choice(values)
+
+    def sample(self, values, count):
+        with self.lock:
+            return self.rng.sample(values, min(count, len(values)))
+
+    def pool(self, resource):
+        """Rows for the status transition scenarios, created on first use."""
+        with self.pool_lock:
+            if self.pools is None:
+                prepare_transition_pools(self)
+        return self.pools[resource]
+
+    def take(self, count):
+        with self.lock:
+            taken, self.untagged = self.untagged[:count], self.untagged[count:]
+        return taken
+
+    @property
+    def auth(self):
+        return {'HTTP_AUTHORIZATION': f'Token {self.token}'}
+
+
+def prepare_untagged(ctx, count):
+    """Create ``count`` approved, untagged receivings for the tagging scenarios (untimed)."""
+    from KenetAssets.models import Consignment
+    from KenetAssets.services import bulk_receive
+
+    consignment = Consignment.objects.get(pk=ctx.consignments[0])
+    results = bulk_receive(consignment, [
+        {'serial_number': ctx.unique('BENCH-UNTAGGED'), 'description': 'Optic', 'status': 'approved'}
+        for _ in range(count)
+    ])
+    ctx.untagged += [result['id'] for result in results if result['status'] == 'created']
+
+
+def prepare_transition_pools(ctx, size=50):
+    """
+    Receivings in testing and assets in use, which the transition scenarios
+    move back and forth between testing/pending and in_use/maintenance
+    without touching the rows the other scenarios use (untimed).
+    """
+    from KenetAssets.models import Consignment
+    from KenetAssets.services import bulk_receive, bulk_tag_assets, tag_number_range
+
+    consignment = Consignment.objects.get(pk=ctx.consignments[0])
+    receivings = {}
+    for status in ('testing', 'approved'):
+        results = bulk_receive(consignment, [
+            {'serial_number': ctx.unique('BENCH-QA'), 'description': 'Optic', 'status': status} for _ in range(size)
+        ])
+        receivings[status] = [result['id'] for result in results]
+    assets = bulk_tag_assets(receivings['approved'], tag_number_range(ctx.unique('BENCH-QA') + '-', 0, size), 'in_use')
+    ctx.pools = {'receivings': receivings['testing'], 'assets': [asset.pk for asset in assets]}
+
+
+def _invoice():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as document:
+        document.writestr('word/document.xml', '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+                          'wordprocessingml/2006/main"><w:body><w:p><w:r><w:t>Invoice No: BENCH-1</w:t>'
+                          '</w:r></w:p></w:body></w:document>')
+    return SimpleUploadedFile('invoice.docx', buffer.getvalue())
+
+
+# name -> (method, request builder(ctx) -> (path, data, extra), expected statuses, untagged receivings per request)
+SCENARIOS = {
+    'list_consignments': ('get', lambda ctx: ('/consignments/', {'page_size': 50}, {}), {200}, 0),
+    'list_receivings': ('get', lambda ctx: ('/receivings/', {'page_size': 50}, {}), {200}, 0),
+    'list_assets': ('get', lambda ctx: ('/assets/', {'page_size': 50}, {}), {200}, 0),
+    'list_dispatches': ('get', lambda ctx: ('/dispatches/', {'page_size': 50}, ctx.auth), {200}, 0),
+    'add_consignment': ('post', lambda ctx: ('/api/consignments/add/', {
+        'supplier': 'Bench', 'quantity': 1, 'location': ctx.pick(ctx.locations), 'invoice': _invoice(),
+    }, ctx.auth), {201}, 0),
+    'add_receiving': ('post', lambda ctx: ('/api/receivings/add/', {
+        'consignment': ctx.pick(ctx.consignments), 'serial_number': ctx.unique('BENCH-RCV'),
+        'description': 'Switch', 'category': ctx.pick(ctx.categories), 'status': 'pending',
+    }, ctx.auth), {201}, 0),
+    'bulk_receiving': ('post', lambda ctx: ('/api/receivings/bulk/', {
+        'consignment': ctx.pick(ctx.consignments),
+        'items': [{'serial_number': ctx.unique('BENCH-BULK'), 'description': 'Router'} for _ in range(50)],
+    }, ctx.auth), {201}, 0),
+    'receiving-bulk-transition': ('post', lambda ctx: ('/api/receivings/transition/', {
+        'ids': ctx.sample(ctx.pool('receivings'), 20), 'status': ctx.pick(['testing', 'pending']),
+    }, ctx.auth), {200}, 0),
+    'asset-bulk-transition': ('post', lambda ctx: ('/api/assets/transition/', {
+        'ids': ctx.sample(ctx.pool('assets'), 20), 'status': ctx.pick(['in_use', 'maintenance']),
+    }, ctx.auth), {200}, 0),
+    'asset-create': ('post', lambda ctx: ('/assets/create/', {
+        'receiving': ctx.take(1)[0], 'tag_number': ctx.unique('BENCH-TAG'), 'status': 'available',
+    }, ctx.auth), {201}, 1),
+    'asset-bulk-tag': ('post', lambda ctx: ('/api/assets/bulk-tag/', {
+        'receivings': ctx.take(20), 'tag_prefix': ctx.unique('BENCH-RANGE') + '-', 'tag_start': 1,
+    }, ctx.auth), {201}, 20),
+    'add_dispatch': ('post', lambda ctx: ('/api/dispatches/add/', {
+        # DispatchSerializer requires user even though the view sets it to the requester
+        'asset': ctx.pick(ctx.available_assets), 'user': ctx.user.pk, 'approver': ctx.user.pk, 'status': 'pending',
+        'destination': 'Bench',
+    }, ctx.auth), {201}, 0),
+    'export_inventory': ('get', lambda ctx: ('/exports/assets.csv', {'status': 'available'}, ctx.auth), {200}, 0),
+    'search_inventory': ('get', lambda ctx: ('/search/', {'q': ctx.pick(ctx.serials)[-7:]}, {}), {200}, 0),
+    'sync_changes': ('get', lambda ctx: ('/sync/assets/', {'limit': 50}, {}), {200}, 0),
+    'inventory_summary': ('get', lambda ctx: ('/dashboard/summary/', {}, {}), {200}, 0),
+    'async_list_consignments': ('get', lambda ctx: ('/async/consignments/', {'page_size': 50}, {}), {200}, 0),
+    'async_consignment_detail': ('get', lambda ctx: (f'/async/consignments/{ctx.pick(ctx.consignments)}/', {}, {}), {200}, 0),
+    'async_list_receivings': ('get', lambda ctx: ('/async/receivings/', {'page_size': 50}, {}), {200}, 0),
+    'async_receiving_detail': ('get', lambda ctx: (f'/async/receivings/{ctx.pick(ctx.receivings)}/', {}, {}), {200}, 0),
+    'async_list_assets': ('get', lambda ctx: ('/async/assets/', {'page_size': 50}, {}), {200}, 0),
+    'async_asset_detail': ('get', lambda ctx: (f'/async/assets/{ctx.pick(ctx.assets)}/', {}, {}), {200}, 0),
+    'async_list_dispatches': ('get', lambda ctx: ('/async/dispatches/', {'page_size': 50}, ctx.auth), {200}, 0),
+    'async_dispatch_detail': ('get', lambda ctx: (f'/async/dispatches/{ctx.pick(ctx.dispatches)}/', {}, ctx.auth), {200}, 0),
+    'metrics': ('get', lambda ctx: ('/metrics', {}, {}), {200}, 0),
+    'register': ('post', lambda ctx: ('/register/', {
+        'username': ctx.unique('bench-user'), 'password': 'bench-password-1', 'email': 'bench@example.com',
+    }, {}), {201}, 0),
+    'login': ('post', lambda ctx: ('/login/', {'username': 'bench-api', 'password': 'bench-password-1'}, {}), {200}, 0),
+    'api_token_auth': ('post', lambda ctx: ('/api-token-auth/', {
+        'username': 'bench-api', 'password': 'bench-password-1',
+    }, {}), {200}, 0),
+    'api-root': ('get', lambda ctx: ('/api/', {}, {}), {200}, 0),
+    'location-list': ('get', lambda ctx: ('/api/locations/', {}, {}), {200}, 0),
+    'location-detail': ('get', lambda ctx: (f'/api/locations/{ctx.pick(ctx.locations)}/', {}, {}), {200}, 0),
+    'category-list': ('get', lambda ctx: ('/api/categories/', {}, {}), {200}, 0),
+    'category-detail': ('get', lambda ctx: (f'/api/categories/{ctx.pick(ctx.categories)}/', {}, {}), {200}, 0),
+    'location-create': ('post', lambda ctx: ('/api/locations/add', {'name': ctx.unique('Bench site')}, ctx.auth), {201}, 0),
+    'category-create': ('post', lambda ctx: ('/api/category/add', {'name': ctx.unique('Bench category')}, ctx.auth), {201}, 0),
+}
+
+
+def _percentile(samples, fraction):
+    return samples[min(len(samples) - 1, max(0, round(len(samples) * fraction) - 1))]
+
+
+def run_scenario(ctx, name, requests, warmup=5, concurrency=1):
+    """Run one scenario and return its statistics as a dict."""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    method, build, expected, untagged = SCENARIOS[name]
+    if untagged:
+        prepare_untagged(ctx, untagged * (requests + warmup))
+    local = threading.local()
+
+    def issue():
+        client = getattr(local, 'client', None) or Client()
+        local.client = client
+        path, data, extra = build(ctx)
+        if method == 'post' and 'invoice' not in data:
+            call = lambda: client.post(path, json.dumps(data), content_type='application/json', **extra)
+        else:
+            call = lambda: getattr(client, method)(path, data, **extra)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = call()
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, len(queries), response.status_code in expected
+
+    for _ in range(warmup):
+        issue()
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: issue(), range(requests)))
+    else:
+        results = [issue() for _ in range(requests)]
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        'requests': requests,
+        'p50_ms': round(_percentile(latencies, 0.50), 3),
+        'p95_ms': round(_percentile(latencies, 0.95), 3),
+        'p99_ms': round(_percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'throughput_rps': round(requests / wall, 1),
+        'queries_per_request': round(statistics.fmean(r[1] for r in results), 2),
+        'errors': sum(not r[2] for r in results),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def _print(results, baseline=None):
+    header = f"{'scenario':<26}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'queries':>9}{'errors':>8}"
+    print(header + ('   p50 vs baseline' if baseline else ''))
+    for name, row in results.items():
+        line = (f"{name:<26}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+                f"{row['throughput_rps']:>9.1f}{row['queries_per_request']:>9.1f}{row['errors']:>8}")
+        before = (baseline or {}).get(name)
+        if before:
+            line += f"   {(row['p50_ms'] / before['p50_ms'] - 1) * 100:+7.1f}%" if before['p50_ms'] else ''
+            if before['queries_per_request'] != row['queries_per_request']:
+                line += f" (queries {before['queries_per_request']} -> {row['queries_per_request']})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--consignments', type=int, default=200)
+    parser.add_argument('--receivings', type=int, default=50, help="Receivings per consignment")
+    parser.add_argument('--dispatches', type=int, default=2, help="Dispatches per asset")
+    parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--scenarios', help="Comma-separated scenario names (default: all)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    db_name = setup()
+    from django.conf import settings
+    from .datagen import generate
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.MEDIA_ROOT = media_root = tempfile.mkdtemp(prefix='kenet-bench-media-')  # Uploaded invoices
+    dataset = generate(consignments=args.consignments, receivings_per_consignment=args.receivings,
+                       dispatches_per_asset=args.dispatches)
+    ctx = Context()
+    results = {name: run_scenario(ctx, name, args.requests, args.warmup, args.concurrency) for name in names}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['scenarios']
+    _print(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': _git_commit(),
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'dataset': dataset,
+                'options': vars(args),
+                'scenarios': results,
+            }, f, indent=2)
+        print(f"Wrote {args.output}")
+    os.remove(db_name)
+    shutil.rmtree(media_root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Concurrent read throughput: the async list/detail views under ASGI against
+the DRF views under WSGI.
+
+    python -m benchmarks.asgi --rows 20000 --concurrency 50 --requests 2000
+
+Both stacks are driven in-process, through Django's own handlers:
+
+* WSGI: ``--workers`` threads, each a ``django.test.Client`` (WSGIHandler)
+  with its own database connection, like a threaded gunicorn worker.
+* ASGI: one event loop running ``--concurrency`` ``AsyncClient``
+  (ASGIHandler) tasks against the ``async/`` endpoints.
+
+``--delay`` adds a per-request pause standing in for a slow client or
+upstream. The WSGI pool holds a thread for it; the event loop does not.
+No network is involved, so the figures compare the request paths, not
+servers; for an end-to-end run use gunicorn with and without
+``-k uvicorn.workers.UvicornWorker``.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import setup
+
+
+def _report(label, samples, elapsed):
+    samples.sort()
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"{label:<10}{len(samples) / elapsed:>12.1f}{statistics.median(samples):>10.2f}{p95:>10.2f}")
+
+
+def run_wsgi(urls, workers, delay):
+    from django.db import connection
+    from django.test import Client
+
+    def fetch(url):
+        client = Client()
+        start = time.perf_counter()
+        response = client.get(url)
+        time.sleep(delay)
+        assert response.status_code == 200, response.status_code
+        connection.close()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        samples = list(pool.map(fetch, urls))
+    return samples, time.perf_counter() - start
+
+
+def run_asgi(urls, concurrency, delay):
+    from django.test import AsyncClient
+
+    async def main():
+        queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+        samples = []
+
+        async def worker():
+            client = AsyncClient()
+            while not queue.empty():
+                url = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(url)
+                await asyncio.sleep(delay)
+                assert response.status_code == 200, response.status_code
+                samples.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000, help="Approximate number of receivings")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8, help="WSGI worker threads")
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent ASGI requests")
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds each request is held open")
+    args = parser.parse_args()
+
+    db_name = setup()
+    from django.conf import settings
+    from KenetAssets.models import Receiving
+    from .datagen import generate
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.KENET_LIST_CACHE_TIMEOUT = 0
+    print(generate(consignments=max(1, args.rows // 100), receivings_per_consignment=100))
+
+    # Half list pages, half detail reads. The sync API has no detail endpoints,
+    # so its side of a detail read is a one-row page.
+    rng = random.Random(7)
+    ids = list(Receiving.objects.values_list('id', flat=True))
+    wsgi_urls, asgi_urls = [], []
+    for n in range(args.requests):
+        if n % 2:
+            wsgi_urls.append('/receivings/?page_size=1')
+            asgi_urls.append(f'/async/receivings/{rng.choice(ids)}/')
+        else:
+            resource = rng.choice(['consignments', 'receivings', 'assets'])
+            wsgi_urls.append(f'/{resource}/?page_size=50')
+            asgi_urls.append(f'/async/{resource}/?page_size=50')
+
+    print(f"{'':<10}{'req/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    _report('WSGI', *run_wsgi(wsgi_urls, args.workers, args.delay))
+    _report('ASGI', *run_asgi(asgi_urls, args.concurrency, args.delay))
+    os.remove(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Seed realistic inventory volumes quickly with ``bulk_create``.
+
+The rows look like the ones the API creates: receivings and assets carry the
+same denormalised supplier/location/invoice fields their ``save()`` methods
+would have copied, and consignments get SLK numbers from the sequence.
+"""
+import datetime
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from KenetAssets import summary
+from KenetAssets.models import Location, Category, Consignment, Receiving, Asset, Dispatch, Sequence
+from KenetAssets.sequences import SLK_SEQUENCE
+
+BATCH_SIZE = 2000
+
+SUPPLIERS = ['Cisco', 'Juniper', 'HP', 'Dell', 'Huawei', 'Ubiquiti', 'Mikrotik', 'Fortinet']
+MODELS = ['ASR-920', 'MX204', 'ProLiant DL380', 'PowerEdge R740', 'S5735', 'UniFi AP', 'CCR2004', 'FG-100F']
+NAMES = ['Router', 'Switch', 'Server', 'Access Point', 'Firewall', 'Optic', 'UPS']
+
+
+def generate(consignments=100, receivings_per_consignment=100, tagged_ratio=0.8, dispatches_per_asset=1,
+             locations=20, categories=12, users=10, seed=1):
+    """
+    Create ``consignments`` consignments with ``receivings_per_consignment``
+    receivings each; ``tagged_ratio`` of the approved receivings get an asset
+    and every asset gets ``dispatches_per_asset`` dispatches. Returns a dict
+    of row counts.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    with transaction.atomic():
+        existing_users = User.objects.count()
+        user_rows = User.objects.bulk_create([
+            User(username=f'bench-{existing_users + i}', first_name='Bench', last_name=str(i)) for i in range(users)
+        ])
+        first = Location.objects.count()
+        location_rows = Location.objects.bulk_create([
+            Location(name=f'Site {first + i}', slug=f'site-{first + i}') for i in range(locations)
+        ])
+        first = Category.objects.count()
+        category_rows = Category.objects.bulk_create([
+            Category(name=f'Category {first + i}', slug=f'category-{first + i}') for i in range(categories)
+        ])
+
+        sequence, _ = Sequence.objects.get_or_create(name=SLK_SEQUENCE)
+        first_slk = sequence.value + 1
+        consignment_rows = Consignment.objects.bulk_create([
+            Consignment(
+                slk_id=f'SLK{first_slk + i:03}',
+                supplier=rng.choice(SUPPLIERS),
+                quantity=receivings_per_consignment,
+                location=rng.choice(location_rows),
+                received_by=rng.choice(user_rows),
+                datetime=now - datetime.timedelta(days=rng.randint(0, 720), minutes=rng.randint(0, 1440)),
+                invoice_number=f'INV-{first_slk + i:06}',
+                project=rng.choice(['Backbone', 'Campus', 'DC', None]),
+            )
+            for i in range(consignments)
+        ], batch_size=BATCH_SIZE)
+        sequence.value = first_slk + consignments - 1
+        sequence.save()
+
+        receivings = []
+        for consignment in consignment_rows:
+            for i in range(receivings_per_consignment):
+                receivings.append(Receiving(
+                    consignment=consignment,
+                    serial_number=f'{consignment.slk_id}-{i:05}-{rng.getrandbits(32):08X}',
+                    description=f'{rng.choice(NAMES)} {rng.choice(MODELS)}',
+                    name=rng.choice(NAMES),
+                    model=rng.choice(MODELS),
+                    category=rng.choice(category_rows),
+                    status=rng.choices(['approved', 'testing', 'pending', 'rejected'], [70, 15, 10, 5])[0],
+                    supplier=consignment.supplier,
+                    received_by_id=consignment.received_by_id,
+                    invoice_number=consignment.invoice_number,
+                    location_id=consignment.location_id,
+                ))
+        receivings = Receiving.objects.bulk_create(receivings, batch_size=BATCH_SIZE)
+
+        tag = Asset.objects.count()
+        assets = []
+        for receiving in receivings:
+            if receiving.status == 'approved' and rng.random() < tagged_ratio:
+                tag += 1
+                assets.append(Asset(
+                    receiving=receiving,
+                    tag_number=f'KENET-{tag:07}',
+                    status=rng.choices(['available', 'in_use', 'maintenance', 'decommissioned'], [40, 50, 7, 3])[0],
+                    description=receiving.description,
+                    serial_number=receiving.serial_number,
+                    name=receiving.name,
+                    model=receiving.model,
+                    received_by_id=receiving.received_by_id,
+                    location_id=receiving.location_id,
+                    invoice_number=receiving.invoice_number,
+                    supplier=receiving.supplier,
+                ))
+        assets = Asset.objects.bulk_create(assets, batch_size=BATCH_SIZE)
+
+        dispatches = [
+            Dispatch(
+                asset=asset,
+                user=rng.choice(user_rows),
+                approver=rng.choice(user_rows),
+                status=rng.choice(['pending', 'dispatched', 'delivered']),
+                datetime=now - datetime.timedelta(days=rng.randint(0, 360), minutes=rng.randint(0, 1440)),
+                destination=f'Site {rng.randrange(locations)}',
+                location_id=asset.location_id,
+            )
+            for asset in assets
+            for _ in range(dispatches_per_asset)
+        ]
+        Dispatch.objects.bulk_create(dispatches, batch_size=BATCH_SIZE)
+        summary.rebuild()  # bulk_create skips the signals that keep the dashboard counts
+
+    return {
+        'consignments': len(consignment_rows),
+        'receivings': len(receivings),
+        'assets': len(assets),
+        'dispatches': len(dispatches),
+    }
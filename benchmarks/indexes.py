@@ -0,0 +1,130 @@
+"""
+Insert and lookup latency with and without the hot-lookup indexes from
+migration 0008.
+
+    python -m benchmarks.indexes --rows 100000 [--json results.json]
+
+The database is seeded once; the indexes are then dropped, the workload is
+timed, the indexes are recreated and the same workload is timed again.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from . import setup
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def workload(repeat, inserts):
+    from django.db import connection, transaction
+    from KenetAssets.models import Consignment, Receiving, Asset, Dispatch
+
+    receiving = Receiving.objects.order_by('?').first()
+    asset = Asset.objects.order_by('?').first()
+    category_id = receiving.category_id
+    location_id = asset.location_id
+    since = Dispatch.objects.order_by('-datetime').values_list('datetime', flat=True)[500]
+
+    lookups = {
+        'receiving by serial (Receiving.save check)':
+            lambda: Receiving.objects.filter(serial_number=receiving.serial_number).exists(),
+        'receivings by status+category (page)':
+            lambda: list(Receiving.objects.filter(status='testing', category_id=category_id).order_by('-id')[:50]),
+        'count receivings by status+category (admin filter)':
+            lambda: Receiving.objects.filter(status='testing', category_id=category_id).count(),
+        'receiving status counts for a consignment':
+            lambda: list(Receiving.objects.filter(consignment_id=receiving.consignment_id, status='approved').values_list('id')),
+        'assets by status+location (page)':
+            lambda: list(Asset.objects.filter(status='maintenance', location_id=location_id).order_by('-id')[:50]),
+        'count assets by status+location':
+            lambda: Asset.objects.filter(status='maintenance', location_id=location_id).count(),
+        'latest dispatch for an asset':
+            lambda: Dispatch.objects.filter(asset_id=asset.pk).order_by('-datetime').first(),
+        'dispatches in a date range':
+            lambda: list(Dispatch.objects.filter(datetime__gte=since).values_list('id')),
+        'consignments in a date range':
+            lambda: list(Consignment.objects.filter(datetime__gte=since).values_list('id')),
+    }
+    results = {name: timed(fn, repeat) for name, fn in lookups.items()}
+
+    consignment = receiving.consignment
+    counter = Receiving.objects.count()
+
+    def insert_receivings():
+        nonlocal counter
+        with transaction.atomic():
+            for _ in range(inserts):
+                counter += 1
+                Receiving.objects.create(consignment=consignment, serial_number=f'BENCH-{counter}', description='Bench')
+            transaction.set_rollback(True)
+
+    def insert_dispatches():
+        with transaction.atomic():
+            for _ in range(inserts):
+                Dispatch.objects.create(asset=asset, user_id=consignment.received_by_id,
+                                        approver_id=consignment.received_by_id, status='pending')
+            transaction.set_rollback(True)
+
+    results[f'{inserts} Receiving inserts via save()'] = timed(insert_receivings, max(1, repeat // 5))
+    results[f'{inserts} Dispatch inserts via save()'] = timed(insert_dispatches, max(1, repeat // 5))
+    connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help="Approximate number of receivings")
+    parser.add_argument('--repeat', type=int, default=25)
+    parser.add_argument('--inserts', type=int, default=200)
+    parser.add_argument('--db', help="Database file to use (default: a new temporary file)")
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args()
+
+    db_name = setup(args.db)
+    from django.db import connection
+    from KenetAssets.models import Consignment, Receiving, Asset, Dispatch
+    from .datagen import generate
+
+    per_consignment = 100
+    print(f"Seeding {args.rows} receivings into {db_name} ...")
+    counts = generate(consignments=max(1, args.rows // per_consignment), receivings_per_consignment=per_consignment)
+    print(counts)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    indexed = [(model, index) for model in (Consignment, Receiving, Asset, Dispatch) for index in model._meta.indexes]
+    with connection.schema_editor() as editor:
+        for model, index in indexed:
+            editor.remove_index(model, index)
+    before = workload(args.repeat, args.inserts)
+    with connection.schema_editor() as editor:
+        for model, index in indexed:
+            editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    after = workload(args.repeat, args.inserts)
+
+    width = max(map(len, before))
+    print(f"\n{'median ms':<{width}}  {'without':>10}  {'with':>10}  {'speedup':>8}")
+    for name in before:
+        print(f"{name:<{width}}  {before[name]:>10.3f}  {after[name]:>10.3f}  {before[name] / after[name]:>7.1f}x")
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'rows': counts, 'without_indexes_ms': before, 'with_indexes_ms': after}, fh, indent=2)
+    if args.db is None:
+        os.remove(db_name)
+
+
+if __name__ == '__main__':
+    main()
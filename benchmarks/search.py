@@ -0,0 +1,49 @@
+"""
+Full-text search latency against the admin-style ``icontains`` scan.
+
+    python -m benchmarks.search --rows 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from . import setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help="Approximate number of receivings")
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    db_name = setup()
+    from KenetAssets import search
+    from KenetAssets.models import Receiving
+    from .datagen import generate
+
+    print(generate(consignments=max(1, args.rows // 100), receivings_per_consignment=100))
+    serials = list(Receiving.objects.values_list('serial_number', flat=True))
+    rng = random.Random(7)
+    fragments = [serial[-7:] for serial in rng.sample(serials, args.queries)]
+
+    def measure(fn):
+        samples = []
+        for fragment in fragments:
+            start = time.perf_counter()
+            fn(fragment)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+    fts = measure(lambda q: search.search(q))
+    scan = measure(lambda q: list(search._fallback_search(q, list(search.KIND_CODES), 20, 'default')))
+    print(f"{'':<22}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'FTS5 trigram':<22}{fts[0]:>10.2f}{fts[1]:>10.2f}")
+    print(f"{'icontains scan':<22}{scan[0]:>10.2f}{scan[1]:>10.2f}")
+    os.remove(db_name)
+
+
+if __name__ == '__main__':
+    main()
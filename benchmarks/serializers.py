@@ -0,0 +1,62 @@
+"""
+Rows per second serialized by the asset and receiving list serializers:
+the ModelSerializers over model instances, against the values()-based
+fast path of ``KenetAssets.fieldsets``, with and without ``?fields=``.
+
+    python -m benchmarks.serializers --rows 50000
+"""
+import argparse
+import os
+import time
+
+from . import setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000, help="Approximate number of receivings")
+    parser.add_argument('--repeat', type=int, default=3, help="Best of this many runs per case")
+    args = parser.parse_args()
+
+    db_name = setup()
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from KenetAssets.fieldsets import ValuesSerializer
+    from KenetAssets.models import Asset, Receiving
+    from KenetAssets.serializers import AssetSerializer, ReceivingSerializer
+    from .datagen import generate
+
+    print(generate(consignments=max(1, args.rows // 100), receivings_per_consignment=100))
+    sparse = Request(APIRequestFactory().get('/', {'fields': 'id,serial_number,status'}))
+
+    def model_serializer(serializer_class, model, context):
+        queryset = model.objects.order_by('id')
+        if 'request' in context:
+            queryset = queryset.only(*ValuesSerializer.columns(serializer_class(context=context)))
+        return serializer_class(queryset, many=True, context=context).data
+
+    def values_serializer(serializer_class, model, context):
+        serializer = serializer_class(context=context)
+        rows = model.objects.order_by('id').values(*ValuesSerializer.columns(serializer))
+        return ValuesSerializer(serializer, rows).data
+
+    def best(fn, *fn_args):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            count = len(fn(*fn_args))
+            timings.append(time.perf_counter() - start)
+        return count / min(timings)
+
+    print(f"{'':<34}{'ModelSerializer':>18}{'values()':>14}{'speedup':>10}")
+    for serializer_class, model in ((ReceivingSerializer, Receiving), (AssetSerializer, Asset)):
+        for label, context in (('all fields', {}), ('?fields= (3 fields)', {'request': sparse})):
+            slow = best(model_serializer, serializer_class, model, context)
+            fast = best(values_serializer, serializer_class, model, context)
+            name = f"{model.__name__} {label}"
+            print(f"{name:<34}{slow:>13,.0f} r/s{fast:>10,.0f} r/s{fast / slow:>9.1f}x")
+    os.remove(db_name)
+
+
+if __name__ == '__main__':
+    main()
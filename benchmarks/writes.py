@@ -0,0 +1,104 @@
+"""
+Sustained concurrent writes from several processes, with Django's default
+SQLite settings against ``SQLITE_PRODUCTION_PROFILE`` from the settings.
+
+    python -m benchmarks.writes --processes 8 --seconds 10
+
+Each process plays a gunicorn worker doing receiving intake: alternately a
+single receiving created in a transaction (as with ATOMIC_REQUESTS) and a
+five-item ``bulk_receive``. Both read before they write, which is where
+DEFERRED transactions fail with "database is locked". Every profile gets
+its own fresh database file.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from . import setup
+
+
+def _worker(db_name, options, seconds, worker_id, results):
+    setup(db_name, migrate=False, **options)
+    from django.db import OperationalError, transaction
+    from KenetAssets.models import Consignment, Receiving
+    from KenetAssets.services import bulk_receive
+
+    consignment = Consignment.objects.order_by('pk').first()
+    rows = locked = other = 0
+    n = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        n += 1
+        serial = f'W{worker_id}-{n}'
+        try:
+            if n % 2:
+                with transaction.atomic():
+                    Receiving.objects.create(consignment=consignment, serial_number=serial, description='Switch')
+                rows += 1
+            else:
+                items = [{'serial_number': f'{serial}-{i}', 'description': 'Access point'} for i in range(5)]
+                rows += sum(r['status'] == 'created' for r in bulk_receive(consignment, items))
+        except OperationalError as exc:
+            if 'locked' in str(exc):
+                locked += 1
+            else:
+                other += 1
+    results.put((rows, locked, other))
+
+
+def _prepare(db_name, options, profile):
+    setup(db_name, **options)  # Migrates (and, for WAL, converts) the fresh file once
+    from django.contrib.auth.models import User
+    from KenetAssets.models import Consignment, Location
+
+    Consignment.objects.create(
+        supplier='Bench', quantity=1, location=Location.objects.create(name=f'Bench {profile}'),
+        received_by=User.objects.create(username=f'bench-{profile}'),
+    )
+
+
+def run(profile, options, processes, seconds):
+    """Returns ``(rows written, "database is locked" errors, other errors)``."""
+    fd, db_name = tempfile.mkstemp(prefix='kenet-bench-', suffix='.sqlite3')
+    os.close(fd)
+    # Django is only ever configured in child processes, one configuration each
+    context = multiprocessing.get_context('spawn')
+    preparation = context.Process(target=_prepare, args=(db_name, options, profile))
+    preparation.start()
+    preparation.join()
+
+    results = context.Queue()
+    workers = [context.Process(target=_worker, args=(db_name, options, seconds, i, results)) for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    totals = [sum(values) for values in zip(*(results.get() for _ in workers))]
+    for worker in workers:
+        worker.join()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(f'{db_name}{suffix}'):
+            os.remove(f'{db_name}{suffix}')
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--profile', choices=['default', 'production', 'both'], default='both')
+    args = parser.parse_args()
+
+    from core.settings import SQLITE_PRODUCTION_PROFILE
+    profiles = {'default': {}, 'production': SQLITE_PRODUCTION_PROFILE}
+    if args.profile != 'both':
+        profiles = {args.profile: profiles[args.profile]}
+
+    print(f"{'':<12}{'rows/s':>10}{'rows':>10}{'locked':>10}{'other errors':>14}")
+    for profile, options in profiles.items():
+        rows, locked, other = run(profile, options, args.processes, args.seconds)
+        print(f"{profile:<12}{rows / args.seconds:>10.1f}{rows:>10}{locked:>10}{other:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -20,6 +21,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'KenetAssets.metrics.MetricsMiddleware',  # First, so it times the whole stack
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Added WhiteNoise
@@ -60,9 +62,78 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than shared-cache memory, so tests that write from several
+        # threads get SQLite's normal locking and busy timeout
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Production SQLite profile, for several gunicorn workers writing to one file.
+# Enabled with KENET_DB_PROFILE=production (also set KENET_CACHE_DIR, below).
+# - WAL lets readers and the single writer proceed side by side; with it
+#   synchronous=NORMAL is still crash-safe and saves an fsync per commit
+# - every transaction starts IMMEDIATE, taking the write lock up front, so two
+#   read-then-write transactions cannot deadlock on the lock upgrade (which
+#   SQLite reports as "database is locked" at once, without waiting)
+# - writers queue behind the lock for up to `timeout` seconds (busy_timeout)
+# - connections are kept for CONN_MAX_AGE seconds instead of one per request
+SQLITE_PRODUCTION_PROFILE = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=268435456;'  # 256 MiB of the file read through the page cache mapping
+            'PRAGMA cache_size=-20000;'  # ~20 MB page cache per connection
+            'PRAGMA temp_store=MEMORY;'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+}
+if os.environ.get('KENET_DB_PROFILE') == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION_PROFILE)
+
+# Read replica (see KenetAssets.routers): KENET_REPLICA_DB names a copy of the
+# database, e.g. one kept fresh with `manage.py sync_replica`. Request reads go
+# there; writes, and reads for KENET_REPLICA_STICKY_SECONDS after a client's
+# write, go to default.
+KENET_REPLICA_STICKY_SECONDS = 5
+if os.environ.get('KENET_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['KENET_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASES['replica']['OPTIONS'] = {
+        **DATABASES['default'].get('OPTIONS', {}),
+        'init_command': DATABASES['default'].get('OPTIONS', {}).get('init_command', '') + 'PRAGMA query_only=ON;',
+    }
+    DATABASE_ROUTERS = ['KenetAssets.routers.ReplicaRouter']
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware'),
+                      'KenetAssets.routers.StickyPrimaryMiddleware')
+
+# Versions behind the list ETags (and the optional list response cache) live in
+# the cache, so with several worker processes it must be shared between them:
+# set KENET_CACHE_DIR to use a file-based cache instead of per-process memory.
+# With the per-process cache, ETags and 304s are turned off unless
+# KENET_VERSION_CACHE_SHARED is set (only safe with a single server process).
+if os.environ.get('KENET_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['KENET_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+KENET_VERSION_CACHE_SHARED = None  # None: decided from the cache backend
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -99,6 +170,39 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'KenetAssets.authentication.CachedTokenAuthentication',  # TokenAuthentication with the lookup cached
     )
 }
+
+# Seconds locations/categories stay cached; bounds how stale another worker's copy can be
+KENET_REFDATA_TIMEOUT = 300
+
+# Keyset pagination for the list endpoints (clients may pass ?page_size= up to the max)
+KENET_PAGE_SIZE = 50
+KENET_MAX_PAGE_SIZE = 500
+KENET_BULK_MAX_ITEMS = 5000  # Upper bound on rows per bulk receiving/tagging request
+KENET_BULK_TRANSITION_MAX_ITEMS = 20000  # Status changes are cheaper, so more rows per request
+# Admin changelists count rows exactly up to this many, then estimate (see EstimatedCountPaginator)
+KENET_ADMIN_EXACT_COUNT_LIMIT = 10000
+# SLK numbers reserved per worker at a time (1 keeps them strictly sequential)
+KENET_SLK_BLOCK_SIZE = 1
+# Seconds to cache serialized list pages keyed by their ETag (0 disables the cache)
+KENET_LIST_CACHE_TIMEOUT = 0
+# Seconds an authenticated API token stays cached (deleting it or saving its user drops it sooner)
+KENET_TOKEN_CACHE_TTL = 300
+KENET_TOKEN_CACHE_SHARED = None  # None: cache tokens only when the cache backend is shared between processes
+# Background jobs (manage.py run_job_workers): tries before a job is marked failed, and
+# seconds after which a job left running by a dead worker is queued again
+KENET_JOB_MAX_ATTEMPTS = 3
+KENET_JOB_TIMEOUT = 600
+# Delta sync (sync/<resource>/, see KenetAssets.sync): rows per page, seconds recent
+# changes are held back for in-flight transactions, and days deletions are remembered
+KENET_SYNC_PAGE_SIZE = 500
+KENET_SYNC_LAG_SECONDS = 2
+KENET_TOMBSTONE_RETENTION_DAYS = 90
+# Request metrics served at /metrics (see KenetAssets.metrics): with several worker processes,
+# set KENET_METRICS_DIR to a directory they share so a scrape sums all of them.
+# KENET_SLOW_REQUEST_SECONDS logs the SQL of requests slower than that many seconds.
+KENET_METRICS_DIR = os.environ.get('KENET_METRICS_DIR')
+KENET_METRICS_FLUSH_SECONDS = 1.0
+KENET_SLOW_REQUEST_SECONDS = float(os.environ['KENET_SLOW_REQUEST_SECONDS']) if os.environ.get('KENET_SLOW_REQUEST_SECONDS') else None